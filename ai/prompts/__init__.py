@@ -1,3 +1,21 @@
-from .explain_prompt import EXPLAIN_PROMPT_TEMPLATE
-from .improve_prompt import IMPROVE_PROMPT_TEMPLATE
+from .explain_prompt import (
+    EXPLAIN_PROMPT_TEMPLATE,
+    EXPLAIN_PROMPT_VERSION,
+    BATCH_EXPLAIN_PROMPT_VERSION,
+)
+from .improve_prompt import (
+    IMPROVE_PROMPT_TEMPLATE,
+    IMPROVE_PROMPT_VERSION,
+    IMPROVE_JSON_PROMPT_TEMPLATE,
+    IMPROVE_JSON_PROMPT_VERSION,
+)
 from .base_prompt import SYSTEM_ROLE, JSON_INSTRUCTIONS
+from .prompt_builder import (
+    BuiltPrompt,
+    SYSTEM_INSTRUCTIONS,
+    build_explain_prompt,
+    build_batch_explain_prompt,
+    build_improve_prompt,
+    explain_line_map,
+)
+from .code_minimizer import remap_line_keys, estimate_tokens
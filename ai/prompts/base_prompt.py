@@ -2,6 +2,8 @@
 Base prompt components shared across all Gemini prompt templates.
 """
 
+import hashlib
+
 # -----------------------------------------------------------
 # UNIVERSAL SYSTEM ROLE / PERSONA
 # -----------------------------------------------------------
@@ -24,3 +26,17 @@ IMPORTANT RULES:
 - Do NOT change the required key names.
 """
 
+
+# -----------------------------------------------------------
+# PROMPT VERSIONING
+# -----------------------------------------------------------
+def prompt_version(*parts: str) -> str:
+    """
+    Short fingerprint of the text that makes up a prompt.
+    Any edit to a template or its components yields a new version.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()[:12]
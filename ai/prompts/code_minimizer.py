@@ -0,0 +1,135 @@
+"""
+Removes token noise from user code before it goes into a prompt.
+
+Explain prompts drop blank lines and whole-line comments (license headers,
+banners) and keep a map back to the original line numbers, so
+line_by_line_explanation keys can be rewritten to refer to the user's code.
+Improve prompts only lose trailing whitespace and repeated blank lines,
+because the optimized code Gemini returns should keep the user's comments.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+# Bump when the rules change: cached explanations use the minimized numbering
+MINIMIZER_VERSION = "1"
+
+_LINE_COMMENTS = {
+    "python": ("#",),
+    "ruby": ("#",),
+    "shell": ("#",),
+    "javascript": ("//",),
+    "typescript": ("//",),
+    "java": ("//",),
+    "c": ("//",),
+    "cpp": ("//",),
+    "csharp": ("//",),
+    "go": ("//",),
+    "rust": ("//",),
+    "php": ("//", "#"),
+    "sql": ("--",),
+}
+
+_BLOCK_COMMENT_LANGUAGES = {
+    "javascript", "typescript", "java", "c", "cpp", "csharp", "go", "rust", "php", "sql",
+}
+
+
+def _is_line_comment(stripped: str, prefixes: Tuple[str, ...]) -> bool:
+    # Shebangs and Rust attributes look like comments but are code
+    if stripped.startswith("#!") or stripped.startswith("#["):
+        return False
+    return stripped.startswith(prefixes)
+
+
+def minimize_for_explain(code: str, lang: str) -> Tuple[str, Optional[List[int]]]:
+    """
+    Returns (minimized code, line map). line_map[i] is the original
+    1-based line number of minimized line i + 1; None means unchanged.
+    """
+    prefixes = _LINE_COMMENTS.get(lang, ())
+    block_comments = lang in _BLOCK_COMMENT_LANGUAGES
+
+    kept: List[str] = []
+    line_map: List[int] = []
+    in_block = False
+
+    for number, line in enumerate(code.split("\n"), start=1):
+        stripped = line.strip()
+
+        if in_block:
+            end = stripped.find("*/")
+            if end == -1:
+                continue
+            in_block = False
+            if not stripped[end + 2:].strip():
+                continue
+        elif not stripped:
+            continue
+        elif block_comments and stripped.startswith("/*"):
+            end = stripped.find("*/", 2)
+            if end == -1:
+                in_block = True
+                continue
+            if not stripped[end + 2:].strip():
+                continue
+        elif prefixes and _is_line_comment(stripped, prefixes):
+            continue
+
+        kept.append(line.rstrip())
+        line_map.append(number)
+
+    if not kept:
+        # Nothing but comments: explain it as written
+        return code, None
+    if len(kept) == line_map[-1]:
+        # No line was dropped, so the numbering is unchanged
+        return "\n".join(kept), None
+    return "\n".join(kept), line_map
+
+
+def tidy_whitespace(code: str) -> str:
+    """
+    Strips trailing whitespace, collapses runs of blank lines to one and
+    drops leading/trailing blank lines. Indentation is left alone.
+    """
+    lines: List[str] = []
+    blank = False
+    for line in code.split("\n"):
+        line = line.rstrip()
+        if not line:
+            blank = bool(lines)
+            continue
+        if blank:
+            lines.append("")
+            blank = False
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def remap_line_keys(lines: Dict[str, str], line_map: Optional[List[int]]) -> Dict[str, str]:
+    """
+    Rewrites minimized line-number keys to original line numbers.
+    Keys that are not line numbers of the minimized code are kept as is.
+    """
+    if not line_map:
+        return lines
+    remapped = {}
+    for key, text in lines.items():
+        try:
+            index = int(key) - 1
+        except (TypeError, ValueError):
+            remapped[key] = text
+            continue
+        if 0 <= index < len(line_map):
+            remapped[str(line_map[index])] = text
+        else:
+            remapped[key] = text
+    return remapped
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count (about four characters per token for code and English),
+    cheap enough to compute for every request.
+    """
+    return (len(text) + 3) // 4
@@ -2,29 +2,16 @@
 Prompt template specifically for code explanation.
 """
 
-from .base_prompt import SYSTEM_ROLE, JSON_INSTRUCTIONS
-
-# Few-shot example to guide model
-FEW_SHOT_EXAMPLE = """
-EXAMPLE_INPUT:
-x = 5
-y = x + 10
-print(y)
-
-EXPECTED_OUTPUT:
-{
-  "language": "python",
-  "high_level_explanation": "This code stores a value, adds 10 to it, and prints it.",
-  "line_by_line_explanation": {
-    "1": "A variable x is created and assigned 5.",
-    "2": "A variable y stores x + 10.",
-    "3": "The value in y is printed."
-  }
-}
-"""
+from .base_prompt import SYSTEM_ROLE, JSON_INSTRUCTIONS, prompt_version
+from .code_minimizer import MINIMIZER_VERSION
+from .few_shots import DEFAULT_LANGUAGE, EXPLAIN_FEW_SHOTS
 
-# Main prompt template
-EXPLAIN_PROMPT_TEMPLATE = """
+# Few-shot example to guide model (the default; see few_shots.py for the others)
+FEW_SHOT_EXAMPLE = EXPLAIN_FEW_SHOTS[DEFAULT_LANGUAGE]
+
+# Main prompt template: a static part (the same for every request, sent as
+# the system instruction) followed by the per-request code
+EXPLAIN_INSTRUCTIONS_TEMPLATE = """
 {system_role}
 
 Your task: Explain the given code step-by-step in clear and simple language.
@@ -40,9 +27,69 @@ Use this JSON output format:
 
 FEW_SHOT_EXAMPLE:
 {few_shot_example}
+"""
 
+EXPLAIN_CODE_TEMPLATE = """
 Now explain the following code:
 
 CODE_INPUT:
 \"\"\"{code}\"\"\"
 """
+
+EXPLAIN_PROMPT_TEMPLATE = EXPLAIN_INSTRUCTIONS_TEMPLATE + EXPLAIN_CODE_TEMPLATE
+
+# Several small snippets explained in a single call (batch endpoint)
+BATCH_EXPLAIN_INSTRUCTIONS_TEMPLATE = """
+{system_role}
+
+Your task: Explain each of the given code snippets step-by-step in clear and simple language.
+
+{json_instructions}
+
+Return a JSON array with exactly one object per snippet, in the same order as the input.
+Line numbers in each object count from the first line of that snippet.
+Each object uses this format:
+{{
+  "language": "",
+  "high_level_explanation": "",
+  "line_by_line_explanation": {{}}
+}}
+"""
+
+BATCH_EXPLAIN_CODE_TEMPLATE = """
+Now explain the following {count} code snippets:
+
+{snippets}
+"""
+
+BATCH_EXPLAIN_PROMPT_TEMPLATE = BATCH_EXPLAIN_INSTRUCTIONS_TEMPLATE + BATCH_EXPLAIN_CODE_TEMPLATE
+
+BATCH_SNIPPET_TEMPLATE = """
+SNIPPET {index}:
+\"\"\"{code}\"\"\"
+"""
+
+# Static parts rendered once at import, one per few-shot language
+EXPLAIN_SYSTEM_INSTRUCTIONS = {
+    lang: EXPLAIN_INSTRUCTIONS_TEMPLATE.format(
+        system_role=SYSTEM_ROLE,
+        json_instructions=JSON_INSTRUCTIONS,
+        few_shot_example=example,
+    )
+    for lang, example in EXPLAIN_FEW_SHOTS.items()
+}
+EXPLAIN_SYSTEM_INSTRUCTION = EXPLAIN_SYSTEM_INSTRUCTIONS[DEFAULT_LANGUAGE]
+BATCH_EXPLAIN_SYSTEM_INSTRUCTION = BATCH_EXPLAIN_INSTRUCTIONS_TEMPLATE.format(
+    system_role=SYSTEM_ROLE,
+    json_instructions=JSON_INSTRUCTIONS,
+)
+
+# Changes whenever the template or any of its components change
+EXPLAIN_PROMPT_VERSION = prompt_version(
+    EXPLAIN_PROMPT_TEMPLATE, SYSTEM_ROLE, JSON_INSTRUCTIONS, MINIMIZER_VERSION,
+    *EXPLAIN_FEW_SHOTS.values()
+)
+# Packed (batch) prompts produce their own cache entries
+BATCH_EXPLAIN_PROMPT_VERSION = prompt_version(
+    BATCH_EXPLAIN_PROMPT_TEMPLATE, SYSTEM_ROLE, JSON_INSTRUCTIONS, MINIMIZER_VERSION
+)
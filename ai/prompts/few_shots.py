@@ -0,0 +1,192 @@
+"""
+Few-shot examples per language. Each prompt shows the model one short
+example in the language of the input instead of always a Python one.
+"""
+
+import json
+from typing import Dict, NamedTuple, Tuple
+
+
+class ExplainExample(NamedTuple):
+    code: str
+    summary: str
+    lines: Tuple[str, ...]  # one explanation per line of `code`
+
+
+class ImproveExample(NamedTuple):
+    code: str
+    improvements: str
+    optimized_code: str
+
+
+DEFAULT_LANGUAGE = "python"
+
+# Detected languages without their own examples borrow a close relative's
+LANGUAGE_ALIASES = {
+    "typescript": "javascript",
+    "c": "cpp",
+    "csharp": "java",
+}
+
+EXPLAIN_EXAMPLES: Dict[str, ExplainExample] = {
+    "python": ExplainExample(
+        "x = 5\ny = x + 10\nprint(y)",
+        "This code stores a value, adds 10 to it, and prints it.",
+        (
+            "A variable x is created and assigned 5.",
+            "A variable y stores x + 10.",
+            "The value in y is printed.",
+        ),
+    ),
+    "javascript": ExplainExample(
+        "const total = prices.reduce((a, b) => a + b, 0);\nconsole.log(total);",
+        "This code adds up all prices and logs the sum.",
+        (
+            "reduce adds every price to a running total that starts at 0.",
+            "The total is printed to the console.",
+        ),
+    ),
+    "java": ExplainExample(
+        "int sum = 0;\nfor (int n : numbers) sum += n;\nSystem.out.println(sum);",
+        "This code sums an array of numbers and prints the result.",
+        (
+            "An integer sum is created and set to 0.",
+            "Each number in the array is added to sum.",
+            "The final sum is printed.",
+        ),
+    ),
+    "cpp": ExplainExample(
+        "std::vector<int> v = {3, 1, 2};\nstd::sort(v.begin(), v.end());",
+        "This code creates a vector of integers and sorts it in ascending order.",
+        (
+            "A vector holding 3, 1 and 2 is created.",
+            "std::sort orders the whole vector from smallest to largest.",
+        ),
+    ),
+    "go": ExplainExample(
+        "counts := map[string]int{}\nfor _, w := range words {\n\tcounts[w]++\n}",
+        "This code counts how often each word appears.",
+        (
+            "An empty map from word to count is created.",
+            "The loop visits every word, ignoring its index.",
+            "The count for the current word is increased by one.",
+            "The loop ends.",
+        ),
+    ),
+    "rust": ExplainExample(
+        "let names: Vec<String> = users.iter().map(|u| u.name.clone()).collect();",
+        "This code collects the name of every user into a new vector.",
+        (
+            "Each user's name is cloned and the results are collected into a Vec<String>.",
+        ),
+    ),
+    "sql": ExplainExample(
+        "SELECT name, COUNT(*)\nFROM orders\nGROUP BY name;",
+        "This query counts the orders placed under each name.",
+        (
+            "Selects each name and the number of rows for it.",
+            "The rows come from the orders table.",
+            "Rows are grouped by name so COUNT(*) counts per name.",
+        ),
+    ),
+    "shell": ExplainExample(
+        "for f in *.log; do\n  gzip \"$f\"\ndone",
+        "This script compresses every .log file in the current directory.",
+        (
+            "The loop visits each file ending in .log.",
+            "The current file is compressed with gzip.",
+            "The loop ends.",
+        ),
+    ),
+}
+
+IMPROVE_EXAMPLES: Dict[str, ImproveExample] = {
+    "python": ImproveExample(
+        "for i in range(len(items)):\n    print(items[i])",
+        "Loop can be simplified using direct iteration.",
+        "for item in items:\n    print(item)",
+    ),
+    "javascript": ImproveExample(
+        "var out = [];\nfor (var i = 0; i < xs.length; i++) out.push(xs[i] * 2);",
+        "Use const and Array.map instead of a manual loop.",
+        "const out = xs.map((x) => x * 2);",
+    ),
+    "java": ImproveExample(
+        "String s = \"\";\nfor (String p : parts) s += p;",
+        "Repeated string concatenation is quadratic; use String.join.",
+        "String s = String.join(\"\", parts);",
+    ),
+    "cpp": ImproveExample(
+        "for (int i = 0; i < v.size(); i++) total += v[i];",
+        "Use a range-based loop or std::accumulate; avoids a signed/unsigned comparison.",
+        "int total = std::accumulate(v.begin(), v.end(), 0);",
+    ),
+    "go": ImproveExample(
+        "var out []int\nfor _, x := range xs {\n\tout = append(out, x*2)\n}",
+        "Preallocate the slice since its final length is known.",
+        "out := make([]int, 0, len(xs))\nfor _, x := range xs {\n\tout = append(out, x*2)\n}",
+    ),
+    "rust": ImproveExample(
+        "let mut out = Vec::new();\nfor x in xs.iter() { out.push(x * 2); }",
+        "Use an iterator chain and collect.",
+        "let out: Vec<_> = xs.iter().map(|x| x * 2).collect();",
+    ),
+    "sql": ImproveExample(
+        "SELECT * FROM users WHERE id IN (SELECT user_id FROM orders);",
+        "Select only the needed columns and use EXISTS for the membership test.",
+        "SELECT u.id, u.name FROM users u\nWHERE EXISTS (SELECT 1 FROM orders o WHERE o.user_id = u.id);",
+    ),
+    "shell": ImproveExample(
+        "for f in $(ls *.txt); do cat $f; done",
+        "Do not parse ls output, and quote variables.",
+        "for f in *.txt; do cat \"$f\"; done",
+    ),
+}
+
+
+def few_shot_language(lang: str) -> str:
+    """
+    Registry key for a detected language.
+    """
+    lang = LANGUAGE_ALIASES.get(lang, lang)
+    return lang if lang in EXPLAIN_EXAMPLES else DEFAULT_LANGUAGE
+
+
+def render_explain(lang: str, example: ExplainExample) -> str:
+    expected = {
+        "language": lang,
+        "high_level_explanation": example.summary,
+        "line_by_line_explanation": {
+            str(i): text for i, text in enumerate(example.lines, start=1)
+        },
+    }
+    return f"\nEXAMPLE_INPUT:\n{example.code}\n\nEXPECTED_OUTPUT:\n{json.dumps(expected, indent=2)}\n"
+
+
+def render_improve(lang: str, example: ImproveExample) -> str:
+    """
+    Split format: JSON metadata followed by an <optimized_code> block.
+    """
+    metadata = {"language": lang, "improvements": example.improvements}
+    return (
+        f"\nEXAMPLE_INPUT:\n{example.code}\n\nEXPECTED_OUTPUT:\n{json.dumps(metadata, indent=2)}\n"
+        f"<optimized_code>\n{example.optimized_code}\n</optimized_code>\n"
+    )
+
+
+def render_improve_json(lang: str, example: ImproveExample) -> str:
+    """
+    Structured-output format: the optimized code inside the JSON.
+    """
+    expected = {
+        "language": lang,
+        "improvements": example.improvements,
+        "optimized_code": example.optimized_code,
+    }
+    return f"\nEXAMPLE_INPUT:\n{example.code}\n\nEXPECTED_OUTPUT:\n{json.dumps(expected, indent=2)}\n"
+
+
+# Rendered once; keyed by registry language
+EXPLAIN_FEW_SHOTS = {lang: render_explain(lang, ex) for lang, ex in EXPLAIN_EXAMPLES.items()}
+IMPROVE_FEW_SHOTS = {lang: render_improve(lang, ex) for lang, ex in IMPROVE_EXAMPLES.items()}
+IMPROVE_JSON_FEW_SHOTS = {lang: render_improve_json(lang, ex) for lang, ex in IMPROVE_EXAMPLES.items()}
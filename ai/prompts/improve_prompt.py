@@ -1,24 +1,13 @@
-from .base_prompt import SYSTEM_ROLE, JSON_INSTRUCTIONS
-
-# 1. Update the Example to show the split format
-FEW_SHOT_EXAMPLE = """
-EXAMPLE_INPUT:
-for i in range(len(items)):
-    print(items[i])
-
-EXPECTED_OUTPUT:
-{
-  "language": "python",
-  "improvements": "Loop can be simplified using direct iteration."
-}
-<optimized_code>
-for item in items:
-    print(item)
-</optimized_code>
-"""
+from .base_prompt import SYSTEM_ROLE, JSON_INSTRUCTIONS, prompt_version
+from .few_shots import DEFAULT_LANGUAGE, IMPROVE_FEW_SHOTS, IMPROVE_JSON_FEW_SHOTS
+
+# 1. Default examples (split and structured formats); see few_shots.py for the others
+FEW_SHOT_EXAMPLE = IMPROVE_FEW_SHOTS[DEFAULT_LANGUAGE]
+JSON_FEW_SHOT_EXAMPLE = IMPROVE_JSON_FEW_SHOTS[DEFAULT_LANGUAGE]
 
-# 2. Update the Template instructions
-IMPROVE_PROMPT_TEMPLATE = """
+# 2. Update the Template instructions. The static part is sent as the
+# system instruction; only the code changes per request.
+IMPROVE_INSTRUCTIONS_TEMPLATE = """
 {system_role}
 
 Your task: Suggest improvements for the provided code.  
@@ -33,11 +22,68 @@ IMPORTANT OUTPUT RULES:
 
 FEW_SHOT_EXAMPLE:
 {few_shot_example}
+"""
 
+IMPROVE_CODE_TEMPLATE = """
 Now improve the following code:
 
 CODE_INPUT:
 <code_input>
 {code}
 </code_input>
-"""
\ No newline at end of file
+"""
+
+IMPROVE_PROMPT_TEMPLATE = IMPROVE_INSTRUCTIONS_TEMPLATE + IMPROVE_CODE_TEMPLATE
+
+# 3. Changes whenever the template or any of its components change
+IMPROVE_PROMPT_VERSION = prompt_version(
+    IMPROVE_PROMPT_TEMPLATE, SYSTEM_ROLE, JSON_INSTRUCTIONS, *IMPROVE_FEW_SHOTS.values()
+)
+
+# 4. Structured-output variant: Gemini is constrained to a JSON schema and
+# escapes the code itself, so the optimized code goes inside the JSON
+IMPROVE_JSON_INSTRUCTIONS_TEMPLATE = """
+{system_role}
+
+Your task: Suggest improvements for the provided code.
+Focus on readability, optimization, best practices, and performance.
+
+{json_instructions}
+
+Use this JSON output format:
+{{
+  "language": "",
+  "improvements": "",
+  "optimized_code": ""
+}}
+"optimized_code" holds the complete optimized code as a JSON string.
+
+FEW_SHOT_EXAMPLE:
+{few_shot_example}
+"""
+
+IMPROVE_JSON_PROMPT_TEMPLATE = IMPROVE_JSON_INSTRUCTIONS_TEMPLATE + IMPROVE_CODE_TEMPLATE
+
+IMPROVE_JSON_PROMPT_VERSION = prompt_version(
+    IMPROVE_JSON_PROMPT_TEMPLATE, SYSTEM_ROLE, JSON_INSTRUCTIONS, *IMPROVE_JSON_FEW_SHOTS.values()
+)
+
+# 5. Static parts rendered once at import, one per few-shot language
+IMPROVE_SYSTEM_INSTRUCTIONS = {
+    lang: IMPROVE_INSTRUCTIONS_TEMPLATE.format(
+        system_role=SYSTEM_ROLE,
+        json_instructions=JSON_INSTRUCTIONS,
+        few_shot_example=example,
+    )
+    for lang, example in IMPROVE_FEW_SHOTS.items()
+}
+IMPROVE_JSON_SYSTEM_INSTRUCTIONS = {
+    lang: IMPROVE_JSON_INSTRUCTIONS_TEMPLATE.format(
+        system_role=SYSTEM_ROLE,
+        json_instructions=JSON_INSTRUCTIONS,
+        few_shot_example=example,
+    )
+    for lang, example in IMPROVE_JSON_FEW_SHOTS.items()
+}
+IMPROVE_SYSTEM_INSTRUCTION = IMPROVE_SYSTEM_INSTRUCTIONS[DEFAULT_LANGUAGE]
+IMPROVE_JSON_SYSTEM_INSTRUCTION = IMPROVE_JSON_SYSTEM_INSTRUCTIONS[DEFAULT_LANGUAGE]
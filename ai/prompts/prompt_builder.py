@@ -0,0 +1,87 @@
+"""
+Builds the per-request part of each prompt.
+
+The static part (system role, rules, few-shot example) is a system
+instruction chosen by `instruction_key`; the text built here carries only
+the code, with comment and whitespace noise removed (see code_minimizer).
+"""
+
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from .code_minimizer import estimate_tokens, minimize_for_explain, tidy_whitespace
+from .explain_prompt import (
+    EXPLAIN_CODE_TEMPLATE,
+    EXPLAIN_SYSTEM_INSTRUCTIONS,
+    BATCH_EXPLAIN_CODE_TEMPLATE,
+    BATCH_EXPLAIN_SYSTEM_INSTRUCTION,
+    BATCH_SNIPPET_TEMPLATE,
+)
+from .few_shots import few_shot_language
+from .improve_prompt import (
+    IMPROVE_CODE_TEMPLATE,
+    IMPROVE_SYSTEM_INSTRUCTIONS,
+    IMPROVE_JSON_SYSTEM_INSTRUCTIONS,
+)
+
+
+class BuiltPrompt(NamedTuple):
+    instruction_key: str             # key into SYSTEM_INSTRUCTIONS
+    text: str                        # the per-request part
+    line_map: Optional[List[int]]    # minimized line -> original line; None if unchanged
+    estimated_tokens: int            # system instruction + text
+
+
+# Every system instruction a request can be sent with, by key
+SYSTEM_INSTRUCTIONS: Dict[str, str] = {
+    "explain_batch": BATCH_EXPLAIN_SYSTEM_INSTRUCTION,
+    **{f"explain:{lang}": text for lang, text in EXPLAIN_SYSTEM_INSTRUCTIONS.items()},
+    **{f"improve:{lang}": text for lang, text in IMPROVE_SYSTEM_INSTRUCTIONS.items()},
+    **{f"improve_json:{lang}": text for lang, text in IMPROVE_JSON_SYSTEM_INSTRUCTIONS.items()},
+}
+
+_INSTRUCTION_TOKENS = {key: estimate_tokens(text) for key, text in SYSTEM_INSTRUCTIONS.items()}
+
+
+def _built(key: str, text: str, line_map: Optional[List[int]] = None) -> BuiltPrompt:
+    return BuiltPrompt(key, text, line_map, _INSTRUCTION_TOKENS[key] + estimate_tokens(text))
+
+
+def build_explain_prompt(code: str, lang: str) -> BuiltPrompt:
+    minimized, line_map = minimize_for_explain(code, lang)
+    return _built(
+        f"explain:{few_shot_language(lang)}",
+        EXPLAIN_CODE_TEMPLATE.format(code=minimized),
+        line_map,
+    )
+
+
+def build_batch_explain_prompt(snippets: List[Tuple[str, str]]) -> BuiltPrompt:
+    """
+    Snippets are minimized like single explains; callers map each
+    snippet's lines back with explain_line_map.
+    """
+    return _built(
+        "explain_batch",
+        BATCH_EXPLAIN_CODE_TEMPLATE.format(
+            count=len(snippets),
+            snippets="".join(
+                BATCH_SNIPPET_TEMPLATE.format(index=i, code=minimize_for_explain(code, lang)[0])
+                for i, (code, lang) in enumerate(snippets, start=1)
+            ),
+        ),
+    )
+
+
+def build_improve_prompt(code: str, lang: str, structured: bool) -> BuiltPrompt:
+    prefix = "improve_json" if structured else "improve"
+    return _built(
+        f"{prefix}:{few_shot_language(lang)}",
+        IMPROVE_CODE_TEMPLATE.format(code=tidy_whitespace(code)),
+    )
+
+
+def explain_line_map(code: str, lang: str) -> Optional[List[int]]:
+    """
+    The line map build_explain_prompt used for this code.
+    """
+    return minimize_for_explain(code, lang)[1]
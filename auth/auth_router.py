@@ -1,4 +1,5 @@
 # auth/auth_router.py
+import asyncio
 import datetime
 from fastapi import APIRouter, HTTPException, status
 from pydantic import BaseModel
@@ -9,19 +10,24 @@ from auth.jwt_handler import (
     create_refresh_token,
     verify_access_token,
     verify_refresh_token,
+    revoke_access_token,
 )
 from auth.user_store import (
     create_user,
     get_user,
-    verify_password,
+    hash_password_async,
+    verify_password_async,
+    update_password_hash,
     save_refresh_token,
     get_refresh_token,
     delete_refresh_token,
     delete_user_refresh_tokens,
 )
-from utils.logger import log_info
+from utils.logger import bind, log_info
+from utils.metrics import record_error, stage
+from utils.timed_route import TimedRoute
 
-router = APIRouter(prefix="/auth", tags=["Auth"])
+router = APIRouter(prefix="/auth", tags=["Auth"], route_class=TimedRoute)
 
 
 # ---------- Pydantic models ----------
@@ -51,11 +57,26 @@ class RefreshRequest(BaseModel):
 @router.post("/register", status_code=201)
 async def register(payload: RegisterRequest):
     """
-    Register a new user and store in JSON DB.
+    Register a new user and store in the user DB.
     """
+    with stage("user_db"):
+        existing = await asyncio.to_thread(get_user, payload.username)
+    if existing:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Username already exists",
+        )
+
+    # bcrypt runs in the hashing pool so the event loop stays free
+    with stage("password_hash"):
+        password_hash = await hash_password_async(payload.password)
+
     try:
-        user = create_user(payload.username, payload.password)
-        log_info(f"User registered: {user['username']}")
+        with stage("user_db"):
+            user = await asyncio.to_thread(
+                create_user, payload.username, password_hash=password_hash
+            )
+        log_info("User registered: %s", user["username"])
         return {"message": "User registered successfully"}
     except ValueError:
         raise HTTPException(
@@ -69,25 +90,43 @@ async def login(payload: LoginRequest):
     """
     Authenticate user and return access + refresh tokens.
     """
-    user = get_user(payload.username)
-
-    if not user or not verify_password(payload.password, user["password_hash"]):
+    bind(user=payload.username)
+    with stage("user_db"):
+        user = await asyncio.to_thread(get_user, payload.username)
+
+    valid, new_hash = False, None
+    if user:
+        with stage("password_verify"):
+            valid, new_hash = await verify_password_async(
+                payload.password, user["password_hash"]
+            )
+
+    if not valid:
+        record_error("bad_credentials")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials",
         )
 
-    access_token = create_access_token(payload.username)
-    refresh_token = create_refresh_token(payload.username)
+    # Transparent rehash when BCRYPT_ROUNDS changed since the hash was made
+    if new_hash:
+        with stage("user_db"):
+            await asyncio.to_thread(update_password_hash, payload.username, new_hash)
+        log_info("Password hash upgraded for user: %s", payload.username)
+
+    with stage("jwt"):
+        access_token = create_access_token(payload.username)
+        refresh_token = create_refresh_token(payload.username)
 
-    # Persist refresh token in JSON DB
+    # Persist refresh token in the user DB
     import time
     expires_at = (
             datetime.datetime.utcnow() + datetime.timedelta(days=7)
         ).isoformat() + "Z"
-    save_refresh_token(payload.username, refresh_token, expires_at)
+    with stage("user_db"):
+        await asyncio.to_thread(save_refresh_token, payload.username, refresh_token, expires_at)
 
-    log_info(f"User logged in: {payload.username}")
+    log_info("User logged in: %s", payload.username, sampled=True)
 
     return TokenResponse(
         access_token=access_token,
@@ -100,8 +139,10 @@ async def refresh(payload: RefreshRequest):
     """
     Exchange a valid refresh token for a new access token (and rotated refresh).
     """
-    stored = get_refresh_token(payload.refresh_token)
+    with stage("user_db"):
+        stored = await asyncio.to_thread(get_refresh_token, payload.refresh_token)
     if not stored:
+        record_error("token_invalid")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Unknown or revoked refresh token",
@@ -111,25 +152,30 @@ async def refresh(payload: RefreshRequest):
     decoded = verify_refresh_token(payload.refresh_token)
     username = decoded.get("sub")
 
-    # Optional: also check expiry stored in JSON DB
+    # Optional: also check expiry stored in the user DB
     import time
     now = int(time.time())
     if stored["expires_at"] < now:
-        delete_refresh_token(payload.refresh_token)
+        with stage("user_db"):
+            await asyncio.to_thread(delete_refresh_token, payload.refresh_token)
+        record_error("token_expired")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Refresh token expired",
         )
 
     # Rotate refresh token: delete old and create new
-    delete_refresh_token(payload.refresh_token)
+    with stage("user_db"):
+        await asyncio.to_thread(delete_refresh_token, payload.refresh_token)
 
-    new_access_token = create_access_token(username)
-    new_refresh_token = create_refresh_token(username)
+    with stage("jwt"):
+        new_access_token = create_access_token(username)
+        new_refresh_token = create_refresh_token(username)
     new_expires_at = now + 7 * 24 * 3600
-    save_refresh_token(username, new_refresh_token, new_expires_at)
+    with stage("user_db"):
+        await asyncio.to_thread(save_refresh_token, username, new_refresh_token, new_expires_at)
 
-    log_info(f"Refresh token used for user: {username}")
+    log_info("Refresh token used for user: %s", username, sampled=True)
 
     return TokenResponse(
         access_token=new_access_token,
@@ -139,14 +185,16 @@ async def refresh(payload: RefreshRequest):
 
 
 @router.post("/logout")
-async def logout(user=Depends(verify_access_token)):
+async def logout(token: str, user=Depends(verify_access_token)):
     """
-    Logs out the current user by deleting their refresh token(s).
-    Access token will expire naturally.
+    Logs out the current user by deleting their refresh token(s)
+    and revoking the access token used for this call.
     """
     username = user["sub"]
 
-    delete_user_refresh_tokens(username)
-    log_info(f"User logged out: {username}")
+    with stage("user_db"):
+        await asyncio.to_thread(delete_user_refresh_tokens, username)
+        await asyncio.to_thread(revoke_access_token, token, user["exp"])
+    log_info("User logged out: %s", username)
 
     return {"message": "Logged out successfully"}
\ No newline at end of file
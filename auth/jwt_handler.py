@@ -6,8 +6,11 @@ from typing import Literal, Dict
 import jwt
 from fastapi import HTTPException, status
 
+from auth.token_cache import VerifiedTokenCache, token_digest
+from auth.user_store import is_token_revoked, latest_revocation_id, revocations_since, revoke_token
 from config import settings
-from utils.logger import log_error
+from utils.logger import bind, log_error
+from utils.metrics import record_error, timed
 
 SECRET = settings.JWT_SECRET
 ALGORITHM = "HS256"
@@ -15,6 +18,9 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRY = 15 * 60          # 15 minutes
 REFRESH_TOKEN_EXPIRY = 7 * 24 * 3600   # 7 days
 
+# Already-verified access tokens and this worker's copy of the revocation set
+token_cache = VerifiedTokenCache(max_entries=settings.TOKEN_CACHE_MAX_ENTRIES)
+
 
 def _create_token(username: str, expires_in: int, token_type: Literal["access", "refresh"]) -> str:
     now = int(time.time())
@@ -27,7 +33,7 @@ def _create_token(username: str, expires_in: int, token_type: Literal["access",
     try:
         return jwt.encode(payload, SECRET, algorithm=ALGORITHM)
     except Exception as e:
-        log_error(f"JWT creation error: {str(e)}")
+        log_error("JWT creation error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to create JWT token"
@@ -42,33 +48,83 @@ def create_refresh_token(username: str) -> str:
     return _create_token(username, REFRESH_TOKEN_EXPIRY, "refresh")
 
 
+@timed("jwt")
 def verify_access_token(token: str) -> Dict:
     """
     Verifies JWT access token and returns decoded payload.
+    Tokens seen before skip the HMAC check until they expire; revocations
+    made by any worker are picked up first.
     """
+    digest = token_digest(token)
+    _sync_revocations()
+    if token_cache.is_revoked(digest):
+        _reject_revoked()
+
+    cached = token_cache.get(digest)
+    if cached is not None:
+        bind(user=cached.get("sub"))
+        return cached
+
+    # Not verified by this worker yet: the store has the final say
+    if is_token_revoked(digest):
+        _reject_revoked()
+
     try:
         decoded = jwt.decode(token, SECRET, algorithms=[ALGORITHM])
         if decoded.get("type") != "access":
+            record_error("token_invalid")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid token type",
             )
+        token_cache.put(digest, decoded)
+        bind(user=decoded.get("sub"))
         return decoded
 
     except jwt.ExpiredSignatureError:
         log_error("JWT Error: Access token expired")
+        record_error("token_expired")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Access token expired"
         )
     except jwt.InvalidTokenError:
         log_error("JWT Error: Invalid access token")
+        record_error("token_invalid")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid access token"
         )
 
 
+def revoke_access_token(token: str, expires_at: int) -> None:
+    """
+    Rejects the token on every worker from now until it expires.
+    """
+    digest = token_digest(token)
+    revoke_token(digest, expires_at)
+    token_cache.revoke(digest, expires_at)
+
+
+def _sync_revocations() -> None:
+    """
+    Applies revocations other workers stored since the last check. The
+    check itself is a single MAX(id) lookup.
+    """
+    if latest_revocation_id() > token_cache.revocation_id:
+        newest, revoked = revocations_since(token_cache.revocation_id)
+        token_cache.apply_revocations(revoked, newest)
+
+
+def _reject_revoked() -> None:
+    record_error("token_revoked")
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Access token revoked"
+    )
+
+
+@timed("jwt")
 def verify_refresh_token(token: str) -> Dict:
     """
     Verifies JWT refresh token and returns decoded payload.
@@ -76,6 +132,7 @@ def verify_refresh_token(token: str) -> Dict:
     try:
         decoded = jwt.decode(token, SECRET, algorithms=[ALGORITHM])
         if decoded.get("type") != "refresh":
+            record_error("token_invalid")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid refresh token type",
@@ -84,12 +141,14 @@ def verify_refresh_token(token: str) -> Dict:
 
     except jwt.ExpiredSignatureError:
         log_error("JWT Error: Refresh token expired")
+        record_error("token_expired")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Refresh token expired"
         )
     except jwt.InvalidTokenError:
         log_error("JWT Error: Invalid refresh token")
+        record_error("token_invalid")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid refresh token"
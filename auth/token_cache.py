@@ -0,0 +1,93 @@
+# auth/token_cache.py
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU of access tokens whose signature has already been verified,
+    keyed by token digest and valid until the token's own `exp`.
+
+    Also holds this worker's copy of the revocation set. The user store is
+    the source of truth; `revocation_id` is the newest stored revocation
+    applied here. Revoked digests are kept only until their token would
+    have expired anyway.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._verified: "OrderedDict[str, Dict]" = OrderedDict()
+        self._revoked: Dict[str, int] = {}
+        self._next_sweep = max_entries
+        self.revocation_id = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.revoked_rejections = 0
+
+    def get(self, digest: str) -> Optional[Dict]:
+        now = time.time()
+        with self._lock:
+            payload = self._verified.get(digest)
+            if payload is not None and payload["exp"] > now:
+                self._verified.move_to_end(digest)
+                self.hits += 1
+                return dict(payload)
+            if payload is not None:
+                del self._verified[digest]
+            self.misses += 1
+            return None
+
+    def put(self, digest: str, payload: Dict) -> None:
+        with self._lock:
+            self._verified[digest] = dict(payload)
+            self._verified.move_to_end(digest)
+            while len(self._verified) > self.max_entries:
+                self._verified.popitem(last=False)
+
+    def is_revoked(self, digest: str) -> bool:
+        with self._lock:
+            if digest in self._revoked:
+                self.revoked_rejections += 1
+                return True
+            return False
+
+    def revoke(self, digest: str, expires_at: int) -> None:
+        self.apply_revocations({digest: expires_at})
+
+    def apply_revocations(self, revoked: Dict[str, int], revocation_id: Optional[int] = None) -> None:
+        """
+        Drops the digests from the verified cache and rejects them from now
+        on; `revocation_id` is the newest stored revocation they include.
+        """
+        now = time.time()
+        with self._lock:
+            for digest, expires_at in revoked.items():
+                self._verified.pop(digest, None)
+                self._revoked[digest] = expires_at
+            if revocation_id is not None:
+                self.revocation_id = max(self.revocation_id, revocation_id)
+            # Amortised sweep: drop revocations whose tokens have expired
+            if len(self._revoked) > self._next_sweep:
+                self._revoked = {d: exp for d, exp in self._revoked.items() if exp > now}
+                self._next_sweep = max(self.max_entries, 2 * len(self._revoked))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._verified),
+                "revoked": len(self._revoked),
+                "revocation_id": self.revocation_id,
+                "hits": self.hits,
+                "misses": self.misses,
+                "revoked_rejections": self.revoked_rejections,
+            }
@@ -1,31 +1,164 @@
 # auth/user_store.py
 
-import json
+import asyncio
 import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, Tuple, Union
 
 from passlib.context import CryptContext
 
-DB_PATH = Path("data/users.json")
-DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-
-def _load_db() -> Dict[str, Any]:
-    if not DB_PATH.exists():
-        data = {"users": [], "refresh_tokens": []}
-        _save_db(data)
-        return data
-
-    with open(DB_PATH, "r") as f:
-        return json.load(f)
+from config import settings
+from utils.logger import log_info
 
+DB_PATH = Path(settings.USER_DB_PATH)
+DB_PATH.parent.mkdir(parents=True, exist_ok=True)
 
-def _save_db(data: Dict[str, Any]) -> None:
-    with open(DB_PATH, "w") as f:
-        json.dump(data, f, indent=2)
+# Pre-SQLite store, imported once on first start
+LEGACY_JSON_PATH = Path("data/users.json")
+
+# min == max == default makes hashes with any other cost "need update"
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
+
+# bcrypt releases the GIL while hashing, so a thread pool runs hashes on all
+# cores without blocking the event loop
+_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS or os.cpu_count() or 1,
+    thread_name_prefix="bcrypt",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username      TEXT PRIMARY KEY,
+    password_hash TEXT NOT NULL,
+    created_at    TEXT
+);
+CREATE TABLE IF NOT EXISTS refresh_tokens (
+    token      TEXT PRIMARY KEY,
+    username   TEXT NOT NULL,
+    expires_at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_username ON refresh_tokens (username);
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    digest     TEXT NOT NULL UNIQUE,
+    expires_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# One connection per thread; SQLite connections must not be shared across threads
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized_path: Optional[Path] = None
+
+
+# A write can wait up to busy_timeout for another worker's lock, so callers
+# on the event loop run store functions through asyncio.to_thread
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(DB_PATH, timeout=5.0, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    # WAL lets readers proceed while a writer commits; NORMAL is durable in WAL mode
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+
+def _init_db(conn: sqlite3.Connection) -> None:
+    global _initialized_path
+    with _init_lock:
+        if _initialized_path == DB_PATH:
+            return
+        conn.executescript(_SCHEMA)
+        migrate_from_json(LEGACY_JSON_PATH, conn)
+        _initialized_path = DB_PATH
+
+
+def _db() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "path", None) != DB_PATH:
+        conn = _connect()
+        _local.conn = conn
+        _local.path = DB_PATH
+    if _initialized_path != DB_PATH:
+        _init_db(conn)
+    return conn
+
+
+def _to_epoch(expires_at: Union[int, float, str]) -> int:
+    """
+    Accepts epoch seconds or an ISO-8601 timestamp (with optional trailing Z).
+    """
+    if isinstance(expires_at, str):
+        parsed = datetime.datetime.fromisoformat(expires_at.rstrip("Z"))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+        return int(parsed.timestamp())
+    return int(expires_at)
+
+
+# ---------- Migration ----------
+
+def migrate_from_json(json_path: Path, conn: Optional[sqlite3.Connection] = None) -> int:
+    """
+    One-shot import of the legacy users.json file.
+    Returns the number of users imported (0 if already migrated or no file).
+    """
+    conn = conn or _db()
+
+    done = conn.execute(
+        "SELECT value FROM meta WHERE key = 'migrated_from_json'"
+    ).fetchone()
+    if done or not json_path.exists():
+        return 0
+
+    with open(json_path, "r") as f:
+        data = json.load(f)
+
+    users = data.get("users", [])
+    tokens = data.get("refresh_tokens", [])
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Workers starting together all pass the check above; the first one
+        # to get the write lock migrates, the others find the marker here
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'migrated_from_json'").fetchone():
+            conn.execute("ROLLBACK")
+            return 0
+        conn.executemany(
+            "INSERT OR IGNORE INTO users (username, password_hash, created_at) VALUES (?, ?, ?)",
+            [(u["username"], u["password_hash"], u.get("created_at")) for u in users],
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO refresh_tokens (token, username, expires_at) VALUES (?, ?, ?)",
+            [(rt["token"], rt["username"], _to_epoch(rt["expires_at"])) for rt in tokens],
+        )
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('migrated_from_json', ?)",
+            (str(json_path),),
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+    log_info("Migrated %d users from %s to %s", len(users), json_path, DB_PATH)
+    return len(users)
 
 
 # ---------- Password helpers ----------
@@ -38,65 +171,144 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
-# ---------- User helpers ----------
+async def hash_password_async(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, hash_password, password)
 
-def get_user(username: str) -> Optional[Dict[str, Any]]:
-    db = _load_db()
-    for user in db["users"]:
-        if user["username"] == username:
-            return user
-    return None
 
+async def verify_password_async(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """
+    Verifies off the event loop. Returns (valid, new_hash); new_hash is set
+    when the stored hash was made with a different cost and should be replaced.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _hash_executor, pwd_context.verify_and_update, plain_password, hashed_password
+    )
 
-def create_user(username: str, password: str) -> Dict[str, Any]:
-    db = _load_db()
 
-    if any(u["username"] == username for u in db["users"]):
-        raise ValueError("User already exists")
+# ---------- User helpers ----------
 
+def get_user(username: str) -> Optional[Dict[str, Any]]:
+    row = _db().execute(
+        "SELECT username, password_hash, created_at FROM users WHERE username = ?",
+        (username,),
+    ).fetchone()
+    return dict(row) if row else None
+
+
+def create_user(
+    username: str, password: Optional[str] = None, password_hash: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Pass either the plain password or a hash from hash_password_async().
+    """
     user = {
         "username": username,
-        "password_hash": hash_password(password),
+        "password_hash": password_hash or hash_password(password),
         "created_at": datetime.datetime.utcnow().isoformat() + "Z"
     }
 
-    db["users"].append(user)
-    _save_db(db)
+    try:
+        _db().execute(
+            "INSERT INTO users (username, password_hash, created_at) VALUES (?, ?, ?)",
+            (user["username"], user["password_hash"], user["created_at"]),
+        )
+    except sqlite3.IntegrityError:
+        raise ValueError("User already exists")
+
     return user
 
 
-# ---------- Refresh token helpers ----------
+def update_password_hash(username: str, password_hash: str) -> None:
+    _db().execute(
+        "UPDATE users SET password_hash = ? WHERE username = ?",
+        (password_hash, username),
+    )
 
-def save_refresh_token(username: str, token: str, expires_at: int) -> None:
-    db = _load_db()
 
-    # Optional: remove old tokens for this user (single active refresh token)
-    db["refresh_tokens"] = [
-        rt for rt in db["refresh_tokens"] if rt["username"] != username
-    ]
+# ---------- Refresh token helpers ----------
 
-    db["refresh_tokens"].append(
-        {"username": username, "token": token, "expires_at": expires_at}
-    )
-    _save_db(db)
+def save_refresh_token(username: str, token: str, expires_at: Union[int, str]) -> None:
+    conn = _db()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Optional: remove old tokens for this user (single active refresh token)
+        conn.execute("DELETE FROM refresh_tokens WHERE username = ?", (username,))
+        conn.execute(
+            "INSERT OR REPLACE INTO refresh_tokens (token, username, expires_at) VALUES (?, ?, ?)",
+            (token, username, _to_epoch(expires_at)),
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
 
 
 def get_refresh_token(token: str) -> Optional[Dict[str, Any]]:
-    db = _load_db()
-    for rt in db["refresh_tokens"]:
-        if rt["token"] == token:
-            return rt
-    return None
+    row = _db().execute(
+        "SELECT username, token, expires_at FROM refresh_tokens WHERE token = ?",
+        (token,),
+    ).fetchone()
+    return dict(row) if row else None
 
 
 def delete_refresh_token(token: str) -> None:
-    db = _load_db()
-    db["refresh_tokens"] = [rt for rt in db["refresh_tokens"] if rt["token"] != token]
-    _save_db(db)
+    _db().execute("DELETE FROM refresh_tokens WHERE token = ?", (token,))
 
 def delete_user_refresh_tokens(username: str):
-    db = _load_db()
-    db["refresh_tokens"] = [
-        rt for rt in db["refresh_tokens"] if rt["username"] != username
-    ]
-    _save_db(db)
+    _db().execute("DELETE FROM refresh_tokens WHERE username = ?", (username,))
+
+
+# ---------- Access token revocation ----------
+# Shared by every worker. Ids only grow, so a worker that has applied the
+# revocations up to id N only needs the rows after N.
+
+def revoke_token(digest: str, expires_at: int) -> None:
+    """
+    Records a revoked access token (by digest) until it expires, and drops
+    revocations whose tokens have expired.
+    """
+    conn = _db()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DELETE FROM revoked_tokens WHERE expires_at <= ?", (int(time.time()),))
+        conn.execute(
+            "INSERT OR IGNORE INTO revoked_tokens (digest, expires_at) VALUES (?, ?)",
+            (digest, int(expires_at)),
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def is_token_revoked(digest: str) -> bool:
+    row = _db().execute(
+        "SELECT 1 FROM revoked_tokens WHERE digest = ? AND expires_at > ?",
+        (digest, int(time.time())),
+    ).fetchone()
+    return row is not None
+
+
+def latest_revocation_id() -> int:
+    """
+    Cheap change check: the newest revocation's id (0 when there is none).
+    """
+    row = _db().execute("SELECT MAX(id) FROM revoked_tokens").fetchone()
+    return row[0] or 0
+
+
+def revocations_since(revocation_id: int) -> Tuple[int, Dict[str, int]]:
+    """
+    Revocations recorded after `revocation_id`, as (newest id, {digest: expires_at}).
+    """
+    rows = _db().execute(
+        "SELECT id, digest, expires_at FROM revoked_tokens WHERE id > ?",
+        (revocation_id,),
+    ).fetchall()
+    now = time.time()
+    newest = max([revocation_id] + [row["id"] for row in rows])
+    return newest, {row["digest"]: row["expires_at"] for row in rows if row["expires_at"] > now}
@@ -0,0 +1,488 @@
+"""
+End-to-end throughput and tail latency of main.app, with the LLM replaced
+by the local stub (LLM_BACKEND=local, see services/local_llm_backend.py).
+
+    python -m benchmarks.bench_api [--transport asgi|uvicorn] [--requests 200]
+        [--concurrency 16] [--scenarios register,login,explain,...]
+        [--latency-ms 50] [--save-baseline] [--threshold 0.1]
+
+The asgi transport calls the app in-process, so it measures the app alone;
+uvicorn adds the HTTP server and real sockets. Each scenario reports
+requests/s, p50/p95/p99 latency, event-loop lag (asgi only, where the app
+shares the benchmark's loop) and resident memory of the serving process.
+
+--save-baseline writes the results to the baseline file (one entry per
+transport). Otherwise the results are compared with it, and the run exits
+non-zero when throughput drops or p95/p99 latency grows by more than
+--threshold. Baselines are machine specific; record them on the machine
+that runs the comparison.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baselines" / "bench_api.json"
+
+PASSWORD = "correct horse battery staple"
+
+# Metric -> +1 when higher is better, -1 when lower is better
+COMPARED_METRICS = {"rps": 1, "p95_ms": -1, "p99_ms": -1}
+# Latency changes smaller than this are noise, whatever the ratio
+LATENCY_FLOOR_MS = 1.0
+
+
+class Response(NamedTuple):
+    status: int
+    body: bytes
+
+
+# ---------- Transports ----------
+
+class AsgiClient:
+    """
+    Calls the ASGI app directly: no sockets and no server.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def request(self, method: str, path: str, body: bytes = b"",
+                      content_type: str = "application/json") -> Response:
+        path, _, query = path.partition("?")
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query.encode(),
+            "root_path": "",
+            "headers": [
+                (b"host", b"bench"),
+                (b"content-type", content_type.encode()),
+                (b"content-length", str(len(body)).encode()),
+            ],
+            "client": ("127.0.0.1", 0),
+            "server": ("bench", 80),
+        }
+        status, chunks = 0, []
+        finished = asyncio.Event()
+        body_sent = False
+
+        async def receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            # Streaming responses watch for a disconnect; only send it at the end
+            await finished.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    finished.set()
+
+        try:
+            await self.app(scope, receive, send)
+        except Exception:
+            # Starlette re-raises after answering 500; servers log and go on
+            status = status or 500
+        finished.set()
+        return Response(status, b"".join(chunks))
+
+    async def close(self) -> None:
+        pass
+
+
+class HttpClient:
+    """
+    One keep-alive HTTP/1.1 connection, enough for uvicorn's responses
+    (Content-Length or chunked bodies).
+    """
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def request(self, method: str, path: str, body: bytes = b"",
+                      content_type: str = "application/json") -> Response:
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+
+        head = (
+            f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+            f"Content-Type: {content_type}\r\nContent-Length: {len(body)}\r\n\r\n"
+        )
+        self._writer.write(head.encode() + body)
+        await self._writer.drain()
+
+        raw_head = await self._reader.readuntil(b"\r\n\r\n")
+        status_line, *header_lines = raw_head.decode("latin-1").split("\r\n")
+        headers = {}
+        for line in header_lines:
+            name, _, value = line.partition(":")
+            if name:
+                headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding") == "chunked":
+            chunks = []
+            while True:
+                size = int((await self._reader.readline()).split(b";")[0], 16)
+                chunk = await self._reader.readexactly(size + 2)  # data + CRLF
+                if size == 0:
+                    break
+                chunks.append(chunk[:-2])
+            payload = b"".join(chunks)
+        else:
+            payload = await self._reader.readexactly(int(headers.get("content-length", 0)))
+
+        if headers.get("connection") == "close":
+            await self.close()
+        return Response(int(status_line.split()[1]), payload)
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = self._reader = None
+
+
+# ---------- Scenarios ----------
+
+def _json(payload: Dict) -> bytes:
+    return json.dumps(payload).encode()
+
+
+def _code(salt: str) -> str:
+    """
+    A small Python function, unique per salt so each request misses the cache.
+    """
+    return "\n".join([
+        "def weighted_total(values, weights):",
+        '    """Sum of values scaled by their weights."""',
+        f'    label = "{salt}"',
+        "    total = 0",
+        "    for value, weight in zip(values, weights):",
+        "        # zero weights contribute nothing",
+        "        if weight:",
+        "            total += value * weight",
+        "    return label, total",
+        "",
+        "",
+        "print(weighted_total([1, 2, 3], [0.5, 0.25, 0.25]))",
+    ])
+
+
+async def _session(client, username: str) -> Dict:
+    await client.request("POST", "/auth/register", _json({"username": username, "password": PASSWORD}))
+    response = await client.request("POST", "/auth/login", _json({"username": username, "password": PASSWORD}))
+    if response.status != 200:
+        raise RuntimeError(f"Login for {username} failed with {response.status}: {response.body[:200]!r}")
+    return json.loads(response.body)
+
+
+async def _prepare_user(client, worker: str) -> Dict:
+    return {"username": worker}
+
+
+async def _register(client, state: Dict, i: int) -> Response:
+    username = f"{state['username']}_{i}"
+    return await client.request("POST", "/auth/register", _json({"username": username, "password": PASSWORD}))
+
+
+async def _prepare_session(client, worker: str) -> Dict:
+    return {"username": worker, **(await _session(client, worker))}
+
+
+async def _login(client, state: Dict, i: int) -> Response:
+    return await client.request(
+        "POST", "/auth/login", _json({"username": state["username"], "password": PASSWORD})
+    )
+
+
+async def _refresh(client, state: Dict, i: int) -> Response:
+    # Tokens rotate, so each worker follows its own chain
+    response = await client.request("POST", "/auth/refresh", _json({"refresh_token": state["refresh_token"]}))
+    if response.status == 200:
+        state.update(json.loads(response.body))
+    return response
+
+
+def _code_call(path: str, salted: bool) -> Callable[..., Awaitable[Response]]:
+    async def run(client, state: Dict, i: int) -> Response:
+        code = _code(f"{path}:{i}" if salted else "cached")
+        return await client.request(
+            "POST", f"{path}?token={state['access_token']}", code.encode(), "text/plain"
+        )
+    return run
+
+
+# name -> (prepare(client, worker) -> state, run(client, state, i), expected status)
+SCENARIOS = {
+    "register": (_prepare_user, _register, 201),
+    "login": (_prepare_session, _login, 200),
+    "refresh": (_prepare_session, _refresh, 200),
+    "explain": (_prepare_session, _code_call("/api/explain/code", salted=True), 200),
+    "explain_cached": (_prepare_session, _code_call("/api/explain/code", salted=False), 200),
+    "explain_stream": (_prepare_session, _code_call("/api/explain/code/stream", salted=True), 200),
+    "improve": (_prepare_session, _code_call("/api/improve/code", salted=True), 200),
+}
+
+
+# ---------- Measurement ----------
+
+def _percentile(ordered: List[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] if ordered else 0.0
+
+
+def _rss_mb(pid) -> Optional[float]:
+    """
+    Current resident set size of a process (Linux only).
+    """
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+async def _ticker(lags: List[float], stop: asyncio.Event, interval: float = 0.005) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append((time.perf_counter() - start - interval) * 1000)
+
+
+async def _run_scenario(name: str, make_client, requests: int, concurrency: int,
+                        measure_lag: bool, server_pid) -> Dict:
+    prepare, run, expected = SCENARIOS[name]
+    clients = [make_client() for _ in range(concurrency)]
+    states = [await prepare(client, f"{name}{worker}") for worker, client in enumerate(clients)]
+
+    indexes = iter(range(requests))
+    latencies: List[float] = []
+    errors = 0
+
+    async def worker(client, state) -> None:
+        nonlocal errors
+        for i in indexes:
+            start = time.perf_counter()
+            response = await run(client, state, i)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status != expected:
+                errors += 1
+
+    lags: List[float] = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(_ticker(lags, stop))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(client, state) for client, state in zip(clients, states)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await ticker
+    for client in clients:
+        await client.close()
+
+    latencies.sort()
+    lags.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(_percentile(latencies, 0.95), 2),
+        "p99_ms": round(_percentile(latencies, 0.99), 2),
+        "loop_lag_p99_ms": round(_percentile(lags, 0.99), 2) if measure_lag else None,
+        "loop_lag_max_ms": round(lags[-1], 2) if measure_lag and lags else None,
+        "rss_mb": _rss_mb(server_pid),
+    }
+
+
+async def _run_asgi(args) -> Dict[str, Dict]:
+    import main
+
+    # One log line per request would dominate the measurement
+    logging.getLogger("code_explainer").setLevel(logging.WARNING)
+
+    results = {}
+    async with main.app.router.lifespan_context(main.app):
+        for name in args.scenarios:
+            results[name] = await _run_scenario(
+                name, lambda: AsgiClient(main.app), args.requests, args.concurrency,
+                measure_lag=True, server_pid="self",
+            )
+    return results
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _run_uvicorn(args) -> Dict[str, Dict]:
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + 20
+        while True:
+            try:
+                probe = HttpClient("127.0.0.1", port)
+                await probe.request("GET", "/")
+                await probe.close()
+                break
+            except OSError:
+                if server.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("uvicorn did not start; run `uvicorn main:app` to see why")
+                await asyncio.sleep(0.1)
+
+        results = {}
+        for name in args.scenarios:
+            results[name] = await _run_scenario(
+                name, lambda: HttpClient("127.0.0.1", port), args.requests, args.concurrency,
+                measure_lag=False, server_pid=server.pid,
+            )
+        return results
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+# ---------- Baselines ----------
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[str]:
+    """
+    Regressions of `results` against `baseline` beyond `threshold` (a ratio).
+    """
+    regressions = []
+    for scenario, metrics in results.items():
+        base = baseline.get(scenario)
+        if not base:
+            continue
+        for metric, direction in COMPARED_METRICS.items():
+            old, new = base.get(metric), metrics.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if change * direction >= -threshold:
+                continue
+            if metric.endswith("_ms") and new - old < LATENCY_FLOOR_MS:
+                continue
+            regressions.append(f"{scenario} {metric}: {old:g} -> {new:g} ({change:+.0%})")
+    return regressions
+
+
+def _print_results(transport: str, results: Dict[str, Dict]) -> None:
+    def show(value) -> str:
+        return "-" if value is None else f"{value:g}"
+
+    columns = ["rps", "p50_ms", "p95_ms", "p99_ms", "loop_lag_p99_ms", "loop_lag_max_ms", "rss_mb", "errors"]
+    print(f"{transport:<16}" + "".join(f"{column:>17}" for column in columns))
+    for scenario, metrics in results.items():
+        print(f"{scenario:<16}" + "".join(f"{show(metrics[column]):>17}" for column in columns))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transport", choices=("asgi", "uvicorn"), default="asgi")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--latency-ms", type=int, default=50, help="median stub LLM latency")
+    parser.add_argument("--tokens-per-second", type=int, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--bcrypt-rounds", type=int, help="defaults to the configured cost")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    options = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "latency_ms": args.latency_ms,
+        "tokens_per_second": args.tokens_per_second,
+        "error_rate": args.error_rate,
+        "bcrypt_rounds": args.bcrypt_rounds,
+    }
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        # Settings are read at import time (also by the uvicorn child)
+        os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+        os.environ["LLM_BACKEND"] = "local"
+        os.environ["LOCAL_LLM_LATENCY_MS"] = str(args.latency_ms)
+        os.environ["LOCAL_LLM_TOKENS_PER_SECOND"] = str(args.tokens_per_second)
+        os.environ["LOCAL_LLM_ERROR_RATE"] = str(args.error_rate)
+        os.environ["LOCAL_LLM_SEED"] = "0"
+        os.environ["USER_DB_PATH"] = str(Path(data_dir) / "users.db")
+        if args.bcrypt_rounds:
+            os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+
+        runner = _run_asgi if args.transport == "asgi" else _run_uvicorn
+        results = asyncio.run(runner(args))
+
+    _print_results(args.transport, results)
+
+    baselines = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    if args.save_baseline:
+        stored = baselines.setdefault(args.transport, {"options": options, "results": {}})
+        if stored["options"] != options:
+            stored.update(options=options, results={})
+        stored["results"].update(results)
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+        print(f"baseline saved to {args.baseline}")
+        return
+
+    stored = baselines.get(args.transport)
+    if stored is None:
+        print(f"no {args.transport} baseline in {args.baseline}; run with --save-baseline first")
+        return
+    if stored["options"] != options:
+        print(f"baseline was recorded with {stored['options']}; comparison skipped")
+        return
+
+    regressions = compare(results, stored["results"], args.threshold)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if regressions:
+        sys.exit(1)
+    print(f"no regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Event-loop responsiveness during a burst of logins.
+
+    python -m benchmarks.bench_login_storm [--logins 32]
+
+Runs the same burst of bcrypt verifications twice, first inline on the
+event loop (the old behaviour) and then through verify_password_async.
+While each burst runs, a stand-in "explain" request (a 50 ms awaitable)
+fires every 50 ms, and a ticker measures how late the loop wakes up.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+from auth import user_store  # noqa: E402
+
+PASSWORD = "correct horse battery staple"
+
+
+async def _ticker(lags: list, stop: asyncio.Event, interval: float = 0.005) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append((time.perf_counter() - start - interval) * 1000)
+
+
+async def _explain_requests(latencies: list, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.05)  # an LLM call that is already async
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def _storm(password_hash: str, logins: int, offload: bool) -> dict:
+    lags, explain_ms = [], []
+    stop = asyncio.Event()
+    background = [
+        asyncio.create_task(_ticker(lags, stop)),
+        asyncio.create_task(_explain_requests(explain_ms, stop)),
+    ]
+    await asyncio.sleep(0.01)
+
+    async def login():
+        if offload:
+            await user_store.verify_password_async(PASSWORD, password_hash)
+        else:
+            user_store.verify_password(PASSWORD, password_hash)
+            await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await asyncio.gather(*background)
+
+    return {
+        "logins/s": logins / elapsed,
+        "loop lag max ms": max(lags, default=0.0),
+        "loop lag p50 ms": statistics.median(lags) if lags else 0.0,
+        "explain max ms": max(explain_ms, default=0.0),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=32)
+    args = parser.parse_args()
+
+    password_hash = user_store.hash_password(PASSWORD)
+
+    for label, offload in (("inline", False), ("thread pool", True)):
+        stats = asyncio.run(_storm(password_hash, args.logins, offload))
+        print(f"{label:<12} " + "  ".join(f"{k}={v:.1f}" for k, v in stats.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Serialization time and bytes on the wire for large explanations.
+
+    python -m benchmarks.bench_serialization [--lines 500,5000] [--repeat 20]
+
+A prebuilt CodeExplanationResponse of each size is returned by two routes:
+one through FastAPI's response_model pass (the path before
+FAST_JSON_RESPONSES), one as utils.fast_json.ModelResponse. Each is
+requested through CompressionMiddleware with no Accept-Encoding, with gzip,
+and with br when the brotli package is installed. The time is the median
+of --repeat in-process ASGI calls, so it is serialization (and compression)
+plus FastAPI's routing overhead, which both routes share.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+from typing import Dict, List, Tuple
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+from fastapi import FastAPI  # noqa: E402
+
+from config import settings  # noqa: E402
+from models.responses import CodeExplanationResponse  # noqa: E402
+from utils import compression  # noqa: E402
+from utils.compression import CompressionMiddleware  # noqa: E402
+from utils.fast_json import model_response  # noqa: E402
+
+WORDS = (
+    "adds the weighted value to the running total loops over every item in input list "
+    "returns early when empty checks bounds calls helper stores result in cache variable"
+).split()
+
+
+def explanation(lines: int, seed: int = 0) -> CodeExplanationResponse:
+    rng = random.Random(seed)
+    return CodeExplanationResponse(
+        language="python",
+        high_level_explanation="Computes weighted totals over a list of records.",
+        line_by_line_explanation={
+            str(line): " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + "."
+            for line in range(1, lines + 1)
+        },
+    )
+
+
+def build_app(result: CodeExplanationResponse):
+    app = FastAPI()
+
+    @app.get("/default", response_model=CodeExplanationResponse)
+    async def default():
+        return result
+
+    @app.get("/fast", response_model=CodeExplanationResponse)
+    async def fast():
+        return model_response(result)
+
+    return CompressionMiddleware(
+        app,
+        minimum_size=settings.COMPRESSION_MIN_BYTES,
+        thread_size=settings.COMPRESSION_THREAD_BYTES,
+        gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+        brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+    )
+
+
+async def call(app, path: str, accept_encoding: str) -> Tuple[int, bytes]:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench"), (b"accept-encoding", accept_encoding.encode())],
+        "client": ("127.0.0.1", 0),
+        "server": ("bench", 80),
+    }
+    status = 0
+    body: List[bytes] = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            body.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, b"".join(body)
+
+
+async def measure(app, path: str, accept_encoding: str, repeat: int) -> Dict[str, float]:
+    await call(app, path, accept_encoding)  # warm-up: model adapters, route compilation
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        status, body = await call(app, path, accept_encoding)
+        times.append((time.perf_counter() - start) * 1000)
+        assert status == 200, status
+    return {"ms": statistics.median(times), "bytes": len(body)}
+
+
+async def run(sizes: List[int], repeat: int) -> None:
+    encodings = ["identity", "gzip"] + (["br"] if compression.brotli is not None else [])
+    for lines in sizes:
+        app = build_app(explanation(lines))
+        print(f"{lines} lines")
+        print(f"  {'path':<9}{'encoding':<10}{'median ms':>10}{'bytes':>11}")
+        for path in ("default", "fast"):
+            for encoding in encodings:
+                result = await measure(app, f"/{path}", encoding, repeat)
+                print(f"  {path:<9}{encoding:<10}{result['ms']:>10.2f}{result['bytes']:>11,}")
+    if compression.brotli is None:
+        print("(br skipped: the brotli package is not installed)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lines", default="500,5000", help="Comma-separated explanation sizes.")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run([int(size) for size in args.lines.split(",")], args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Latency of auth/user_store operations as the user table grows.
+
+    python -m benchmarks.bench_user_store [--sizes 1000 10000 100000]
+
+Each size gets a fresh SQLite file seeded in bulk with a fixed bcrypt hash
+(hashing 100k passwords would dominate the run), then login-path
+operations are timed against random existing users.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+from auth import user_store  # noqa: E402
+
+FIXED_HASH = "$2b$12$VdGosJurVcjvx92AN6jmFu7KXma13MTzSDLWPYnoBgdc./o.IimSe"
+
+
+def _seed(size: int) -> None:
+    conn = user_store._db()
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT INTO users (username, password_hash, created_at) VALUES (?, ?, ?)",
+        ((f"user{i}", FIXED_HASH, "2025-01-01T00:00:00Z") for i in range(size)),
+    )
+    conn.executemany(
+        "INSERT INTO refresh_tokens (token, username, expires_at) VALUES (?, ?, ?)",
+        ((f"token{i}", f"user{i}", 2_000_000_000) for i in range(size)),
+    )
+    conn.execute("COMMIT")
+
+
+def _time_us(fn, samples: int) -> float:
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(timings)
+
+
+def run(size: int, samples: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        user_store.DB_PATH = Path(tmp) / "users.db"
+        user_store.LEGACY_JSON_PATH = Path(tmp) / "missing.json"
+        _seed(size)
+
+        def pick() -> int:
+            return random.randrange(size)
+
+        results = {
+            "get_user": _time_us(lambda: user_store.get_user(f"user{pick()}"), samples),
+            "get_refresh_token": _time_us(
+                lambda: user_store.get_refresh_token(f"token{pick()}"), samples
+            ),
+        }
+
+        def rotate():
+            i = pick()
+            user_store.save_refresh_token(f"user{i}", f"token{i}", 2_000_000_000)
+
+        results["save_refresh_token"] = _time_us(rotate, samples)
+        results["delete_user_refresh_tokens"] = _time_us(
+            lambda: user_store.delete_user_refresh_tokens(f"user{pick()}"), samples
+        )
+        return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--samples", type=int, default=2_000)
+    args = parser.parse_args()
+
+    print(f"{'users':>8}  {'operation':<28} {'median µs':>10}")
+    for size in args.sizes:
+        for op, us in run(size, args.samples).items():
+            print(f"{size:>8}  {op:<28} {us:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
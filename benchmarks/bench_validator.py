@@ -0,0 +1,74 @@
+"""
+ValidatorService against the per-call pattern loop it replaced.
+
+    python -m benchmarks.bench_validator [--size-mb 1] [--repeat 5]
+
+Both validators scan a clean input of --size-mb megabytes (the worst case,
+since nothing matches early). The size cap is lifted so the scan itself is
+measured, then the admission path is timed with the default cap.
+"""
+
+import argparse
+import os
+import re
+import time
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+from config import settings  # noqa: E402
+from services.validator_service import ValidatorService  # noqa: E402
+
+
+def legacy_is_valid_code(code: str) -> bool:
+    """
+    The validator this module replaced, kept verbatim for comparison.
+    """
+    if not code or code.strip() == "":
+        return False
+    dangerous_patterns = [
+        r"rm\s+-rf",
+        r"shutdown\s+-h",
+        r"del\s+/f",
+        r"DROP\s+DATABASE",
+        r":(){:|:&};:"  # fork bomb
+    ]
+    for pattern in dangerous_patterns:
+        if re.search(pattern, code, re.IGNORECASE):
+            return False
+    return True
+
+
+def _ms(fn, code: str, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(code)
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-mb", type=float, default=1.0)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    line = "for (int i = 0; i < n; i++) { total += values[i] * weights[i]; }\n"
+    code = line * int(args.size_mb * 1024 * 1024 / len(line))
+
+    default_bytes, default_lines = settings.MAX_CODE_BYTES, settings.MAX_CODE_LINES
+    settings.MAX_CODE_BYTES = settings.MAX_CODE_LINES = 1 << 40
+    print(f"clean {len(code) / 1024:.0f} KB input, full scan")
+    print(f"  legacy loop      {_ms(legacy_is_valid_code, code, args.repeat):8.2f} ms")
+    print(f"  combined rules   {_ms(ValidatorService.is_valid_code, code, args.repeat):8.2f} ms")
+
+    settings.MAX_CODE_BYTES, settings.MAX_CODE_LINES = default_bytes, default_lines
+    print(f"same input, default cap of {default_bytes} bytes")
+    print(f"  size admission   {_ms(ValidatorService.is_valid_code, code, args.repeat):8.2f} ms")
+
+    print("legacy fork-bomb rule on ':(){ :|:& };:' ->",
+          "blocked" if not legacy_is_valid_code(":(){ :|:& };:") else "missed")
+    print("new fork-bomb rule on ':(){ :|:& };:'    ->",
+          ValidatorService.validate(":(){ :|:& };:").rule or "missed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""
+Labelled snippets for the language-detection benchmark.
+Several are chosen to trip the old first-match-wins rules
+(`=>` in C++, `import` in Java, `print(` in C-like code).
+"""
+
+CORPUS = [
+    ("python", """
+import os
+
+def list_files(path):
+    for name in os.listdir(path):
+        print(name)
+"""),
+    ("python", """
+class Stack:
+    def __init__(self):
+        self.items = []
+
+    def push(self, item):
+        self.items.append(item)
+"""),
+    ("python", """
+numbers = [1, 2, 3]
+squares = [n * n for n in numbers]
+if squares:
+    print(squares)
+"""),
+    ("python", """
+from typing import List
+
+def total(values: List[int]) -> int:
+    return sum(values)
+"""),
+    ("javascript", """
+const add = (a, b) => a + b;
+console.log(add(2, 3));
+"""),
+    ("javascript", """
+function greet(name) {
+  return "Hello " + name;
+}
+document.getElementById("out").textContent = greet("Ana");
+"""),
+    ("javascript", """
+const fs = require("fs");
+let data = fs.readFileSync("a.txt", "utf8");
+if (data === "") { console.error("empty"); }
+"""),
+    ("typescript", """
+interface User {
+  id: number;
+  name: string;
+}
+function show(user: User): void {
+  console.log(user.name);
+}
+"""),
+    ("typescript", """
+let count: number = 0;
+const names: string[] = [];
+export const inc = (): number => ++count;
+"""),
+    ("java", """
+import java.util.List;
+import java.util.ArrayList;
+
+public class Main {
+    public static void main(String[] args) {
+        List<String> items = new ArrayList<>();
+        System.out.println(items.size());
+    }
+}
+"""),
+    ("java", """
+package com.example;
+
+public class Greeter {
+    @Override
+    public String toString() {
+        return "Greeter";
+    }
+}
+"""),
+    ("java", """
+public class Lambda {
+    public static void main(String[] args) {
+        Runnable r = () -> System.out.println("hi");
+        r.run();
+    }
+}
+"""),
+    ("cpp", """
+#include <iostream>
+#include <vector>
+
+int main() {
+    std::vector<int> v = {1, 2, 3};
+    for (auto x : v) std::cout << x << std::endl;
+    return 0;
+}
+"""),
+    ("cpp", """
+#include <map>
+using namespace std;
+
+template <typename T>
+T twice(T x) { return x * 2; }
+
+int main() {
+    map<int, int> m;
+    auto f = [](int a) -> int { return a; };
+    cout << twice(3);
+}
+"""),
+    ("c", """
+#include <stdio.h>
+#include <stdlib.h>
+
+int main(void) {
+    int *p = malloc(sizeof(int));
+    *p = 4;
+    printf("%d\\n", *p);
+    free(p);
+    return 0;
+}
+"""),
+    ("c", """
+#include "list.h"
+
+void print_list(struct node *head) {
+    while (head) {
+        printf("%d ", head->value);
+        head = head->next;
+    }
+}
+"""),
+    ("csharp", """
+using System;
+
+namespace Demo
+{
+    public class Program
+    {
+        public static void Main(string[] args)
+        {
+            var x = 5;
+            Console.WriteLine(x);
+        }
+    }
+}
+"""),
+    ("go", """
+package main
+
+import "fmt"
+
+func main() {
+    x := 5
+    fmt.Println(x)
+}
+"""),
+    ("go", """
+package store
+
+func (s *Store) Get(key string) (string, bool) {
+    v, ok := s.items[key]
+    return v, ok
+}
+"""),
+    ("rust", """
+use std::collections::HashMap;
+
+fn main() {
+    let mut m = HashMap::new();
+    m.insert("a", 1);
+    println!("{:?}", m);
+}
+"""),
+    ("rust", """
+struct Point { x: i32, y: i32 }
+
+impl Point {
+    fn norm(&self) -> i32 { self.x * self.x + self.y * self.y }
+}
+"""),
+    ("php", """
+<?php
+$name = "World";
+echo "Hello " . $name;
+?>
+"""),
+    ("ruby", """
+def greet(name)
+  puts "Hello #{name}"
+end
+
+[1, 2, 3].each do |n|
+  puts n
+end
+"""),
+    ("sql", """
+SELECT id, name
+FROM users
+WHERE active = 1
+ORDER BY name;
+"""),
+    ("sql", """
+CREATE TABLE orders (id INT PRIMARY KEY, total DECIMAL);
+INSERT INTO orders VALUES (1, 9.99);
+"""),
+    ("shell", """
+#!/bin/bash
+for f in *.txt; do
+  echo "$f"
+done
+"""),
+    ("html", """
+<!DOCTYPE html>
+<html>
+<head><title>Demo</title></head>
+<body><div class="box">Hi</div></body>
+</html>
+"""),
+    ("html", """
+<html>
+  <body>
+    <ul><li>One</li><li>Two</li></ul>
+  </body>
+</html>
+"""),
+    ("unknown", """
+Just some prose that is not code at all.
+"""),
+]
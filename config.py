@@ -1,5 +1,7 @@
 # config.py
 
+from typing import Dict, List, Optional
+
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 
@@ -9,6 +11,136 @@ load_dotenv()  # Loads .env variables
 class Settings(BaseSettings):
     GEMINI_API_KEY: str
     JWT_SECRET: str = "mysecretkey"
+    # Verified access tokens kept in memory to skip repeat signature checks
+    TOKEN_CACHE_MAX_ENTRIES: int = 10000
+
+    GEMINI_MODEL: str = "models/gemini-2.0-flash"
+    # Resilience (services/resilience.py): per-attempt timeout, retries with
+    # jittered exponential backoff, optional hedged requests, and a circuit
+    # breaker that answers 503 while Gemini is failing
+    GEMINI_TIMEOUT_SECONDS: float = 60.0
+    GEMINI_MAX_RETRIES: int = 2
+    GEMINI_RETRY_BASE_DELAY_MS: int = 250
+    GEMINI_RETRY_MAX_DELAY_MS: int = 4000
+    GEMINI_HEDGE: bool = False
+    GEMINI_HEDGE_MIN_DELAY_MS: int = 500
+    CIRCUIT_FAILURE_THRESHOLD: int = 5
+    CIRCUIT_OPEN_SECONDS: int = 30
+    # Model routing (services/model_router.py). The fast model takes small
+    # explain inputs, and all traffic while the primary model's p95 latency
+    # is above the SLO. An empty GEMINI_FAST_MODEL disables both.
+    GEMINI_FAST_MODEL: str = "models/gemini-2.0-flash-lite"
+    GEMINI_LATENCY_SLO_MS: int = 8000
+    ROUTER_FAST_MAX_INPUT_TOKENS: int = 200
+    ROUTER_MAX_OUTPUT_TOKENS: int = 8192
+    ROUTER_LATENCY_WINDOW_SECONDS: int = 300
+    ROUTER_MIN_SAMPLES: int = 20
+    ROUTER_HISTORY_SIZE: int = 500
+    # Maximum concurrent Gemini generations per worker
+    GEMINI_MAX_CONCURRENCY: int = 16
+    # Open the Gemini connection at startup instead of on the first request
+    GEMINI_WARMUP: bool = False
+    # JSON mime type (plus a response schema for improve) instead of free text
+    GEMINI_STRUCTURED_OUTPUT: bool = True
+    # Register each endpoint's static prompt prefix as Gemini cached content.
+    # Gemini only caches contexts above a minimum size (model dependent), so
+    # smaller prefixes stay plain system instructions.
+    GEMINI_CONTEXT_CACHE: bool = False
+    GEMINI_CONTEXT_CACHE_TTL_SECONDS: int = 3600
+    GEMINI_CONTEXT_CACHE_MIN_TOKENS: int = 4096
+    # "gemini", or "local" for the offline stub in services/local_llm_backend.py
+    # (load tests and CI). The stub answers after a log-normal latency with
+    # the given median and sigma, streams at the given token rate (0 = no
+    # limit), and fails the given fraction of calls with a retryable 503.
+    LLM_BACKEND: str = "gemini"
+    LOCAL_LLM_LATENCY_MS: int = 300
+    LOCAL_LLM_LATENCY_SIGMA: float = 0.5
+    LOCAL_LLM_TOKENS_PER_SECOND: int = 0
+    LOCAL_LLM_ERROR_RATE: float = 0.0
+    LOCAL_LLM_SEED: Optional[int] = None
+    # Prometheus metrics on /metrics and a Server-Timing header per response
+    METRICS_ENABLED: bool = True
+    # Logs are written by a background thread as JSON lines ("json") or
+    # plain lines ("text"). High-volume info events are kept at
+    # LOG_SAMPLE_RATE (1.0 = all of them).
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"
+    LOG_SAMPLE_RATE: float = 1.0
+    # Profiling (utils/profiling.py): PROFILING_SAMPLE_RATE of the requests
+    # get a span tree, and those slower than PROFILING_SLOW_MS also a stack
+    # sampling capture written to PROFILING_DIR (newest PROFILING_MAX_FILES
+    # kept). 0 = off; admins can change the rate at /admin/profiling.
+    PROFILING_SAMPLE_RATE: float = 0.0
+    PROFILING_SLOW_MS: int = 5000
+    PROFILING_INTERVAL_MS: int = 5
+    PROFILING_DIR: str = "data/profiles"
+    PROFILING_MAX_FILES: int = 50
+    # Users allowed to call the /admin endpoints
+    ADMIN_USERNAMES: List[str] = []
+
+    # Explain/improve responses encoded by pydantic-core straight to bytes,
+    # skipping FastAPI's response_model re-validation (utils/fast_json.py)
+    FAST_JSON_RESPONSES: bool = True
+    # Bodies of at least COMPRESSION_MIN_BYTES are sent gzip- or (with the
+    # optional brotli package) br-encoded when the client accepts it; from
+    # COMPRESSION_THREAD_BYTES on (about 1 ms of gzip) in a worker thread
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_BYTES: int = 1024
+    COMPRESSION_THREAD_BYTES: int = 16 * 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+
+    # SQLite user / refresh-token store (WAL mode)
+    USER_DB_PATH: str = "data/users.db"
+
+    # bcrypt cost factor; existing hashes are upgraded on the next login
+    BCRYPT_ROUNDS: int = 12
+    # Threads for bcrypt work (defaults to the CPU count)
+    PASSWORD_HASH_WORKERS: Optional[int] = None
+
+    # Input admission, checked before any other work on the code
+    MAX_CODE_BYTES: int = 256 * 1024
+    MAX_CODE_LINES: int = 5000
+    # Requests declaring a larger Content-Length are refused before the body is read
+    MAX_REQUEST_BYTES: int = 2 * 1024 * 1024
+    # Safety rules as {name: lower-case regex}; None uses validator_service.DEFAULT_RULES
+    VALIDATOR_RULES: Optional[Dict[str, str]] = None
+
+    # Response cache for LLM output
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1024
+    RESPONSE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    RESPONSE_CACHE_TTL_SECONDS: int = 24 * 3600
+    RESPONSE_CACHE_DIR: Optional[str] = None  # enables the on-disk tier
+    RESPONSE_CACHE_DISK_MAX_ENTRIES: int = 10000
+    RESPONSE_CACHE_DISK_MAX_BYTES: int = 512 * 1024 * 1024
+
+    # Files longer than this are explained in chunks of whole top-level units,
+    # up to EXPLAIN_CHUNK_MAX_LINES each, with at most
+    # EXPLAIN_CHUNK_CONCURRENCY Gemini calls per request (0 = never chunk)
+    EXPLAIN_CHUNK_THRESHOLD_LINES: int = 300
+    EXPLAIN_CHUNK_MAX_LINES: int = 150
+    EXPLAIN_CHUNK_CONCURRENCY: int = 8
+
+    # Stored explanations that `previous=<id>` re-explains incrementally:
+    # only changed hunks plus EXPLAIN_INCREMENTAL_CONTEXT_LINES around them
+    # go to Gemini, unless more than EXPLAIN_INCREMENTAL_MAX_CHANGED_RATIO
+    # of the file changed. The stored high-level explanation is reused until
+    # the edits since it was written add up to EXPLAIN_INCREMENTAL_MAX_SUMMARY_DRIFT
+    # of the file; then the file is explained in full to refresh it.
+    EXPLANATION_STORE_MAX_ENTRIES: int = 256
+    EXPLANATION_STORE_MAX_BYTES: int = 32 * 1024 * 1024
+    EXPLANATION_STORE_TTL_SECONDS: int = 24 * 3600
+    EXPLAIN_INCREMENTAL_CONTEXT_LINES: int = 3
+    EXPLAIN_INCREMENTAL_MAX_CHANGED_RATIO: float = 0.5
+    EXPLAIN_INCREMENTAL_MAX_SUMMARY_DRIFT: float = 0.25
+
+    # Batch endpoints
+    BATCH_MAX_ITEMS: int = 100
+    BATCH_MAX_CONCURRENCY: int = 8
+    # Explain snippets up to this many characters are packed into shared prompts (0 = off)
+    BATCH_PACK_MAX_CHARS: int = 400
+    BATCH_PACK_SIZE: int = 5
 
     model_config = {
         "env_file": ".env",
@@ -1,13 +1,137 @@
-from fastapi import FastAPI
+import math
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from config import settings
 from routes.explain_router import router as explain_router
 from routes.improve_router import router as improve_router
 from auth.auth_router import router as auth_router
+from routes.metrics_router import router as metrics_router
+from routes.admin_router import router as admin_router
+from services.llm_backend import create_llm_backend
+from services.resilience import UpstreamUnavailable
+from utils import metrics
+from utils.compression import CompressionMiddleware
+from utils.logger import configure_logging, request_id_from_header, start_request_context
+from utils.profiling import ProfileRequests, profiler
+
+configure_logging(settings.LOG_LEVEL, settings.LOG_FORMAT, settings.LOG_SAMPLE_RATE)
+profiler.configure(
+    sample_rate=settings.PROFILING_SAMPLE_RATE,
+    slow_ms=settings.PROFILING_SLOW_MS,
+    interval_ms=settings.PROFILING_INTERVAL_MS,
+    directory=settings.PROFILING_DIR,
+    max_files=settings.PROFILING_MAX_FILES,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One LLM client per worker (Settings.LLM_BACKEND), shared by every request
+    app.state.llm_backend = create_llm_backend()
+    if settings.GEMINI_WARMUP:
+        await app.state.llm_backend.warm_up()
+    if settings.GEMINI_CONTEXT_CACHE and hasattr(app.state.llm_backend, "enable_context_cache"):
+        await app.state.llm_backend.enable_context_cache()
+    yield
+    await app.state.llm_backend.close()
+
+
+app = FastAPI(title="Code Explainer API", lifespan=lifespan)
+
+# Innermost, so compression is timed as a stage of the request
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.COMPRESSION_MIN_BYTES,
+        thread_size=settings.COMPRESSION_THREAD_BYTES,
+        gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+        brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+    )
+
+
+@app.middleware("http")
+async def limit_request_size(request: Request, call_next):
+    """
+    Refuses oversized bodies from their Content-Length header alone,
+    before FastAPI buffers them. Chunked uploads are still bounded by
+    ValidatorService once read.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > settings.MAX_REQUEST_BYTES:
+        metrics.record_error("request_too_large")
+        return JSONResponse(
+            status_code=413,
+            content={"detail": f"Request body exceeds {settings.MAX_REQUEST_BYTES} bytes"},
+        )
+    return await call_next(request)
+
+
+if settings.METRICS_ENABLED:
+    @app.middleware("http")
+    async def record_metrics(request: Request, call_next):
+        """
+        Request count, latency and in-flight gauge per route, plus a
+        Server-Timing header with the stages timed by utils.metrics.stage.
+        Streaming responses are measured up to their headers.
+        """
+        timings = metrics.start_request()
+        start = time.perf_counter()
+        with metrics.HTTP_IN_FLIGHT.track():
+            try:
+                response = await call_next(request)
+            except Exception:
+                metrics.record_error("unhandled")
+                raise
+        elapsed = time.perf_counter() - start
+
+        # The route template, so path parameters don't multiply the series
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        metrics.HTTP_REQUESTS.inc(request.method, route, str(response.status_code))
+        metrics.HTTP_DURATION.observe(elapsed, request.method, route)
+        response.headers["Server-Timing"] = metrics.server_timing(timings, elapsed)
+        return response
+
+
+# Inside request_context, so profiles are named after the request id
+app.add_middleware(ProfileRequests)
+
+
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    """
+    Tags every log line of the request with its id (the caller's
+    X-Request-ID when given, reduced to safe characters) and echoes the id
+    back.
+    """
+    request_id = request_id_from_header(request.headers.get("x-request-id"))
+    start_request_context(request_id)
+    response = await call_next(request)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
+@app.exception_handler(UpstreamUnavailable)
+async def upstream_unavailable(request: Request, exc: UpstreamUnavailable):
+    """
+    Gemini is failing (circuit open or retries exhausted): tell the client
+    when to come back instead of answering 500.
+    """
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(math.ceil(exc.retry_after))},
+    )
 
-app = FastAPI(title="Code Explainer API")
 
 app.include_router(auth_router)
 app.include_router(explain_router, prefix="/api")
 app.include_router(improve_router, prefix="/api")
+if settings.METRICS_ENABLED:
+    app.include_router(metrics_router)
+app.include_router(admin_router)
 
 @app.get("/")
 def root():
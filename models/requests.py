@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 
 
 class ExplainCodeRequest(BaseModel):
@@ -28,3 +28,27 @@ class LoginRequest(BaseModel):
     """
     username: str = Field(..., description="Username to login.")
     password: str = Field(..., description="Password to login.")
+
+
+class BatchExplainRequest(BaseModel):
+    """
+    Request model for the /explain/batch endpoint.
+    """
+    items: List[ExplainCodeRequest] = Field(..., description="Snippets to explain.")
+
+
+class BatchImproveRequest(BaseModel):
+    """
+    Request model for the /improve/batch endpoint.
+    """
+    items: List[ImproveCodeRequest] = Field(..., description="Snippets to improve.")
+
+
+class ProfilingUpdateRequest(BaseModel):
+    """
+    Request model for PUT /admin/profiling.
+    """
+    sample_rate: float = Field(..., ge=0.0, le=1.0, description="Fraction of requests to profile.")
+    slow_ms: Optional[int] = Field(
+        None, gt=0, description="Optional: Requests slower than this get a sampling capture."
+    )
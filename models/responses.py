@@ -1,5 +1,7 @@
 from pydantic import BaseModel, Field
-from typing import Dict, Optional
+from typing import Dict, List, Optional
+
+from models.errors import ErrorResponse
 
 
 class CodeExplanationResponse(BaseModel):
@@ -24,6 +26,36 @@ class CodeImprovementResponse(BaseModel):
     )
 
 
+class BatchExplanationItem(BaseModel):
+    """
+    One entry of a batch explain response; exactly one of result/error is set.
+    """
+    result: Optional[CodeExplanationResponse] = None
+    error: Optional[ErrorResponse] = None
+
+
+class BatchExplanationResponse(BaseModel):
+    """
+    Response returned by /explain/batch. Results follow the input order.
+    """
+    results: List[BatchExplanationItem]
+
+
+class BatchImprovementItem(BaseModel):
+    """
+    One entry of a batch improve response; exactly one of result/error is set.
+    """
+    result: Optional[CodeImprovementResponse] = None
+    error: Optional[ErrorResponse] = None
+
+
+class BatchImprovementResponse(BaseModel):
+    """
+    Response returned by /improve/batch. Results follow the input order.
+    """
+    results: List[BatchImprovementItem]
+
+
 class AuthResponse(BaseModel):
     """
     Response returned by /auth/login.
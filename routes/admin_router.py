@@ -0,0 +1,38 @@
+from typing import Dict
+
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from auth.jwt_handler import verify_access_token
+from config import settings
+from models.requests import ProfilingUpdateRequest
+from utils.logger import log_info
+from utils.profiling import profiler
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+
+# Dependency - for endpoints limited to Settings.ADMIN_USERNAMES
+def require_admin(payload: Dict = Depends(verify_access_token)) -> str:
+    username = payload.get("sub")
+    if username not in settings.ADMIN_USERNAMES:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return username
+
+
+@router.get("/profiling")
+async def get_profiling(admin: str = Depends(require_admin)):
+    """
+    Current profiling settings and counters.
+    """
+    return profiler.status()
+
+
+@router.put("/profiling")
+async def update_profiling(payload: ProfilingUpdateRequest, admin: str = Depends(require_admin)):
+    """
+    Changes the fraction of profiled requests (0 turns profiling off) and,
+    optionally, the slow-request threshold. Applies to this worker only.
+    """
+    profiler.configure(sample_rate=payload.sample_rate, slow_ms=payload.slow_ms)
+    log_info("Profiling set to %.3f of requests by %s", payload.sample_rate, admin)
+    return profiler.status()
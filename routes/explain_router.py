@@ -1,16 +1,40 @@
-from fastapi import APIRouter, Depends, HTTPException, Body
-from models.requests import ExplainCodeRequest
-from models.responses import CodeExplanationResponse
+from collections import Counter
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Body, Header, Response
+from fastapi.responses import StreamingResponse
+from models.requests import ExplainCodeRequest, BatchExplainRequest
+from models.responses import (
+    CodeExplanationResponse,
+    BatchExplanationItem,
+    BatchExplanationResponse,
+)
 from models.errors import ErrorResponse
 from services.validator_service import ValidatorService
 from services.language_service import LanguageService
-from services.gemini_service import GeminiService
-from utils.logger import log_info
+from services.llm_backend import LLMBackend, get_llm_backend
+from services.cache_service import response_cache, explanation_store, is_cache_bypassed
+from services.stream_parser import ExplanationStreamParser
+from services.batch_service import BatchService
+from services.chunking_service import ChunkingService
+from services.incremental_service import IncrementalService
+from services.resilience import UpstreamUnavailable
+from services.singleflight import llm_singleflight
+from services.extract_json import extract_json, extract_json_array, validate_direct
+from ai.prompts import (
+    EXPLAIN_PROMPT_VERSION,
+    BATCH_EXPLAIN_PROMPT_VERSION,
+    explain_line_map,
+    remap_line_keys,
+)
+from utils.logger import log_info, log_error
+from utils.metrics import record_error, stage
+from utils.fast_json import model_response
+from utils.timed_route import TimedRoute
 from auth.jwt_handler import verify_access_token
+from config import settings
 import json
-import re
 
-router = APIRouter(prefix="/explain", tags=["Explain Code"])
+router = APIRouter(prefix="/explain", tags=["Explain Code"], route_class=TimedRoute)
 
 
 # Dependency - for authenticated endpoints
@@ -18,56 +42,484 @@ def get_current_user(token: str = Depends(verify_access_token)):
     return token
 
 
+# Prompts carry minimized code (no blank or comment-only lines), so Gemini
+# numbers lines of that; raw and cached output keep its numbering and the
+# keys are mapped back to the user's lines here.
+def _to_explanation(parsed: dict, detected_lang: str, code: str) -> CodeExplanationResponse:
+    return CodeExplanationResponse(
+        language=parsed.get("language", detected_lang),
+        high_level_explanation=parsed.get("high_level_explanation", ""),
+        line_by_line_explanation=remap_line_keys(
+            parsed.get("line_by_line_explanation", {}),
+            explain_line_map(code, detected_lang),
+        )
+    )
+
+
+def _parse_explanation(raw_output: str, detected_lang: str, code: str) -> CodeExplanationResponse:
+    with stage("parse"):
+        # Structured output validates in one step; extraction is the fallback
+        result = validate_direct(raw_output, CodeExplanationResponse, "explain")
+        if result is not None:
+            line_map = explain_line_map(code, detected_lang)
+            if line_map is None:
+                return result
+            return result.model_copy(update={
+                "line_by_line_explanation": remap_line_keys(result.line_by_line_explanation, line_map)
+            })
+
+        parsed = extract_json(raw_output)
+        if parsed is None:
+            record_error("llm_invalid_output")
+            raise HTTPException(
+                status_code=500,
+                detail="Gemini did not return valid JSON."
+            )
+        return _to_explanation(parsed, detected_lang, code)
+
+
+def _cache_key(code: str, detected_lang: str) -> str:
+    return response_cache.make_key("explain", code, detected_lang, EXPLAIN_PROMPT_VERSION)
+
+
+def _packed_cache_key(code: str, detected_lang: str) -> str:
+    """
+    Output of a packed batch prompt: served to later batches, never to
+    /explain/code, and invalidated by changes to the batch prompt.
+    """
+    return response_cache.make_key("explain_batch", code, detected_lang, BATCH_EXPLAIN_PROMPT_VERSION)
+
+
+async def _explain(
+    llm_backend: LLMBackend,
+    code: str,
+    detected_lang: str,
+    bypass_cache: bool,
+) -> CodeExplanationResponse:
+    """
+    Cache lookup, Gemini call and parsing for one validated snippet.
+    """
+    cache_key = _cache_key(code, detected_lang)
+    if not bypass_cache:
+        with stage("cache"):
+            cached_output = await response_cache.get(cache_key)
+        if cached_output is not None:
+            log_info("Serving explain response from cache", sampled=True)
+            return _parse_explanation(cached_output, detected_lang, code)
+
+    async def generate() -> CodeExplanationResponse:
+        raw_output = await llm_backend.explain_code(
+            code=code,
+            lang=detected_lang,
+        )
+        result = _parse_explanation(raw_output, detected_lang, code)
+
+        # Only cache output that parsed successfully
+        await response_cache.set(cache_key, raw_output)
+        return result
+
+    # Identical requests already in flight share one Gemini call
+    return await llm_singleflight.do(cache_key, generate)
+
+
+async def _explain_chunked(
+    llm_backend: LLMBackend,
+    code: str,
+    detected_lang: str,
+    bypass_cache: bool,
+) -> CodeExplanationResponse:
+    """
+    Explains a large file as chunks of whole top-level units, concurrently,
+    and merges them. Each chunk is cached and coalesced like a snippet of
+    its own, so latency follows the largest chunk rather than the file.
+
+    The high-level explanation is not synthesized by the model: it lists
+    each chunk's own summary under its line range. A synthesis call could
+    only start after the slowest chunk and would add a full LLM round trip
+    to every large file.
+    """
+    chunks = ChunkingService.split(code, detected_lang, settings.EXPLAIN_CHUNK_MAX_LINES)
+    log_info("Explaining large file in %d chunks", len(chunks))
+
+    results = await BatchService.bounded_gather(
+        [_explain(llm_backend, chunk, detected_lang, bypass_cache) for _, chunk in chunks],
+        settings.EXPLAIN_CHUNK_CONCURRENCY,
+    )
+
+    lines: Dict[str, str] = {}
+    summaries = []
+    for (first, chunk), result in zip(chunks, results):
+        lines.update(ChunkingService.rebase(result.line_by_line_explanation, first))
+        last = first + chunk.count("\n")
+        summaries.append(f"Lines {first}-{last}: {result.high_level_explanation}")
+
+    return CodeExplanationResponse(
+        language=Counter(r.language for r in results).most_common(1)[0][0],
+        high_level_explanation=(
+            f"This file is explained in {len(chunks)} parts.\n" + "\n".join(summaries)
+        ),
+        line_by_line_explanation=lines,
+    )
+
+
+async def _explain_file(
+    llm_backend: LLMBackend,
+    code: str,
+    detected_lang: str,
+    bypass_cache: bool,
+) -> CodeExplanationResponse:
+    threshold = settings.EXPLAIN_CHUNK_THRESHOLD_LINES
+    if threshold and code.count("\n") + 1 > threshold:
+        return await _explain_chunked(llm_backend, code, detected_lang, bypass_cache)
+    return await _explain(llm_backend, code, detected_lang, bypass_cache)
+
+
+async def _explain_incremental(
+    llm_backend: LLMBackend,
+    code: str,
+    detected_lang: str,
+    previous_id: str,
+    bypass_cache: bool,
+) -> Optional[Tuple[CodeExplanationResponse, float]]:
+    """
+    Re-explains only the hunks that changed since a stored explanation,
+    reusing the stored entries of untouched lines at their new numbers.
+    The high-level explanation is reused too, so the share of lines edited
+    since it was written (its drift) is tracked along with the result.
+    Returns (result, drift), or None when a full explanation is the better
+    choice: too much changed at once, or the summary has drifted too far.
+    """
+    with stage("cache"):
+        stored = await explanation_store.get(previous_id)
+    if stored is None:
+        log_info("Previous explanation not found; explaining in full")
+        return None
+
+    previous = json.loads(stored)
+    if previous["language"] != detected_lang:
+        return None
+
+    plan = IncrementalService.plan(
+        previous["code"], code, settings.EXPLAIN_INCREMENTAL_CONTEXT_LINES
+    )
+    if plan.changed_ratio > settings.EXPLAIN_INCREMENTAL_MAX_CHANGED_RATIO:
+        log_info("%.0f%% of the file changed; explaining in full", plan.changed_ratio * 100)
+        return None
+    drift = previous.get("summary_drift", 0.0) + plan.changed_ratio
+    if drift > settings.EXPLAIN_INCREMENTAL_MAX_SUMMARY_DRIFT:
+        log_info("%.0f%% of the file changed since the summary was written; explaining in full",
+                 drift * 100)
+        return None
+
+    log_info("Incremental explain: %d hunks, %.0f%% of lines", len(plan.hunks), plan.changed_ratio * 100)
+
+    code_lines = code.split("\n")
+    hunk_codes = [(first, "\n".join(code_lines[first - 1:last])) for first, last in plan.hunks]
+    # A hunk of blank lines has nothing to explain
+    hunk_codes = [(first, hunk) for first, hunk in hunk_codes if hunk.strip()]
+    results = await BatchService.bounded_gather(
+        [_explain_file(llm_backend, hunk, detected_lang, bypass_cache) for _, hunk in hunk_codes],
+        settings.EXPLAIN_CHUNK_CONCURRENCY,
+    )
+
+    previous_result = previous["result"]
+    lines = IncrementalService.shift_lines(previous_result["line_by_line_explanation"], plan.reused)
+    for (first, _), result in zip(hunk_codes, results):
+        lines.update(ChunkingService.rebase(result.line_by_line_explanation, first))
+
+    return CodeExplanationResponse(
+        language=previous_result["language"],
+        high_level_explanation=previous_result["high_level_explanation"],
+        line_by_line_explanation=dict(sorted(lines.items(), key=lambda item: _line_order(item[0]))),
+    ), drift
+
+
+def _line_order(key: str) -> Tuple[int, str]:
+    return (int(key), "") if key.isdigit() else (1 << 30, key)
+
+
 @router.post(
     "/code",
     response_model=CodeExplanationResponse,
     responses={400: {"model": ErrorResponse}}
 )
 async def explain_code(
+    response: Response,
     code: str = Body(..., media_type="text/plain"),
     language: str | None = None,
-    user=Depends(get_current_user)
+    previous: str | None = None,
+    cache_control: str | None = Header(None),
+    user=Depends(get_current_user),
+    llm_backend: LLMBackend = Depends(get_llm_backend)
 ):
     """
     Explain code in simple terms.
+
+    The result's id (a SHA-256 of the code) is returned in the
+    X-Explanation-Id header. Passing it back as `previous` with edited code
+    re-explains only the changed lines.
     """
     # Convert to your Pydantic model manually
     req = ExplainCodeRequest(code=code, language=language)
 
-    log_info("Received explain request")
-    gemini_service = GeminiService()
+    log_info("Received explain request", sampled=True)
 
     # Step 1: Validate Input
-    if not ValidatorService.is_valid_code(req.code):
-        raise HTTPException(status_code=400, detail="Invalid or empty code")
+    ValidatorService.check(req.code)
 
     # Step 2: Detect Language
     detected_lang = LanguageService.detect_language(req.code)
 
-    # Step 3: Call Gemini
-    raw_output = await gemini_service.explain_code(
-        code=req.code,
-        lang=detected_lang,
-    )
+    # Step 3: Call Gemini (unless an identical request is cached) and parse
+    bypass_cache = is_cache_bypassed(cache_control)
+    explanation_id = IncrementalService.explanation_id(req.code)
 
-    # (Your existing JSON extraction logic)
-    match = re.search(r"\{(.|\n)*\}", raw_output)
-    if not match:
-        raise HTTPException(
-            status_code=500,
-            detail="Gemini did not return valid JSON."
+    incremental = None
+    if previous and previous != explanation_id:
+        incremental = await _explain_incremental(
+            llm_backend, req.code, detected_lang, previous, bypass_cache
         )
+    if incremental is not None:
+        result, summary_drift = incremental
+    else:
+        result = await _explain_file(llm_backend, req.code, detected_lang, bypass_cache)
+        summary_drift = 0.0
 
+    # Step 4: Keep the result as the base for the next incremental request
+    await explanation_store.set(explanation_id, json.dumps({
+        "code": req.code,
+        "language": detected_lang,
+        "result": result.model_dump(),
+        "summary_drift": summary_drift,
+    }))
+    response.headers["X-Explanation-Id"] = explanation_id
+    return model_response(result, response) if settings.FAST_JSON_RESPONSES else result
+
+
+# --- Batch ---
+def _parse_packed_explanations(raw_output: str, count: int) -> List[Optional[dict]]:
+    """
+    Splits the JSON array returned for a packed prompt into per-snippet objects.
+    Missing or malformed entries come back as None.
+    """
+    with stage("parse"):
+        items = extract_json_array(raw_output) or []
+    items = [item if isinstance(item, dict) else None for item in items[:count]]
+    return items + [None] * (count - len(items))
+
+
+async def _explain_pack(
+    llm_backend: LLMBackend,
+    pack: List[Tuple[str, str]],
+    results: Dict[str, BatchExplanationItem],
+) -> None:
+    """
+    Explains a pack of small snippets with one call. Snippets the combined
+    answer does not cover fall back to an individual call.
+    """
     try:
-        parsed = json.loads(match.group())
-    except json.JSONDecodeError:
+        raw_output = await llm_backend.explain_code_batch(pack)
+        items = _parse_packed_explanations(raw_output, len(pack))
+    except (RuntimeError, UpstreamUnavailable):
+        items = [None] * len(pack)
+
+    for (code, detected_lang), item in zip(pack, items):
+        if item is None:
+            await _explain_single(llm_backend, code, detected_lang, results)
+            continue
+
+        results[code] = BatchExplanationItem(result=_to_explanation(item, detected_lang, code))
+        await response_cache.set(_packed_cache_key(code, detected_lang), json.dumps(item))
+
+
+async def _explain_single(
+    llm_backend: LLMBackend,
+    code: str,
+    detected_lang: str,
+    results: Dict[str, BatchExplanationItem],
+) -> None:
+    try:
+        result = await _explain(llm_backend, code, detected_lang, bypass_cache=True)
+        results[code] = BatchExplanationItem(result=result)
+    except Exception as e:
+        results[code] = BatchExplanationItem(error=BatchService.to_error(e))
+
+
+@router.post(
+    "/batch",
+    response_model=BatchExplanationResponse,
+    responses={400: {"model": ErrorResponse}}
+)
+async def explain_batch(
+    payload: BatchExplainRequest,
+    cache_control: str | None = Header(None),
+    user=Depends(get_current_user),
+    llm_backend: LLMBackend = Depends(get_llm_backend)
+):
+    """
+    Explain many snippets at once. Identical snippets are processed once,
+    and a failing snippet yields an error entry instead of failing the batch.
+    """
+    if len(payload.items) > settings.BATCH_MAX_ITEMS:
         raise HTTPException(
-            status_code=500,
-            detail="Failed to parse JSON returned by Gemini."
+            status_code=400,
+            detail=f"Batch exceeds {settings.BATCH_MAX_ITEMS} items"
         )
 
-    return CodeExplanationResponse(
-        language=parsed.get("language", detected_lang),
-        high_level_explanation=parsed.get("high_level_explanation", ""),
-        line_by_line_explanation=parsed.get("line_by_line_explanation", {})
-    )
\ No newline at end of file
+    codes = [item.code for item in payload.items]
+    unique_codes = BatchService.dedupe(codes)
+    log_info("Received explain batch: %d items, %d unique", len(codes), len(unique_codes), sampled=True)
+
+    bypass_cache = is_cache_bypassed(cache_control)
+    results: Dict[str, BatchExplanationItem] = {}
+    pending: List[Tuple[str, str]] = []
+
+    # Validation, detection and cache lookup once per unique snippet
+    for code in unique_codes:
+        with stage("validate"):
+            validation = ValidatorService.validate(code)
+        if not validation.valid:
+            results[code] = BatchExplanationItem(
+                error=BatchService.to_error(
+                    HTTPException(status_code=validation.status_code, detail=validation.reason)
+                )
+            )
+            continue
+
+        detected_lang = LanguageService.detect_language(code)
+        cached_output = None
+        if not bypass_cache:
+            with stage("cache"):
+                cached_output = (
+                    await response_cache.get(_cache_key(code, detected_lang))
+                    or await response_cache.get(_packed_cache_key(code, detected_lang))
+                )
+        if cached_output is None:
+            pending.append((code, detected_lang))
+            continue
+
+        try:
+            results[code] = BatchExplanationItem(
+                result=_parse_explanation(cached_output, detected_lang, code)
+            )
+        except HTTPException:
+            pending.append((code, detected_lang))
+
+    packs, singles = BatchService.pack(
+        pending, settings.BATCH_PACK_MAX_CHARS, settings.BATCH_PACK_SIZE
+    )
+    jobs = [_explain_pack(llm_backend, pack, results) for pack in packs]
+    jobs += [
+        _explain_single(llm_backend, code, detected_lang, results)
+        for code, detected_lang in singles
+    ]
+    await BatchService.bounded_gather(jobs, settings.BATCH_MAX_CONCURRENCY)
+
+    batch = BatchExplanationResponse(results=[results[code] for code in codes])
+    return model_response(batch) if settings.FAST_JSON_RESPONSES else batch
+
+
+# --- Streaming (Server-Sent Events) ---
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _explanation_events(
+    llm_backend: LLMBackend,
+    code: str,
+    detected_lang: str,
+    cache_key: str,
+    cached_output: Optional[str],
+) -> AsyncIterator[str]:
+    """
+    Emits each field of the explanation as soon as it is complete:
+    `language`, `high_level_explanation`, one `line` event per line entry,
+    then `done` with the full CodeExplanationResponse (or `error`).
+    """
+    parser = ExplanationStreamParser()
+    line_map = explain_line_map(code, detected_lang)
+
+    def events(text: str) -> List[str]:
+        out = []
+        for event, data in parser.feed(text):
+            if event == "line" and line_map:
+                data = next(iter(remap_line_keys({data[0]: data[1]}, line_map).items()))
+            out.append(_sse(event, data))
+        return out
+
+    if cached_output is not None:
+        log_info("Serving explain stream from cache", sampled=True)
+        chunks = [cached_output]
+        for message in events(cached_output):
+            yield message
+    else:
+        chunks = []
+        try:
+            async for text in llm_backend.stream_explain_code(code, detected_lang):
+                chunks.append(text)
+                for message in events(text):
+                    yield message
+        except UpstreamUnavailable as e:
+            yield _sse("error", {"detail": str(e), "retry_after": e.retry_after})
+            return
+        except RuntimeError:
+            yield _sse("error", {"detail": "Failed to generate explanation"})
+            return
+
+    parsed = parser.result()
+    if parsed is None:
+        log_error("Explain stream ended without a complete JSON object")
+        record_error("llm_invalid_output")
+        yield _sse("error", {"detail": "Gemini did not return valid JSON."})
+        return
+
+    if cached_output is None:
+        await response_cache.set(cache_key, "".join(chunks))
+
+    response = CodeExplanationResponse(
+        language=parsed["language"] or detected_lang,
+        high_level_explanation=parsed["high_level_explanation"],
+        line_by_line_explanation=remap_line_keys(parsed["line_by_line_explanation"], line_map),
+    )
+    yield _sse("done", response.model_dump())
+
+
+@router.post(
+    "/code/stream",
+    responses={400: {"model": ErrorResponse}}
+)
+async def explain_code_stream(
+    code: str = Body(..., media_type="text/plain"),
+    language: str | None = None,
+    cache_control: str | None = Header(None),
+    user=Depends(get_current_user),
+    llm_backend: LLMBackend = Depends(get_llm_backend)
+):
+    """
+    Explain code, streaming the result as Server-Sent Events.
+    """
+    req = ExplainCodeRequest(code=code, language=language)
+
+    log_info("Received explain stream request", sampled=True)
+
+    ValidatorService.check(req.code)
+
+    detected_lang = LanguageService.detect_language(req.code)
+
+    cache_key = _cache_key(req.code, detected_lang)
+    cached_output = None
+    if not is_cache_bypassed(cache_control):
+        with stage("cache"):
+            cached_output = await response_cache.get(cache_key)
+
+    # Answer 503 before the stream starts rather than as an error event
+    if cached_output is None:
+        llm_backend.check_available()
+
+    return StreamingResponse(
+        _explanation_events(
+            llm_backend, req.code, detected_lang, cache_key, cached_output
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
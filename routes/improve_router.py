@@ -1,56 +1,32 @@
-import re
-import json
-from fastapi import APIRouter, Depends, HTTPException, Body
-from models.requests import ImproveCodeRequest
-from models.responses import CodeImprovementResponse
+from fastapi import APIRouter, Depends, HTTPException, Body, Header
+from models.requests import ImproveCodeRequest, BatchImproveRequest
+from models.responses import (
+    CodeImprovementResponse,
+    BatchImprovementItem,
+    BatchImprovementResponse,
+)
 from models.errors import ErrorResponse
 from services.validator_service import ValidatorService
 from services.language_service import LanguageService
-from services.gemini_service import GeminiService
+from services.llm_backend import LLMBackend, get_llm_backend
+from services.cache_service import response_cache, is_cache_bypassed
+from services.batch_service import BatchService
+from services.singleflight import llm_singleflight
+from services.extract_json import parse_split_response, validate_direct
+from ai.prompts import IMPROVE_PROMPT_VERSION, IMPROVE_JSON_PROMPT_VERSION
 from utils.logger import log_info, log_error
+from utils.metrics import record_error, stage
+from utils.fast_json import model_response
+from utils.timed_route import TimedRoute
 from auth.jwt_handler import verify_access_token
+from config import settings
 
-# Note: We are replacing the generic extract_json with a specific parser below
-# from services.extract_json import extract_json 
-
-router = APIRouter(prefix="/improve", tags=["Improve Code"])
+router = APIRouter(prefix="/improve", tags=["Improve Code"], route_class=TimedRoute)
 
-# --- Helper Parser Function ---
-def parse_split_response(text: str) -> dict:
-    """
-    Extracts JSON metadata AND the separate XML code block.
-    Robust against C/C++ quotes breaking JSON.
-    """
-    result = {
-        "language": None,
-        "improvements": "",
-        "optimized_code": None
-    }
-
-    # 1. Extract JSON Metadata (Non-greedy match for first brace block)
-    # This captures {"language": "...", "improvements": "..."}
-    json_match = re.search(r"(\{[\s\S]*?\})", text)
-    if json_match:
-        try:
-            json_str = json_match.group(1)
-            # Clean generic markdown code fences if present inside the match
-            if "```json" in json_str:
-                json_str = re.sub(r"```json\s*", "", json_str)
-                json_str = re.sub(r"```", "", json_str)
-            
-            data = json.loads(json_str)
-            result["language"] = data.get("language")
-            result["improvements"] = data.get("improvements", "")
-        except json.JSONDecodeError as e:
-            log_error(f"Failed to parse metadata JSON: {e}")
-
-    # 2. Extract Code from XML tags
-    # This captures content between <optimized_code> tags, ignoring whatever quotes are inside
-    code_match = re.search(r"<optimized_code>([\s\S]*?)</optimized_code>", text)
-    if code_match:
-        result["optimized_code"] = code_match.group(1).strip()
-    
-    return result
+# Structured and split-format outputs come from different prompts
+_PROMPT_VERSION = (
+    IMPROVE_JSON_PROMPT_VERSION if settings.GEMINI_STRUCTURED_OUTPUT else IMPROVE_PROMPT_VERSION
+)
 
 
 # --- Auth dependency ---
@@ -58,6 +34,80 @@ def get_current_user(token: str = Depends(verify_access_token)):
     return token
 
 
+def _build_improvement(
+    raw_output: str, code: str, detected_lang: str
+) -> CodeImprovementResponse:
+    with stage("parse"):
+        # Structured output validates in one step
+        direct = validate_direct(raw_output, CodeImprovementResponse, "improve")
+        if direct is not None and (direct.improvements or direct.optimized_code):
+            return direct.model_copy(update={
+                "language": direct.language or detected_lang,
+                "optimized_code": direct.optimized_code or code,
+            })
+
+        # Fallback: the split parser (JSON metadata + <optimized_code> block)
+        parsed = parse_split_response(raw_output)
+
+        # Validation: If we got absolutely nothing, something went wrong with the AI
+        if not parsed["improvements"] and not parsed["optimized_code"]:
+            log_error("Gemini output parsing failed. Raw output start: %.100s", raw_output)
+            record_error("llm_invalid_output")
+            raise HTTPException(
+                status_code=500,
+                detail="Failed to parse AI response."
+            )
+
+        improvements_value = parsed.get("improvements", "")
+
+        # If Gemini returns a list instead of a string (rare but possible)
+        if isinstance(improvements_value, list):
+            improvements_value = "\n".join(improvements_value)
+
+        return CodeImprovementResponse(
+            # Use detected language if AI didn't specify one
+            language=parsed.get("language") or detected_lang,
+            improvements=improvements_value,
+            # If AI didn't provide code, fallback to the original code
+            optimized_code=parsed.get("optimized_code") or code
+        )
+
+
+async def _improve(
+    llm_backend: LLMBackend,
+    code: str,
+    detected_lang: str,
+    bypass_cache: bool,
+) -> CodeImprovementResponse:
+    """
+    Cache lookup, Gemini call and parsing for one validated snippet.
+    """
+    cache_key = response_cache.make_key(
+        "improve", code, detected_lang, _PROMPT_VERSION
+    )
+    if not bypass_cache:
+        with stage("cache"):
+            cached_output = await response_cache.get(cache_key)
+        if cached_output is not None:
+            log_info("Serving improve response from cache", sampled=True)
+            return _build_improvement(cached_output, code, detected_lang)
+
+    async def generate() -> CodeImprovementResponse:
+        # Ensure the backend returns the RAW text (not pre-parsed JSON)
+        raw_output = await llm_backend.suggest_improvements(
+            code=code,
+            lang=detected_lang
+        )
+        result = _build_improvement(raw_output, code, detected_lang)
+
+        # Only cache output that parsed successfully
+        await response_cache.set(cache_key, raw_output)
+        return result
+
+    # Identical requests already in flight share one Gemini call
+    return await llm_singleflight.do(cache_key, generate)
+
+
 @router.post(
     "/code",
     response_model=CodeImprovementResponse,
@@ -66,7 +116,9 @@ def get_current_user(token: str = Depends(verify_access_token)):
 async def suggest_improvements(
     code: str = Body(..., media_type="text/plain"),
     language: str | None = None,
-    user=Depends(get_current_user)
+    cache_control: str | None = Header(None),
+    user=Depends(get_current_user),
+    llm_backend: LLMBackend = Depends(get_llm_backend)
 ):
     """
     Suggest improvements, optimizations, best practices, and provide optimized code.
@@ -75,45 +127,69 @@ async def suggest_improvements(
     # Convert raw text → model
     req = ImproveCodeRequest(code=code)
 
-    log_info("Received improve request")
-    gemini_service = GeminiService()
+    log_info("Received improve request", sampled=True)
 
     # Step 1: Validate
-    if not ValidatorService.is_valid_code(req.code):
-        raise HTTPException(status_code=400, detail="Invalid or empty code")
+    ValidatorService.check(req.code)
 
     # Step 2: Detect language
     detected_lang = LanguageService.detect_language(req.code)
 
-    # Step 3: Call Gemini
-    # Ensure your GeminiService returns the RAW text (not pre-parsed JSON)
-    raw_output = await gemini_service.suggest_improvements(
-        code=req.code,
-        lang=detected_lang
+    # Step 3: Call Gemini (unless an identical request is cached) and parse
+    result = await _improve(
+        llm_backend, req.code, detected_lang, is_cache_bypassed(cache_control)
     )
+    return model_response(result) if settings.FAST_JSON_RESPONSES else result
 
-    # Step 4: Parse using the split parser
-    parsed = parse_split_response(raw_output)
 
-    # Validation: If we got absolutely nothing, something went wrong with the AI
-    if not parsed["improvements"] and not parsed["optimized_code"]:
-        log_error(f"Gemini output parsing failed. Raw output start: {raw_output[:100]}")
+async def _improve_item(
+    llm_backend: LLMBackend,
+    code: str,
+    bypass_cache: bool,
+) -> BatchImprovementItem:
+    try:
+        ValidatorService.check(code)
+        detected_lang = LanguageService.detect_language(code)
+        result = await _improve(llm_backend, code, detected_lang, bypass_cache)
+        return BatchImprovementItem(result=result)
+    except Exception as e:
+        return BatchImprovementItem(error=BatchService.to_error(e))
+
+
+@router.post(
+    "/batch",
+    response_model=BatchImprovementResponse,
+    responses={400: {"model": ErrorResponse}}
+)
+async def suggest_improvements_batch(
+    payload: BatchImproveRequest,
+    cache_control: str | None = Header(None),
+    user=Depends(get_current_user),
+    llm_backend: LLMBackend = Depends(get_llm_backend)
+):
+    """
+    Suggest improvements for many snippets at once. Identical snippets are
+    processed once, and a failing snippet yields an error entry instead of
+    failing the batch.
+    """
+    if len(payload.items) > settings.BATCH_MAX_ITEMS:
         raise HTTPException(
-            status_code=500,
-            detail="Failed to parse AI response."
+            status_code=400,
+            detail=f"Batch exceeds {settings.BATCH_MAX_ITEMS} items"
         )
 
-    # Step 5: Build final response
-    improvements_value = parsed.get("improvements", "")
+    codes = [item.code for item in payload.items]
+    unique_codes = BatchService.dedupe(codes)
+    log_info("Received improve batch: %d items, %d unique", len(codes), len(unique_codes), sampled=True)
 
-    # If Gemini returns a list instead of a string (rare but possible)
-    if isinstance(improvements_value, list):
-        improvements_value = "\n".join(improvements_value)
+    # Each improvement carries its own <optimized_code> block, so improve
+    # snippets are not packed into shared prompts
+    bypass_cache = is_cache_bypassed(cache_control)
+    items = await BatchService.bounded_gather(
+        [_improve_item(llm_backend, code, bypass_cache) for code in unique_codes],
+        settings.BATCH_MAX_CONCURRENCY,
+    )
+    results = dict(zip(unique_codes, items))
 
-    return CodeImprovementResponse(
-        # Use detected language if AI didn't specify one
-        language=parsed.get("language") or detected_lang,
-        improvements=improvements_value,
-        # If AI didn't provide code, fallback to the original code
-        optimized_code=parsed.get("optimized_code") or req.code
-    )
\ No newline at end of file
+    batch = BatchImprovementResponse(results=[results[code] for code in codes])
+    return model_response(batch) if settings.FAST_JSON_RESPONSES else batch
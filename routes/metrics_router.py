@@ -0,0 +1,75 @@
+from typing import Dict, List, Tuple
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from auth.jwt_handler import token_cache
+from services.cache_service import response_cache, explanation_store
+from services.extract_json import parse_stats
+from services.llm_backend import LLMBackend, get_llm_backend
+from services.singleflight import llm_singleflight
+from utils import logger, metrics
+
+router = APIRouter(tags=["Metrics"])
+
+# Circuit breaker states as gauge values
+_CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+def _flatten(stats: Dict, prefix: str = "") -> Dict[Tuple[str, ...], float]:
+    """
+    Numeric leaves of a nested stats() dict, keyed by their dotted path.
+    """
+    samples: Dict[Tuple[str, ...], float] = {}
+    for key, value in stats.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            samples.update(_flatten(value, f"{path}."))
+        elif isinstance(value, bool):
+            samples[(path,)] = int(value)
+        elif isinstance(value, (int, float)):
+            samples[(path,)] = value
+        elif isinstance(value, str) and value in _CIRCUIT_STATES:
+            samples[(path,)] = _CIRCUIT_STATES[value]
+    return samples
+
+
+def _component_stats(llm_backend: LLMBackend) -> List[str]:
+    caches = {
+        "response": response_cache.stats(),
+        "explanation_store": explanation_store.stats(),
+        "token": token_cache.stats(),
+    }
+    return [
+        *metrics.render_stats(
+            "cache_stat", "Cache counters and sizes.", ("cache", "stat"),
+            {(cache, stat): value for cache, stats in caches.items() for stat, value in stats.items()},
+        ),
+        *metrics.render_stats(
+            "singleflight_stat", "Coalesced LLM calls.", ("stat",),
+            {(stat,): value for stat, value in llm_singleflight.stats().items()},
+        ),
+        *metrics.render_stats(
+            "logger_stat", "Log records waiting for the writer thread, and dropped.", ("stat",),
+            {(stat,): value for stat, value in logger.stats().items()},
+        ),
+        *metrics.render_stats(
+            "llm_parse_total", "LLM outputs by parse path.", ("path",),
+            {(path,): count for path, count in parse_stats.items()},
+        ),
+        *metrics.render_stats(
+            "llm_backend_stat", "LLM backend usage, routing and resilience counters.", ("key",),
+            _flatten(llm_backend.stats()),
+        ),
+    ]
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def prometheus_metrics(llm_backend: LLMBackend = Depends(get_llm_backend)):
+    """
+    Prometheus text exposition format.
+    """
+    lines = metrics.render() + _component_stats(llm_backend)
+    return PlainTextResponse(
+        "\n".join(lines) + "\n", media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
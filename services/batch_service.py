@@ -0,0 +1,73 @@
+# services/batch_service.py
+
+import asyncio
+from typing import Awaitable, Iterable, List, Tuple, TypeVar
+
+from fastapi import HTTPException
+
+from models.errors import ErrorResponse
+from services.resilience import UpstreamUnavailable
+from utils.logger import log_error
+
+T = TypeVar("T")
+
+
+class BatchService:
+
+    @staticmethod
+    def dedupe(codes: Iterable[str]) -> List[str]:
+        """
+        Unique snippets in first-seen order.
+        """
+        return list(dict.fromkeys(codes))
+
+    @staticmethod
+    async def bounded_gather(jobs: List[Awaitable[T]], max_concurrency: int) -> List[T]:
+        """
+        Awaits every job with at most `max_concurrency` running at once.
+        """
+        slots = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def run(job: Awaitable[T]) -> T:
+            async with slots:
+                return await job
+
+        return await asyncio.gather(*(run(job) for job in jobs))
+
+    @staticmethod
+    def pack(
+        snippets: List[Tuple[str, str]], max_chars: int, pack_size: int
+    ) -> Tuple[List[List[Tuple[str, str]]], List[Tuple[str, str]]]:
+        """
+        Groups (code, lang) pairs no longer than `max_chars` into packs of up
+        to `pack_size`. Returns (packs, singles); a pack of one is a single.
+        """
+        if max_chars <= 0 or pack_size <= 1:
+            return [], list(snippets)
+
+        small = [s for s in snippets if len(s[0]) <= max_chars]
+        singles = [s for s in snippets if len(s[0]) > max_chars]
+
+        packs = []
+        for i in range(0, len(small), pack_size):
+            group = small[i:i + pack_size]
+            if len(group) == 1:
+                singles.extend(group)
+            else:
+                packs.append(group)
+        return packs, singles
+
+    @staticmethod
+    def to_error(exc: Exception) -> ErrorResponse:
+        """
+        Per-item error for a failure that would have failed a single request.
+        """
+        if isinstance(exc, HTTPException):
+            error_code = {400: "invalid_code", 413: "too_large"}.get(exc.status_code, "parse_error")
+            return ErrorResponse(error_code=error_code, message=str(exc.detail))
+
+        if isinstance(exc, UpstreamUnavailable):
+            return ErrorResponse(error_code="upstream_unavailable", message=str(exc))
+
+        log_error("Batch item failed: %s", exc)
+        return ErrorResponse(error_code="llm_error", message="Failed to generate response")
@@ -0,0 +1,286 @@
+# services/cache_service.py
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from config import settings
+from utils.logger import log_error
+
+
+class ResponseCache:
+    """
+    Content-addressed cache for raw LLM output.
+
+    Entries live in an in-memory LRU bounded by entry count and total size,
+    each with a TTL. An optional on-disk tier keeps entries across restarts;
+    it has its own entry and size bounds, evicting the oldest files first,
+    and its file I/O runs in worker threads.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int,
+        ttl_seconds: int,
+        cache_dir: Optional[str] = None,
+        enabled: bool = True,
+        disk_max_entries: int = 10000,
+        disk_max_bytes: int = 512 * 1024 * 1024,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self.disk_max_entries = disk_max_entries
+        self.disk_max_bytes = disk_max_bytes
+
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+        # Files on disk, oldest written first: key -> (expires_at, bytes).
+        # Every entry gets the same TTL, so this is also expiry order.
+        self._disk_index: "OrderedDict[str, Tuple[float, int]]" = OrderedDict()
+        self._disk_size = 0
+        self._disk_lock = threading.Lock()
+
+        self._dir: Optional[Path] = None
+        if cache_dir:
+            self._dir = Path(cache_dir)
+            self._dir.mkdir(parents=True, exist_ok=True)
+            self._load_disk_index()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+    # ---------- Keys ----------
+
+    @staticmethod
+    def make_key(endpoint: str, code: str, lang: str, prompt_version: str) -> str:
+        digest = hashlib.sha256()
+        for part in (endpoint, lang, prompt_version, code):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\x00")
+        return digest.hexdigest()
+
+    # ---------- Public API ----------
+
+    async def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._remove(key)
+
+        entry = await asyncio.to_thread(self._disk_get, key, now) if self._dir is not None else None
+        if entry is not None:
+            expires_at, value = entry
+            with self._lock:
+                self.disk_hits += 1
+                self._insert(key, value, expires_at)
+            return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    async def set(self, key: str, value: str) -> None:
+        if not self.enabled:
+            return
+
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._insert(key, value, expires_at)
+        if self._dir is not None:
+            await asyncio.to_thread(self._disk_set, key, value, expires_at)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+        if self._dir is not None:
+            with self._disk_lock:
+                stats.update({
+                    "disk_entries": len(self._disk_index),
+                    "disk_bytes": self._disk_size,
+                    "disk_evictions": self.disk_evictions,
+                })
+        return stats
+
+    # ---------- Memory tier (caller holds the lock) ----------
+
+    def _insert(self, key: str, value: str, expires_at: float) -> None:
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+
+        self._entries[key] = (expires_at, value)
+        self._size += size
+
+        while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        _, value = self._entries.pop(key)
+        self._size -= len(value.encode("utf-8"))
+
+    # ---------- Disk tier (worker threads) ----------
+
+    def _disk_path(self, key: str) -> Path:
+        return self._dir / f"{key}.json"
+
+    def _load_disk_index(self) -> None:
+        """
+        Indexes files left by a previous run; their expiry is estimated
+        from the modification time. Interrupted writes are removed.
+        """
+        for tmp_path in self._dir.glob("*.tmp"):
+            tmp_path.unlink(missing_ok=True)
+        files = []
+        for path in self._dir.glob("*.json"):
+            try:
+                info = path.stat()
+            except OSError:
+                continue
+            files.append((info.st_mtime, path.stem, info.st_size))
+        for mtime, key, size in sorted(files):
+            self._disk_index[key] = (mtime + self.ttl_seconds, size)
+            self._disk_size += size
+        self._disk_evict(time.time())
+
+    def _disk_forget(self, key: str) -> None:
+        """
+        Drops the key from the index and deletes its file (caller holds the disk lock).
+        """
+        _, size = self._disk_index.pop(key)
+        self._disk_size -= size
+        self._disk_path(key).unlink(missing_ok=True)
+
+    def _disk_evict(self, now: float) -> None:
+        """
+        Removes expired files, then the oldest until within both bounds
+        (caller holds the disk lock, or runs before the cache is shared).
+        """
+        while self._disk_index:
+            key, (expires_at, _) = next(iter(self._disk_index.items()))
+            over_budget = (
+                len(self._disk_index) > self.disk_max_entries
+                or self._disk_size > self.disk_max_bytes
+            )
+            if expires_at > now and not over_budget:
+                break
+            self._disk_forget(key)
+            if expires_at > now:
+                self.disk_evictions += 1
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[float, str]]:
+        with self._disk_lock:
+            if key not in self._disk_index:
+                return None
+
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            with self._disk_lock:
+                if key in self._disk_index:
+                    self._disk_forget(key)
+            return None
+        except (OSError, ValueError) as e:
+            log_error("Response cache read failed for %s: %s", path.name, e)
+            return None
+
+        if data.get("expires_at", 0) <= now:
+            with self._disk_lock:
+                if key in self._disk_index:
+                    self._disk_forget(key)
+            return None
+
+        return data["expires_at"], data["value"]
+
+    def _disk_set(self, key: str, value: str, expires_at: float) -> None:
+        path = self._disk_path(key)
+        # Unique per thread, so concurrent writes of one key never share a file
+        tmp_path = path.with_name(f"{key}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"expires_at": expires_at, "value": value}, f)
+            size = tmp_path.stat().st_size
+            os.replace(tmp_path, path)
+        except OSError as e:
+            log_error("Response cache write failed for %s: %s", path.name, e)
+            tmp_path.unlink(missing_ok=True)
+            return
+
+        with self._disk_lock:
+            previous = self._disk_index.pop(key, None)
+            if previous is not None:
+                self._disk_size -= previous[1]
+            self._disk_index[key] = (expires_at, size)
+            self._disk_size += size
+            self._disk_evict(time.time())
+
+
+def is_cache_bypassed(cache_control: Optional[str]) -> bool:
+    """
+    True when the client sent `Cache-Control: no-cache`.
+    The fresh result is still stored for later requests.
+    """
+    if not cache_control:
+        return False
+    directives = {d.strip().lower() for d in cache_control.split(",")}
+    return "no-cache" in directives
+
+
+response_cache = ResponseCache(
+    max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    max_bytes=settings.RESPONSE_CACHE_MAX_BYTES,
+    ttl_seconds=settings.RESPONSE_CACHE_TTL_SECONDS,
+    cache_dir=settings.RESPONSE_CACHE_DIR,
+    enabled=settings.RESPONSE_CACHE_ENABLED,
+    disk_max_entries=settings.RESPONSE_CACHE_DISK_MAX_ENTRIES,
+    disk_max_bytes=settings.RESPONSE_CACHE_DISK_MAX_BYTES,
+)
+
+# Finished explanations by content hash (IncrementalService.explanation_id),
+# the base for incremental re-explanation of edited code
+explanation_store = ResponseCache(
+    max_entries=settings.EXPLANATION_STORE_MAX_ENTRIES,
+    max_bytes=settings.EXPLANATION_STORE_MAX_BYTES,
+    ttl_seconds=settings.EXPLANATION_STORE_TTL_SECONDS,
+)
@@ -0,0 +1,158 @@
+# services/chunking_service.py
+
+import ast
+from typing import Dict, List, Optional, Tuple
+
+from utils.logger import log_error
+
+# (first line, last line), 1-based and inclusive
+Span = Tuple[int, int]
+
+
+class ChunkingService:
+    """
+    Splits large files into chunks of whole top-level units (functions,
+    classes, statement groups) so each chunk can be explained on its own.
+    """
+
+    @staticmethod
+    def split(code: str, lang: str, max_lines: int) -> List[Tuple[int, str]]:
+        """
+        Returns (first line number, chunk code) pairs covering every
+        non-blank line.
+        Units are packed greedily up to `max_lines`; a unit longer than
+        that is cut at line boundaries.
+        """
+        lines = code.split("\n")
+        units = None
+        if lang == "python":
+            units = ChunkingService._python_units(code, lines)
+        if units is None:
+            units = ChunkingService._heuristic_units(lines)
+
+        chunks = []
+        for first, last in ChunkingService._pack(units, max(1, max_lines)):
+            chunk = "\n".join(lines[first - 1:last])
+            if chunk.strip():
+                chunks.append((first, chunk))
+        return chunks
+
+    @staticmethod
+    def rebase(lines: Dict[str, str], first_line: int) -> Dict[str, str]:
+        """
+        Shifts chunk-relative line keys to file line numbers.
+        """
+        offset = first_line - 1
+        if offset == 0:
+            return lines
+        rebased = {}
+        for key, text in lines.items():
+            try:
+                rebased[str(int(key) + offset)] = text
+            except (TypeError, ValueError):
+                rebased[key] = text
+        return rebased
+
+    @staticmethod
+    def _python_units(code: str, lines: List[str]) -> Optional[List[Span]]:
+        try:
+            tree = ast.parse(code)
+        except (SyntaxError, ValueError) as e:
+            log_error("ChunkingService falling back to heuristic split: %s", e)
+            return None
+
+        # Each top-level statement (with its decorators and the comment lines
+        # directly above it) starts a unit, and the unit runs up to the next
+        # one, so comments stay with the code that follows them
+        starts = []
+        for node in tree.body:
+            decorators = getattr(node, "decorator_list", [])
+            start = min([node.lineno] + [d.lineno for d in decorators])
+            floor = starts[-1] + 1 if starts else 1
+            while start > floor and lines[start - 2].startswith("#"):
+                start -= 1
+            starts.append(start)
+        if not starts:
+            return [(1, len(lines))]
+
+        starts[0] = 1
+        ends = [s - 1 for s in starts[1:]] + [len(lines)]
+        return list(zip(starts, ends))
+
+    @staticmethod
+    def _heuristic_units(lines: List[str]) -> List[Span]:
+        """
+        Brace/indent heuristic: a unit ends after a line that leaves the
+        brace depth at zero when the next non-blank line is not indented.
+        """
+        # indented_next[i]: whether the first non-blank line after line i is indented
+        indented_next = [True] * len(lines)
+        following_indented = True
+        for i in range(len(lines) - 1, -1, -1):
+            indented_next[i] = following_indented
+            if lines[i].strip():
+                following_indented = lines[i][0].isspace()
+
+        units = []
+        depth = 0
+        first = 1
+        for number, line in enumerate(lines, start=1):
+            depth = max(0, depth + ChunkingService._brace_delta(line))
+            if depth or not line.strip() or indented_next[number - 1]:
+                continue
+            units.append((first, number))
+            first = number + 1
+        if first <= len(lines):
+            units.append((first, len(lines)))
+        return units
+
+    @staticmethod
+    def _brace_delta(line: str) -> int:
+        """
+        Net { } balance of one line, ignoring string literals and // comments.
+        """
+        delta = 0
+        quote = None
+        i = 0
+        while i < len(line):
+            ch = line[i]
+            if quote:
+                if ch == "\\":
+                    i += 1
+                elif ch == quote:
+                    quote = None
+            elif ch in "\"'`":
+                quote = ch
+            elif ch == "/" and line.startswith("//", i):
+                break
+            elif ch == "{":
+                delta += 1
+            elif ch == "}":
+                delta -= 1
+            i += 1
+        return delta
+
+    @staticmethod
+    def _pack(units: List[Span], max_lines: int) -> List[Span]:
+        chunks: List[Span] = []
+        start = end = None
+        for first, last in units:
+            # Oversized unit: flush, then cut it into max_lines pieces
+            if last - first + 1 > max_lines:
+                if start is not None:
+                    chunks.append((start, end))
+                    start = None
+                for piece in range(first, last + 1, max_lines):
+                    chunks.append((piece, min(piece + max_lines - 1, last)))
+                continue
+
+            if start is not None and last - start + 1 > max_lines:
+                chunks.append((start, end))
+                start = None
+            if start is None:
+                start = first
+            end = last
+
+        if start is not None:
+            chunks.append((start, end))
+        return chunks
@@ -0,0 +1,95 @@
+# services/context_cache.py
+
+import asyncio
+import datetime
+from typing import Optional
+
+import google.generativeai as genai
+from google.generativeai import caching
+
+from config import settings
+from utils.logger import log_info, log_error
+
+
+class PromptContextCache:
+    """
+    Keeps one static system instruction registered as Gemini cached content,
+    so requests only send the code. The TTL is renewed in the background at
+    half its length; if renewal fails the content is recreated.
+
+    Gemini refuses to cache contexts below a minimum size
+    (GEMINI_CONTEXT_CACHE_MIN_TOKENS). Smaller instructions are left as
+    plain system instructions and `model` stays None.
+    """
+
+    def __init__(self, name: str, system_instruction: str):
+        self.name = name
+        self.system_instruction = system_instruction
+        # Bound to the cached content while it is alive
+        self.model: Optional[genai.GenerativeModel] = None
+        self._cached: Optional[caching.CachedContent] = None
+        self._refresher: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _ttl() -> datetime.timedelta:
+        return datetime.timedelta(seconds=settings.GEMINI_CONTEXT_CACHE_TTL_SECONDS)
+
+    async def start(self, counter: genai.GenerativeModel) -> bool:
+        """
+        Creates the cached content if the instruction is large enough.
+        `counter` is any model able to count tokens for GEMINI_MODEL.
+        """
+        try:
+            tokens = (await counter.count_tokens_async(self.system_instruction)).total_tokens
+            if tokens < settings.GEMINI_CONTEXT_CACHE_MIN_TOKENS:
+                log_info(
+                    "Context cache not used for %s: %d tokens, minimum is %d",
+                    self.name, tokens, settings.GEMINI_CONTEXT_CACHE_MIN_TOKENS,
+                )
+                return False
+            await self._create()
+        except Exception as e:
+            log_error("Context cache creation failed for %s: %s", self.name, e)
+            return False
+
+        self._refresher = asyncio.create_task(self._refresh_loop())
+        log_info("Context cache active for %s (%d tokens)", self.name, tokens)
+        return True
+
+    async def _create(self) -> None:
+        self._cached = await asyncio.to_thread(
+            caching.CachedContent.create,
+            model=settings.GEMINI_MODEL,
+            display_name=f"code-explainer-{self.name}",
+            system_instruction=self.system_instruction,
+            ttl=self._ttl(),
+        )
+        self.model = genai.GenerativeModel.from_cached_content(self._cached)
+
+    async def _refresh_loop(self) -> None:
+        interval = max(1, settings.GEMINI_CONTEXT_CACHE_TTL_SECONDS // 2)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self._cached.update, ttl=self._ttl())
+                continue
+            except Exception as e:
+                log_error("Context cache refresh failed for %s: %s", self.name, e)
+
+            try:
+                await self._create()
+            except Exception as e:
+                # Plain system instruction until the next attempt succeeds
+                log_error("Context cache recreation failed for %s: %s", self.name, e)
+                self.model = None
+
+    async def close(self) -> None:
+        if self._refresher is not None:
+            self._refresher.cancel()
+        self.model = None
+        if self._cached is not None:
+            try:
+                await asyncio.to_thread(self._cached.delete)
+            except Exception as e:
+                log_error("Context cache delete failed for %s: %s", self.name, e)
+            self._cached = None
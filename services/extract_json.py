@@ -1,34 +1,158 @@
 import json
 import re
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Type, TypeVar
 from utils.logger import log_error
 
-def extract_json(text: str):
+M = TypeVar("M")
+
+# Per endpoint: outputs validated directly ("<endpoint>_direct") versus
+# outputs that still needed the extraction fallback ("<endpoint>_fallback")
+parse_stats: Counter = Counter()
+
+# Only characters that can change nesting or string state. A character class
+# cannot backtrack, so finditer visits each structural character once.
+_STRUCTURAL = re.compile(r'[{}\[\]"\\]')
+
+_OPENERS = {"{": "}", "[": "]"}
+
+
+def _balanced_spans(text: str, opener: str) -> Iterator[Tuple[int, int]]:
+    """
+    Yields (start, end) of each top-level balanced block starting with
+    `opener`, in one left-to-right pass. Braces inside JSON strings and
+    escaped quotes are ignored. Anything before an opener (prose, markdown
+    fences, stray closing brackets) is skipped.
     """
-    Robustly extract JSON from LLM output using Regex.
+    depth = 0
+    start = -1
+    in_string = False
+    skip_to = -1
+
+    for match in _STRUCTURAL.finditer(text):
+        pos = match.start()
+        if pos < skip_to:
+            continue
+        ch = match.group()
+
+        if depth == 0:
+            if ch == opener:
+                depth = 1
+                start = pos
+            continue
+
+        if in_string:
+            if ch == "\\":
+                skip_to = pos + 2  # the escaped character is not structural
+            elif ch == '"':
+                in_string = False
+            continue
+
+        if ch == '"':
+            in_string = True
+        elif ch in _OPENERS:
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+            if depth == 0:
+                yield start, pos + 1
+
+
+def _first_parsable(text: str, opener: str, expected: type) -> Optional[Any]:
+    for start, end in _balanced_spans(text, opener):
+        try:
+            value = json.loads(text[start:end])
+        except json.JSONDecodeError:
+            continue
+        if isinstance(value, expected):
+            return value
+    return None
+
+
+def extract_json(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Extract the first JSON object from LLM output in linear time.
     Handles Markdown fences and messy pre/post text.
     """
     try:
-        # 1. Attempt to clean markdown code fences (```json ... ```)
-        cleaned_text = re.sub(r"^```json\s*", "", text, flags=re.MULTILINE)
-        cleaned_text = re.sub(r"^```\s*", "", cleaned_text, flags=re.MULTILINE)
-        cleaned_text = re.sub(r"```$", "", cleaned_text, flags=re.MULTILINE)
-
-        # 2. Find the first outer-most curly brace structure
-        # This regex looks for a { followed by anything, ending with a }
-        # re.DOTALL allows matching across newlines
-        match = re.search(r"(\{.*\})", cleaned_text, re.DOTALL)
-        
-        if not match:
-            log_error(f"No JSON structure found in text: {text[:100]}...")
-            return None
-
-        candidate = match.group(1)
-        
-        return json.loads(candidate)
-
-    except json.JSONDecodeError as e:
-        log_error(f"JSON Decode Error: {str(e)} | Input: {text[:100]}...")
+        parsed = _first_parsable(text, "{", dict)
+        if parsed is None:
+            log_error("No JSON structure found in text: %.100s...", text)
+        return parsed
+    except Exception as e:
+        log_error("JSON Extraction Error: %s", e)
         return None
+
+
+def extract_json_array(text: str) -> Optional[List[Any]]:
+    """
+    Extract the first JSON array from LLM output in linear time.
+    """
+    try:
+        return _first_parsable(text, "[", list)
     except Exception as e:
-        log_error(f"JSON Extraction Error: {str(e)}")
-        return None
\ No newline at end of file
+        log_error("JSON Extraction Error: %s", e)
+        return None
+
+
+def validate_direct(text: str, model: Type[M], endpoint: str) -> Optional[M]:
+    """
+    Fast path for structured output: validates the raw text against a
+    Pydantic model in one step (model_validate_json). Returns None, and
+    counts a fallback, when the caller has to extract instead.
+    """
+    try:
+        result = model.model_validate_json(text)
+    except ValueError:  # pydantic's ValidationError is a ValueError
+        parse_stats[f"{endpoint}_fallback"] += 1
+        return None
+    parse_stats[f"{endpoint}_direct"] += 1
+    return result
+
+
+def extract_tag(text: str, tag: str) -> Optional[Tuple[str, int, int]]:
+    """
+    Finds the first <tag>...</tag> block.
+    Returns (inner text, block start, block end) or None.
+    """
+    open_tag, close_tag = f"<{tag}>", f"</{tag}>"
+    start = text.find(open_tag)
+    if start == -1:
+        return None
+    inner_start = start + len(open_tag)
+    inner_end = text.find(close_tag, inner_start)
+    if inner_end == -1:
+        return None
+    return text[inner_start:inner_end], start, inner_end + len(close_tag)
+
+
+def parse_split_response(text: str) -> dict:
+    """
+    Extracts JSON metadata AND the separate XML code block.
+    Robust against C/C++ quotes breaking JSON.
+    """
+    result = {
+        "language": None,
+        "improvements": "",
+        "optimized_code": None
+    }
+
+    # 1. Extract Code from XML tags first, so braces in the code
+    # can never be mistaken for the metadata object
+    metadata_text = text
+    block = extract_tag(text, "optimized_code")
+    if block:
+        code, start, end = block
+        result["optimized_code"] = code.strip()
+        metadata_text = text[:start] + text[end:]
+
+    # 2. Extract JSON Metadata {"language": "...", "improvements": "..."}
+    data = extract_json(metadata_text)
+    if data:
+        result["language"] = data.get("language")
+        result["improvements"] = data.get("improvements", "")
+        # Structured output carries the code inside the JSON
+        if result["optimized_code"] is None and isinstance(data.get("optimized_code"), str):
+            result["optimized_code"] = data["optimized_code"].strip() or None
+
+    return result
@@ -1,56 +1,380 @@
 # services/gemini_service.py
+import asyncio
+import dataclasses
+import time
+from collections import Counter
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Type
+
 import google.generativeai as genai
+from pydantic import BaseModel
 from utils.logger import log_info, log_error
-from ai.prompts.explain_prompt import EXPLAIN_PROMPT_TEMPLATE
-from ai.prompts.improve_prompt import IMPROVE_PROMPT_TEMPLATE
+from utils.metrics import LLM_IN_FLIGHT, record_error, record_tokens, stage
+from ai.prompts.code_minimizer import estimate_tokens
+from ai.prompts.prompt_builder import (
+    BuiltPrompt,
+    SYSTEM_INSTRUCTIONS,
+    build_explain_prompt,
+    build_batch_explain_prompt,
+    build_improve_prompt,
+)
+from models.responses import CodeImprovementResponse
+from services.context_cache import PromptContextCache
+from services.llm_backend import LLMBackend
+from services.model_router import ModelRouter, RouteDecision
+from services.resilience import CircuitBreaker, ResilientCaller, UpstreamUnavailable
 from config import settings
 
 
-class GeminiService:
+def response_schema(model: Type[BaseModel]) -> Dict[str, Any]:
+    """
+    Gemini response schema for a flat Pydantic model of scalar fields.
+    Gemini accepts only an OpenAPI subset, so Optional[X] becomes a
+    nullable X and titles/defaults are dropped.
+    """
+    json_schema = model.model_json_schema()
+    properties = {}
+    for name, prop in json_schema["properties"].items():
+        variants = prop.get("anyOf", [prop])
+        types = [v["type"] for v in variants if v.get("type") != "null"]
+        field = {"type": types[0]}
+        if len(types) < len(variants):
+            field["nullable"] = True
+        if "description" in prop:
+            field["description"] = prop["description"]
+        properties[name] = field
+
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": json_schema.get("required", []),
+    }
+
+
+class GeminiService(LLMBackend):
+    """
+    One instance lives for the whole application (see main.lifespan).
+    The SDK keeps its async client, and with it the pooled gRPC channel,
+    until genai.configure() is called again, so configuring once per
+    process lets every request reuse the same connection.
+
+    The static part of each prompt (per endpoint and few-shot language) is
+    the system instruction of its own model, optionally as cached content
+    (see enable_context_cache); requests only send the code.
+    """
+
     def __init__(self):
         genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel("models/gemini-2.0-flash")
+        # Plain model for warm-up and token counting
+        self.model = genai.GenerativeModel(settings.GEMINI_MODEL)
+        # Caps in-flight generations per worker; awaiting a slot never blocks the loop
+        self._slots = asyncio.Semaphore(settings.GEMINI_MAX_CONCURRENCY)
+
+        # Structured output. Explain uses JSON mode only: its line map is a
+        # Dict field, which Gemini response schemas cannot express.
+        self.structured = settings.GEMINI_STRUCTURED_OUTPUT
+        json_mode = {"response_mime_type": "application/json"} if self.structured else {}
+        self._output_format: Dict[str, Dict[str, Any]] = {
+            "explain": json_mode,
+            "explain_batch": json_mode,
+            "improve": {
+                **json_mode,
+                "response_schema": response_schema(CodeImprovementResponse),
+            } if self.structured else {},
+        }
+
+        # Model, output limit and stop sequences per call
+        self.router = ModelRouter()
+
+        # Timeout, retries, hedging and circuit breaker around every call
+        self.resilience = ResilientCaller(
+            CircuitBreaker(settings.CIRCUIT_FAILURE_THRESHOLD, settings.CIRCUIT_OPEN_SECONDS),
+            timeout=settings.GEMINI_TIMEOUT_SECONDS,
+            max_retries=settings.GEMINI_MAX_RETRIES,
+            base_delay=settings.GEMINI_RETRY_BASE_DELAY_MS / 1000,
+            max_delay=settings.GEMINI_RETRY_MAX_DELAY_MS / 1000,
+            hedge=settings.GEMINI_HEDGE,
+            hedge_min_delay=settings.GEMINI_HEDGE_MIN_DELAY_MS / 1000,
+        )
+
+        # One model per system instruction (endpoint x few-shot language).
+        # The split JSON + <optimized_code> format is only needed when
+        # Gemini is not escaping the code for us.
+        unused_improve = "improve:" if self.structured else "improve_json:"
+        self.system_instructions = {
+            key: text for key, text in SYSTEM_INSTRUCTIONS.items()
+            if not key.startswith(unused_improve)
+        }
+        self.models = {
+            key: genai.GenerativeModel(settings.GEMINI_MODEL, system_instruction=text)
+            for key, text in self.system_instructions.items()
+        }
+        # Same system instructions on the router's fast model, created on first use
+        self._fast_models: Dict[str, genai.GenerativeModel] = {}
+        self._context_caches: Dict[str, PromptContextCache] = {}
+
+        # Per endpoint: calls, estimated_tokens (before sending), and
+        # prompt_tokens / cached_tokens (from usage metadata)
+        self.usage: Dict[str, Counter] = {
+            name: Counter() for name in ("explain", "explain_batch", "improve")
+        }
+
+    async def warm_up(self) -> None:
+        """
+        Opens the connection to Gemini with a cheap token-count call.
+        A failure is logged and otherwise ignored.
+        """
+        try:
+            await self.model.count_tokens_async("warm-up")
+            log_info("Gemini connection warmed up")
+        except Exception as e:
+            log_error("GeminiService warm-up failed: %s", e)
+
+    async def enable_context_cache(self) -> None:
+        """
+        Registers each system instruction as cached content. Instructions
+        too small to cache, or whose cache cannot be created, stay plain
+        system instructions.
+        """
+        for key, text in self.system_instructions.items():
+            cache = PromptContextCache(key, text)
+            if await cache.start(self.model):
+                self._context_caches[key] = cache
+
+    async def close(self) -> None:
+        for cache in self._context_caches.values():
+            await cache.close()
+        self._context_caches.clear()
+
+    def check_available(self) -> None:
+        self.resilience.breaker.check()
+
+    def stats(self) -> Dict:
+        return {
+            "usage": self.usage_stats(),
+            "routing": self.router.stats(),
+            "resilience": self.resilience.stats(),
+        }
+
+    def _model(self, instruction_key: str, model_name: str) -> genai.GenerativeModel:
+        if model_name != settings.GEMINI_MODEL:
+            model = self._fast_models.get(instruction_key)
+            if model is None:
+                model = genai.GenerativeModel(
+                    model_name, system_instruction=self.system_instructions[instruction_key]
+                )
+                self._fast_models[instruction_key] = model
+            return model
+
+        # Cached content belongs to the primary model
+        cache = self._context_caches.get(instruction_key)
+        if cache is not None and cache.model is not None:
+            return cache.model
+        return self.models[instruction_key]
+
+    def _route(self, endpoint: str, prompt: BuiltPrompt) -> Tuple[RouteDecision, genai.GenerationConfig]:
+        decision = self.router.route(
+            endpoint, prompt.text, estimate_tokens(prompt.text), self.structured
+        )
+        config = genai.GenerationConfig(
+            **self._output_format[endpoint],
+            max_output_tokens=decision.max_output_tokens,
+            stop_sequences=list(decision.stop_sequences) or None,
+        )
+        return decision, config
+
+    def _record_usage(self, endpoint: str, response) -> None:
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return
+        stats = self.usage[endpoint]
+        stats["prompt_tokens"] += usage.prompt_token_count
+        stats["cached_tokens"] += getattr(usage, "cached_content_token_count", 0)
+
+    @staticmethod
+    def _truncated(response) -> bool:
+        """
+        Whether generation stopped at max_output_tokens.
+        """
+        candidates = getattr(response, "candidates", None) or []
+        reason = getattr(candidates[0], "finish_reason", None) if candidates else None
+        return reason == genai.protos.Candidate.FinishReason.MAX_TOKENS
+
+    @staticmethod
+    def _output_tokens(response) -> Optional[int]:
+        usage = getattr(response, "usage_metadata", None)
+        return getattr(usage, "candidates_token_count", None) if usage is not None else None
+
+    def usage_stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Input tokens per endpoint, including the average per call.
+        """
+        return {
+            name: {
+                **stats,
+                "prompt_tokens_per_call": round(stats["prompt_tokens"] / stats["calls"], 1)
+                if stats["calls"] else 0.0,
+            }
+            for name, stats in self.usage.items()
+        }
+
+    def _count_prompt(self, endpoint: str, prompt: BuiltPrompt) -> None:
+        stats = self.usage[endpoint]
+        stats["calls"] += 1
+        stats["estimated_tokens"] += prompt.estimated_tokens
+
+    def _count_tokens(self, endpoint: str, prompt: BuiltPrompt, response, text: str) -> None:
+        """
+        Token counters for /metrics: usage metadata when Gemini reports it,
+        otherwise estimates.
+        """
+        usage = getattr(response, "usage_metadata", None)
+        input_tokens = getattr(usage, "prompt_token_count", None) or prompt.estimated_tokens
+        output_tokens = self._output_tokens(response) or estimate_tokens(text)
+        record_tokens(endpoint, input_tokens, output_tokens)
+
+    async def _generate(self, endpoint: str, prompt: BuiltPrompt) -> str:
+        self._count_prompt(endpoint, prompt)
+        decision, config = self._route(endpoint, prompt)
+        model = self._model(prompt.instruction_key, decision.model_name)
+
+        # Latency of the attempt that succeeded, without slot waits, backoff
+        # sleeps or failed attempts, for the router's p95
+        elapsed = 0.0
+
+        async def attempt():
+            nonlocal elapsed
+            start = time.perf_counter()
+            response = await model.generate_content_async(prompt.text, generation_config=config)
+            elapsed = time.perf_counter() - start
+            return response
+
+        # A slot is held per attempt, never while waiting to retry
+        with stage("llm"), LLM_IN_FLIGHT.track(endpoint):
+            response = await self.resilience.call(attempt, self._slots)
+            # Output cut off at the routed limit is retried once at the
+            # ceiling, and never returned (and cached) as if it were complete
+            limit = settings.ROUTER_MAX_OUTPUT_TOKENS
+            if self._truncated(response) and config.max_output_tokens < limit:
+                log_info("%s output truncated at %d tokens; retrying with %d",
+                         endpoint, config.max_output_tokens, limit)
+                config = dataclasses.replace(config, max_output_tokens=limit)
+                response = await self.resilience.call(attempt, self._slots)
+            if self._truncated(response):
+                record_error("llm_truncated")
+                raise RuntimeError(f"{endpoint} output truncated at {config.max_output_tokens} tokens")
+
+        self.router.record(decision, elapsed, self._output_tokens(response))
+        self._record_usage(endpoint, response)
+        self._count_tokens(endpoint, prompt, response, response.text)
+        return response.text
 
     async def explain_code(self, code: str, lang: str) -> str:
         try:
-            from ai.prompts.base_prompt import SYSTEM_ROLE, JSON_INSTRUCTIONS
-            from ai.prompts.explain_prompt import FEW_SHOT_EXAMPLE
-
-            prompt = EXPLAIN_PROMPT_TEMPLATE.format(
-                system_role=SYSTEM_ROLE,
-                json_instructions=JSON_INSTRUCTIONS,
-                few_shot_example=FEW_SHOT_EXAMPLE,
-                code=code,
-                lang=lang
+            with stage("prompt"):
+                prompt = build_explain_prompt(code, lang)
+
+            log_info("Sending explain prompt to Gemini (~%d tokens)", prompt.estimated_tokens, sampled=True)
+
+            return await self._generate("explain", prompt)
+
+        except UpstreamUnavailable:
+            raise
+        except Exception as e:
+            log_error("GeminiService explain_code Exception: %s", e)
+            record_error("llm_error")
+            raise RuntimeError("Failed to generate explanation")
+
+    async def explain_code_batch(self, snippets: List[Tuple[str, str]]) -> str:
+        """
+        Explains several (code, lang) snippets with one call.
+        The output is a JSON array in snippet order.
+        """
+        try:
+            with stage("prompt"):
+                prompt = build_batch_explain_prompt(snippets)
+
+            log_info(
+                "Sending batch explain prompt to Gemini (%d snippets, ~%d tokens)",
+                len(snippets), prompt.estimated_tokens, sampled=True,
             )
 
-            log_info("Sending explain prompt to Gemini")
+            return await self._generate("explain_batch", prompt)
+
+        except UpstreamUnavailable:
+            raise
+        except Exception as e:
+            log_error("GeminiService explain_code_batch Exception: %s", e)
+            record_error("llm_error")
+            raise RuntimeError("Failed to generate explanation")
+
+    async def stream_explain_code(self, code: str, lang: str) -> AsyncIterator[str]:
+        """
+        Yields the explanation text chunk by chunk as Gemini generates it.
+        """
+        try:
+            with stage("prompt"):
+                prompt = build_explain_prompt(code, lang)
+
+            log_info("Streaming explain prompt to Gemini (~%d tokens)", prompt.estimated_tokens, sampled=True)
 
-            response = self.model.generate_content(prompt)
-            return response.text
+            self._count_prompt("explain", prompt)
+            decision, config = self._route("explain", prompt)
+            model = self._model(prompt.instruction_key, decision.model_name)
 
+            start = 0.0
+
+            async def open_stream():
+                nonlocal start
+                start = time.perf_counter()
+                return await model.generate_content_async(
+                    prompt.text, generation_config=config, stream=True
+                )
+
+            chunks = []
+            with LLM_IN_FLIGHT.track("explain"):
+                # Only opening the stream is retried; once text has been
+                # yielded a retry would repeat it. The slot of the attempt
+                # that opened the stream is held until it is consumed.
+                with stage("llm"):
+                    response = await self.resilience.call(open_stream, self._slots, hold_slot=True)
+                try:
+                    async for chunk in response:
+                        chunks.append(chunk.text)
+                        yield chunk.text
+                finally:
+                    self._slots.release()
+                elapsed = time.perf_counter() - start
+
+            # Usage metadata is complete once the stream has been consumed
+            self.router.record(decision, elapsed, self._output_tokens(response))
+            self._record_usage("explain", response)
+            self._count_tokens("explain", prompt, response, "".join(chunks))
+
+        except UpstreamUnavailable:
+            raise
         except Exception as e:
-            log_error(f"GeminiService explain_code Exception: {str(e)}")
+            log_error("GeminiService stream_explain_code Exception: %s", e)
+            record_error("llm_error")
             raise RuntimeError("Failed to generate explanation")
 
     async def suggest_improvements(self, code: str,lang:str) -> str:
         try:
-            from ai.prompts.base_prompt import SYSTEM_ROLE, JSON_INSTRUCTIONS
-            from ai.prompts.improve_prompt import FEW_SHOT_EXAMPLE
-
-            prompt = IMPROVE_PROMPT_TEMPLATE.format(
-                system_role=SYSTEM_ROLE,
-                json_instructions=JSON_INSTRUCTIONS,
-                few_shot_example=FEW_SHOT_EXAMPLE,
-                code=code,
-                lang=lang
-            )
+            with stage("prompt"):
+                prompt = build_improve_prompt(code, lang, self.structured)
+
+            log_info("Sending improve prompt to Gemini (~%d tokens)", prompt.estimated_tokens, sampled=True)
 
-            log_info("Sending improve prompt to Gemini")
+            text = await self._generate("improve", prompt)
 
-            response = self.model.generate_content(prompt)
-            return response.text
+            # A stop sequence is not part of the output; restore the closing
+            # tag. Truncated output never gets here (see _generate).
+            if "<optimized_code>" in text and "</optimized_code>" not in text:
+                text += "</optimized_code>"
+            return text
 
+        except UpstreamUnavailable:
+            raise
         except Exception as e:
-            log_error(f"GeminiService suggest_improvements Exception: {str(e)}")
+            log_error("GeminiService suggest_improvements Exception: %s", e)
+            record_error("llm_error")
             raise RuntimeError("Failed to generate improvements")
@@ -0,0 +1,80 @@
+# services/incremental_service.py
+
+import difflib
+import hashlib
+from typing import Dict, List, NamedTuple, Tuple
+
+# (first line, last line) in the new code, 1-based and inclusive
+Span = Tuple[int, int]
+
+
+class EditPlan(NamedTuple):
+    reused: Dict[int, int]   # new line -> old line, for lines outside every hunk
+    hunks: List[Span]        # new-code line ranges to explain again
+    changed_ratio: float     # share of new lines inside hunks
+
+
+class IncrementalService:
+    """
+    Works out which lines of an edited file need a new explanation and
+    which can keep the stored one, shifted to their new line numbers.
+    """
+
+    @staticmethod
+    def explanation_id(code: str) -> str:
+        """
+        Content hash of the code; clients may compute it themselves.
+        """
+        return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def plan(old_code: str, new_code: str, context: int) -> EditPlan:
+        old_lines = old_code.split("\n")
+        new_lines = new_code.split("\n")
+        matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+
+        mapping: Dict[int, int] = {}
+        changed: List[Span] = []
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal":
+                for offset in range(j2 - j1):
+                    mapping[j1 + offset + 1] = i1 + offset + 1
+            elif j2 > j1:
+                changed.append((j1 + 1, j2))
+            else:
+                # Pure deletion: the lines around the gap may read differently now
+                changed.append((max(1, j1), min(len(new_lines), j1 + 1)))
+
+        hunks = IncrementalService._merge(
+            [(max(1, a - context), min(len(new_lines), b + context)) for a, b in changed]
+        )
+
+        in_hunks = 0
+        for first, last in hunks:
+            in_hunks += last - first + 1
+            for line in range(first, last + 1):
+                mapping.pop(line, None)
+
+        return EditPlan(mapping, hunks, in_hunks / max(1, len(new_lines)))
+
+    @staticmethod
+    def _merge(spans: List[Span]) -> List[Span]:
+        merged: List[Span] = []
+        for first, last in sorted(spans):
+            if merged and first <= merged[-1][1] + 1:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+            else:
+                merged.append((first, last))
+        return merged
+
+    @staticmethod
+    def shift_lines(old_lines: Dict[str, str], reused: Dict[int, int]) -> Dict[str, str]:
+        """
+        Stored explanations of untouched lines, keyed by their new line number.
+        """
+        shifted = {}
+        for new_line, old_line in reused.items():
+            text = old_lines.get(str(old_line))
+            if text is not None:
+                shifted[str(new_line)] = text
+        return shifted
@@ -1,7 +1,177 @@
 # services/language_service.py
 
 import re
+from typing import Dict, List, Optional, Tuple
 from utils.logger import log_error
+from utils.metrics import stage
+
+
+# Evidence rules: (trigger tokens, pattern anchored at the trigger or None,
+# {language: weight}, must be first on its line)
+_RULES: List[Tuple[Tuple[str, ...], Optional[str], Dict[str, float], bool]] = [
+    # Python
+    (("def",), r"def[ \t]+\w+[ \t]*\(.*\)[ \t]*(?:->[^:\n]+)?:[ \t]*$", {"python": 4}, True),
+    (("import",), r"import[ \t]+[\w., \t]+$", {"python": 2}, True),
+    (("from",), r"from[ \t]+[\w.]+[ \t]+import\b", {"python": 3}, True),
+    (("class",), r"class[ \t]+\w+(?:\(.*\))?:[ \t]*$", {"python": 4}, True),
+    (("elif", "except", "finally", "with", "for", "while", "if", "else"),
+     r"\w+\b.*:[ \t]*$", {"python": 2}, True),
+    (("print",), r"print[ \t]*\(", {"python": 2}, False),
+    (("self",), r"self\.", {"python": 1}, False),
+    (("None", "True", "False"), None, {"python": 1}, False),
+    # JavaScript / TypeScript
+    (("function",), r"function\b[ \t]*\w*[ \t]*\(", {"javascript": 2, "typescript": 1, "php": 1}, False),
+    (("console",), r"console\.\w+\(", {"javascript": 4, "typescript": 3}, False),
+    (("=>",), None, {"javascript": 1, "typescript": 1}, False),
+    (("const", "let"), r"\w+[ \t]+\w+[ \t]*=", {"javascript": 2, "typescript": 1}, False),
+    (("var",), r"var[ \t]+\w+[ \t]*=", {"javascript": 2, "csharp": 1}, False),
+    (("require",), r"require\([\"']", {"javascript": 3}, False),
+    (("document", "window"), r"\w+\.\w+", {"javascript": 3}, False),
+    (("===", "!=="), None, {"javascript": 2, "typescript": 2, "php": 1}, False),
+    (("let", "const", "var"), r"\w+[ \t]+\w+[ \t]*:[ \t]*\w+", {"typescript": 4}, False),
+    (("):",), r"\):[ \t]*(?:string|number|boolean|void|any)\b", {"typescript": 4}, False),
+    (("interface",), r"interface[ \t]+\w+[ \t]*\{", {"typescript": 2, "java": 1, "csharp": 1}, False),
+    # Java
+    (("public",), r"public[ \t]+(?:static[ \t]+)?(?:final[ \t]+)?class\b", {"java": 3, "csharp": 2}, False),
+    (("public",), r"public[ \t]+static[ \t]+void[ \t]+main[ \t]*\([ \t]*String", {"java": 5}, False),
+    (("System",), r"System\.out\.print", {"java": 5}, False),
+    (("import",), r"import[ \t]+java\.", {"java": 5}, True),
+    (("package",), r"package[ \t]+[\w.]+;", {"java": 4}, True),
+    (("@",), r"@Override\b", {"java": 3}, False),
+    (("String",), r"String\[\]", {"java": 1, "csharp": 1}, False),
+    # C / C++
+    (("#",), r"#include[ \t]*<\w+>", {"cpp": 4}, False),
+    (("#",), r"#include[ \t]*[<\"][\w/]+\.h[>\"]", {"c": 4, "cpp": 1}, False),
+    (("std",), r"std::", {"cpp": 4}, False),
+    (("cout", "cerr"), r"\w+[ \t]*<<", {"cpp": 4}, False),
+    (("cin",), r"cin[ \t]*>>", {"cpp": 4}, False),
+    (("using",), r"using[ \t]+namespace[ \t]+std\b", {"cpp": 5}, False),
+    (("template",), r"template[ \t]*<", {"cpp": 3}, False),
+    (("printf",), r"printf[ \t]*\(", {"c": 2, "cpp": 1}, False),
+    (("malloc", "calloc", "free"), r"\w+[ \t]*\(", {"c": 2, "cpp": 1}, False),
+    (("int",), r"int[ \t]+main[ \t]*\(", {"c": 2, "cpp": 2}, False),
+    # C#
+    (("using",), r"using[ \t]+System\b", {"csharp": 5}, False),
+    (("Console",), r"Console\.Write(?:Line)?\(", {"csharp": 5}, False),
+    (("namespace",), r"namespace[ \t]+[\w.]+", {"csharp": 2, "cpp": 2}, False),
+    # Go
+    (("package",), r"package[ \t]+\w+[ \t]*$", {"go": 4}, True),
+    (("func",), r"func[ \t]+(?:\([^)]*\)[ \t]*)?\w+[ \t]*\(", {"go": 4}, False),
+    ((":=",), None, {"go": 2}, False),
+    (("fmt",), r"fmt\.\w+\(", {"go": 4}, False),
+    # Rust
+    (("fn",), r"fn[ \t]+\w+[ \t]*(?:<[^>\n]*>)?[ \t]*\(", {"rust": 4}, False),
+    (("let",), r"let[ \t]+mut\b", {"rust": 4}, False),
+    (("!(",), r"(?<=\w)!\(", {"rust": 3}, False),
+    (("use",), r"use[ \t]+\w+(?:::\w+)+;", {"rust": 3}, True),
+    (("impl",), None, {"rust": 3}, True),
+    # PHP
+    (("<?php",), None, {"php": 6}, False),
+    (("$",), r"\$\w+[ \t]*=", {"php": 2}, False),
+    # Ruby
+    (("def",), r"def[ \t]+\w+[?!]?[ \t]*(?:\([^)]*\))?[ \t]*$", {"ruby": 3}, True),
+    (("end",), r"end[ \t]*$", {"ruby": 2}, True),
+    (("puts",), None, {"ruby": 3}, False),
+    (("each",), r"each[ \t]+do\b", {"ruby": 3}, False),
+    (("do",), r"do[ \t]*\|", {"ruby": 3}, False),
+    # SQL
+    (("SELECT", "select"), r"(?i:select\b[\s\S]{0,200}?\bfrom\b)", {"sql": 4}, False),
+    (("INSERT", "insert"), r"(?i:insert[ \t]+into\b)", {"sql": 4}, False),
+    (("CREATE", "create"), r"(?i:create[ \t]+table\b)", {"sql": 4}, False),
+    (("DELETE", "delete"), r"(?i:delete[ \t]+from\b)", {"sql": 4}, False),
+    # Shell
+    (("#",), r"#![ \t]*/(?:usr/)?bin/(?:env[ \t]+)?(?:ba|z)?sh\b", {"shell": 6}, True),
+    (("fi", "done", "esac"), r"\w+[ \t]*$", {"shell": 3}, True),
+    # HTML
+    (("<",), r"(?i:<!DOCTYPE[ \t]+html|<html[\s>])", {"html": 6}, False),
+    (("</",), r"</(?:div|span|body|head|p|a|ul|li|table|form)>", {"html": 2}, False),
+]
+
+# trigger token -> [(compiled pattern or None, weights, line_start)]
+_TRIGGERS: Dict[str, List[Tuple[Optional[re.Pattern], Dict[str, float], bool]]] = {}
+for _tokens, _pattern, _weights, _line_start in _RULES:
+    _compiled = re.compile(_pattern, re.MULTILINE) if _pattern else None
+    for _token in _tokens:
+        _TRIGGERS.setdefault(_token, []).append((_compiled, _weights, _line_start))
+
+
+def _trie_pattern(words: List[str]) -> str:
+    """
+    Alternation of `words` factored by common prefixes ("c(?:lass|onst)"),
+    so the regex engine tries one branch per character instead of every
+    word at every position. Longer words win, as with a length-sorted
+    alternation.
+    """
+    trie: Dict[str, Dict] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict[str, Dict]) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+# One combined pattern over every trigger: a single pass over the text in
+# which only trigger tokens ever reach Python code. Words whose rules all
+# need to be first on their line are only matched there (group "line"), so
+# e.g. `if` and `for` inside minified code are skipped by the regex engine.
+_LINE_TRIGGERS = [t for t, rules in _TRIGGERS.items() if t.isalpha() and all(r[2] for r in rules)]
+_WORD_TRIGGERS = [t for t in _TRIGGERS if t[0].isalpha() and t not in _LINE_TRIGGERS]
+_SYMBOL_TRIGGERS = sorted((t for t in _TRIGGERS if not t[0].isalpha()), key=len, reverse=True)
+# The lookahead rejects most positions with a single character test
+_FIRST_CHARS = "".join(sorted({t[0] for t in _TRIGGERS} | set(" \t\r\f\v")))
+_TOKEN = re.compile(
+    "(?=[" + re.escape(_FIRST_CHARS) + "])(?:"
+    r"^[^\S\n]*(?P<line>" + _trie_pattern(_LINE_TRIGGERS) + r")\b|"
+    r"\b" + _trie_pattern(_WORD_TRIGGERS) + r"\b|"
+    + "|".join(re.escape(t) for t in _SYMBOL_TRIGGERS) + ")",
+    re.MULTILINE,
+)
+
+_NON_BLANK = re.compile(r"\S")
+
+
+class _LineStarts:
+    """
+    Answers "is `pos` the first non-blank character of its line?" for
+    increasing positions in one pass: newlines are only searched between
+    the previous query and this one, and each line's first non-blank
+    character is looked up once, so long (minified) lines stay linear.
+    """
+
+    __slots__ = ("code", "checked_to", "line_start", "first")
+
+    def __init__(self, code: str):
+        self.code = code
+        self.checked_to = 0
+        self.line_start = 0
+        self.first = -1
+
+    def __call__(self, pos: int) -> bool:
+        newline = self.code.rfind("\n", self.checked_to, pos)
+        self.checked_to = pos
+        if newline != -1:
+            self.line_start, self.first = newline + 1, -1
+        if self.first < 0:
+            self.first = _NON_BLANK.search(self.code, self.line_start).start()
+        return self.first == pos
+
+
+# Tie-break order: earlier languages win equal scores
+_LANGUAGES = list(dict.fromkeys(lang for _, _, w, _ in _RULES for lang in w))
+_ORDER = {lang: i for i, lang in enumerate(_LANGUAGES)}
+
+MIN_SCORE = 2.0          # below this the answer is "unknown"
+DECISIVE_MARGIN = 12.0   # lead over the runner-up that ends the scan early
+CHECK_EVERY = 8          # evidence hits between early-exit checks
 
 
 class LanguageService:
@@ -11,34 +181,71 @@ class LanguageService:
         """
         Lightweight heuristics to detect common programming languages.
         """
+        with stage("detect_language"):
+            return LanguageService.detect_with_confidence(code)[0]
 
+    @staticmethod
+    def detect_with_confidence(code: str) -> Tuple[str, float]:
+        """
+        Scores evidence for every language in one pass over the code.
+        Returns (language, confidence) where confidence is the winner's share
+        of all evidence found, between 0 and 1.
+        """
         try:
-            # Python
-            if re.search(r"def\s+|import\s+|print\(", code):
-                return "python"
+            scores: Dict[str, float] = {}
+            hits = 0
+            starts_line = _LineStarts(code)
 
-            # JavaScript
-            if re.search(r"function\s+|console\.log|=>", code):
-                return "javascript"
+            for match in _TOKEN.finditer(code):
+                token = match.group("line")
+                if token is None:
+                    token, pos, at_line_start = match.group(), match.start(), False
+                else:
+                    pos, at_line_start = match.start("line"), True
+                rules = _TRIGGERS.get(token)
+                if rules is None:
+                    continue
 
-            # Java
-            if re.search(r"public\s+class|System\.out\.println", code):
-                return "java"
+                for pattern, weights, line_start in rules:
+                    if line_start and not at_line_start and not starts_line(pos):
+                        continue
+                    if pattern is not None and not pattern.match(code, pos):
+                        continue
+                    for lang, weight in weights.items():
+                        scores[lang] = scores.get(lang, 0.0) + weight
+                    hits += 1
 
-            # C++
-            if re.search(r"#include\s+<|std::", code):
-                return "cpp"
+                if hits >= CHECK_EVERY and LanguageService._is_decisive(scores):
+                    break
 
-            # C
-            if re.search(r"#include\s+<.*\.h>", code):
-                return "c"
+            if not scores:
+                return "unknown", 0.0
 
-            # HTML
-            if "<html>" in code.lower():
-                return "html"
+            best_lang = min(scores, key=lambda lang: (-scores[lang], _ORDER[lang]))
+            best_score = scores[best_lang]
+            if best_score < MIN_SCORE:
+                return "unknown", 0.0
 
-            return "unknown"
+            return best_lang, round(best_score / sum(scores.values()), 3)
 
         except Exception as e:
-            log_error(f"LanguageService Exception: {str(e)}")
-            return "unknown"
+            log_error("LanguageService Exception: %s", e)
+            return "unknown", 0.0
+
+    @staticmethod
+    def detect_batch(codes: List[str]) -> List[Tuple[str, float]]:
+        """
+        Detects many snippets at once; identical snippets are scanned once.
+        """
+        unique = {code: LanguageService.detect_with_confidence(code) for code in dict.fromkeys(codes)}
+        return [unique[code] for code in codes]
+
+    @staticmethod
+    def _is_decisive(scores: Dict[str, float]) -> bool:
+        top = second = 0.0
+        for score in scores.values():
+            if score > top:
+                top, second = score, top
+            elif score > second:
+                second = score
+        return top - second >= DECISIVE_MARGIN and top >= 2 * second
@@ -0,0 +1,70 @@
+# services/llm_backend.py
+
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Dict, List, Tuple
+
+from fastapi import Request
+
+from config import settings
+
+
+class LLMBackend(ABC):
+    """
+    What the routers need from a language model. Every method returns the
+    model's raw text; parsing stays in the routers.
+
+    Implementations: GeminiService (services/gemini_service.py) and
+    LocalLLMBackend (services/local_llm_backend.py), an offline stand-in
+    for load tests and CI. Settings.LLM_BACKEND selects one.
+    """
+
+    @abstractmethod
+    async def explain_code(self, code: str, lang: str) -> str:
+        ...
+
+    @abstractmethod
+    async def explain_code_batch(self, snippets: List[Tuple[str, str]]) -> str:
+        """
+        One JSON array with an explanation per (code, lang) snippet, in order.
+        """
+
+    @abstractmethod
+    def stream_explain_code(self, code: str, lang: str) -> AsyncIterator[str]:
+        ...
+
+    @abstractmethod
+    async def suggest_improvements(self, code: str, lang: str) -> str:
+        ...
+
+    def check_available(self) -> None:
+        """
+        Raises UpstreamUnavailable when calls are currently being refused.
+        """
+
+    async def warm_up(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    def stats(self) -> Dict:
+        return {}
+
+
+def create_llm_backend() -> LLMBackend:
+    """
+    The backend named by Settings.LLM_BACKEND ("gemini" or "local").
+    Imported lazily so the local backend runs without the Gemini SDK.
+    """
+    if settings.LLM_BACKEND == "local":
+        from services.local_llm_backend import LocalLLMBackend
+        return LocalLLMBackend()
+    if settings.LLM_BACKEND == "gemini":
+        from services.gemini_service import GeminiService
+        return GeminiService()
+    raise ValueError(f"Unknown LLM_BACKEND: {settings.LLM_BACKEND}")
+
+
+# Dependency - the application-lifetime instance created in main.lifespan
+def get_llm_backend(request: Request) -> LLMBackend:
+    return request.app.state.llm_backend
@@ -0,0 +1,163 @@
+# services/local_llm_backend.py
+
+import asyncio
+import json
+import math
+import random
+from collections import Counter
+from typing import AsyncIterator, Dict, List, Tuple
+
+from ai.prompts.code_minimizer import estimate_tokens, minimize_for_explain, tidy_whitespace
+from ai.prompts.prompt_builder import (
+    BuiltPrompt,
+    build_explain_prompt,
+    build_batch_explain_prompt,
+    build_improve_prompt,
+)
+from config import settings
+from services.llm_backend import LLMBackend
+from services.resilience import CircuitBreaker, ResilientCaller
+from utils.logger import log_info
+from utils.metrics import LLM_IN_FLIGHT, record_tokens, stage
+
+
+class _InjectedError(Exception):
+    """
+    A fault the stub was configured to produce; retryable like a Gemini 503.
+    """
+    code = 503
+
+
+class LocalLLMBackend(LLMBackend):
+    """
+    Offline stand-in for Gemini (LLM_BACKEND=local) for load tests and CI.
+
+    Answers are derived from the code alone, so they are deterministic and
+    valid for every parser: explanations number the minimized lines just
+    as a real prompt would. Latency follows a log-normal distribution
+    (LOCAL_LLM_LATENCY_MS median, LOCAL_LLM_LATENCY_SIGMA spread) plus
+    output tokens at LOCAL_LLM_TOKENS_PER_SECOND, and LOCAL_LLM_ERROR_RATE
+    of the calls fail. Calls go through the same resilience layer as
+    GeminiService, so injected faults exercise retries and the breaker.
+    """
+
+    def __init__(self):
+        self.structured = settings.GEMINI_STRUCTURED_OUTPUT
+        self._random = random.Random(settings.LOCAL_LLM_SEED)
+        self.resilience = ResilientCaller(
+            CircuitBreaker(settings.CIRCUIT_FAILURE_THRESHOLD, settings.CIRCUIT_OPEN_SECONDS),
+            timeout=settings.GEMINI_TIMEOUT_SECONDS,
+            max_retries=settings.GEMINI_MAX_RETRIES,
+            base_delay=settings.GEMINI_RETRY_BASE_DELAY_MS / 1000,
+            max_delay=settings.GEMINI_RETRY_MAX_DELAY_MS / 1000,
+            hedge=settings.GEMINI_HEDGE,
+            hedge_min_delay=settings.GEMINI_HEDGE_MIN_DELAY_MS / 1000,
+        )
+        self.calls: Counter = Counter()
+        self.injected_errors = 0
+        log_info("Using the local LLM backend; no requests reach Gemini")
+
+    # ---------- Timing and faults ----------
+
+    def _first_token_delay(self) -> float:
+        median = settings.LOCAL_LLM_LATENCY_MS / 1000
+        return median * math.exp(settings.LOCAL_LLM_LATENCY_SIGMA * self._random.gauss(0, 1))
+
+    @staticmethod
+    def _output_delay(text: str) -> float:
+        rate = settings.LOCAL_LLM_TOKENS_PER_SECOND
+        return estimate_tokens(text) / rate if rate > 0 else 0.0
+
+    def _maybe_fail(self) -> None:
+        if self._random.random() < settings.LOCAL_LLM_ERROR_RATE:
+            self.injected_errors += 1
+            raise _InjectedError("Injected upstream failure")
+
+    async def _respond(self, endpoint: str, prompt: BuiltPrompt, text: str) -> str:
+        self.calls[endpoint] += 1
+
+        async def attempt() -> str:
+            await asyncio.sleep(self._first_token_delay() + self._output_delay(text))
+            self._maybe_fail()
+            return text
+
+        with stage("llm"), LLM_IN_FLIGHT.track(endpoint):
+            result = await self.resilience.call(attempt)
+        record_tokens(endpoint, prompt.estimated_tokens, estimate_tokens(text))
+        return result
+
+    # ---------- Payloads ----------
+
+    @staticmethod
+    def _explanation(code: str, lang: str) -> Dict:
+        minimized, _ = minimize_for_explain(code, lang)
+        lines = minimized.split("\n")
+        return {
+            "language": lang,
+            "high_level_explanation": f"This {lang} code has {len(lines)} lines.",
+            "line_by_line_explanation": {
+                str(i): f"Line {i}: {line.strip()[:80]}" for i, line in enumerate(lines, start=1)
+            },
+        }
+
+    def _improvement(self, code: str, lang: str) -> str:
+        optimized = tidy_whitespace(code)
+        improvements = "Whitespace tidied; no other changes suggested."
+        if self.structured:
+            return json.dumps(
+                {"language": lang, "improvements": improvements, "optimized_code": optimized}
+            )
+        metadata = json.dumps({"language": lang, "improvements": improvements})
+        return f"{metadata}\n<optimized_code>\n{optimized}\n</optimized_code>"
+
+    # ---------- LLMBackend ----------
+
+    async def explain_code(self, code: str, lang: str) -> str:
+        # Prompts are built (and discarded) for the same CPU cost as Gemini
+        with stage("prompt"):
+            prompt = build_explain_prompt(code, lang)
+        return await self._respond("explain", prompt, json.dumps(self._explanation(code, lang)))
+
+    async def explain_code_batch(self, snippets: List[Tuple[str, str]]) -> str:
+        with stage("prompt"):
+            prompt = build_batch_explain_prompt(snippets)
+        payload = [self._explanation(code, lang) for code, lang in snippets]
+        return await self._respond("explain_batch", prompt, json.dumps(payload))
+
+    async def stream_explain_code(self, code: str, lang: str) -> AsyncIterator[str]:
+        with stage("prompt"):
+            prompt = build_explain_prompt(code, lang)
+        text = json.dumps(self._explanation(code, lang))
+        self.calls["explain_stream"] += 1
+
+        async def first_token() -> None:
+            await asyncio.sleep(self._first_token_delay())
+            self._maybe_fail()
+
+        with LLM_IN_FLIGHT.track("explain"):
+            with stage("llm"):
+                await self.resilience.call(first_token)
+
+            chunk_size = 256
+            for start in range(0, len(text), chunk_size):
+                chunk = text[start:start + chunk_size]
+                delay = self._output_delay(chunk)
+                if delay:
+                    await asyncio.sleep(delay)
+                yield chunk
+        record_tokens("explain", prompt.estimated_tokens, estimate_tokens(text))
+
+    async def suggest_improvements(self, code: str, lang: str) -> str:
+        with stage("prompt"):
+            prompt = build_improve_prompt(code, lang, self.structured)
+        return await self._respond("improve", prompt, self._improvement(code, lang))
+
+    def check_available(self) -> None:
+        self.resilience.breaker.check()
+
+    def stats(self) -> Dict:
+        return {
+            "calls": dict(self.calls),
+            "injected_errors": self.injected_errors,
+            "resilience": self.resilience.stats(),
+        }
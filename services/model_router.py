@@ -0,0 +1,122 @@
+# services/model_router.py
+
+import threading
+import time
+from collections import Counter, deque
+from typing import Deque, Dict, List, NamedTuple, Optional, Tuple
+
+from config import settings
+from utils.logger import log_info
+
+# Expected output size per endpoint: (tokens per input line, fixed overhead).
+# Explanations grow with the number of lines; improvements repeat the code.
+_OUTPUT_TOKENS_PER_LINE = {
+    "explain": (48, 256),
+    "explain_batch": (48, 256),
+    "improve": (24, 512),
+}
+_MIN_OUTPUT_TOKENS = 256
+
+
+class RouteDecision(NamedTuple):
+    endpoint: str
+    model_name: str
+    max_output_tokens: int
+    stop_sequences: Tuple[str, ...]
+    reason: str            # "default", "small_input" or "slo_fallback"
+    input_tokens: int
+
+
+class ModelRouter:
+    """
+    Chooses the model and generation limits for each Gemini call.
+
+    Small explain inputs go to the fast model. Everything else goes to the
+    primary model, unless its p95 latency over the last
+    ROUTER_LATENCY_WINDOW_SECONDS exceeds GEMINI_LATENCY_SLO_MS, in which
+    case all traffic falls back to the fast model until the slow samples
+    age out of the window.
+    """
+
+    def __init__(self):
+        self.primary = settings.GEMINI_MODEL
+        self.fast = settings.GEMINI_FAST_MODEL or None
+        self._latencies: Dict[str, Deque[Tuple[float, float]]] = {}
+        self._lock = threading.Lock()
+
+        self.decisions: Counter = Counter()
+        # Most recent decisions with their outcome, for tuning
+        self.recent: Deque[Dict] = deque(maxlen=settings.ROUTER_HISTORY_SIZE)
+
+    def route(self, endpoint: str, prompt_text: str, input_tokens: int, structured: bool) -> RouteDecision:
+        model_name, reason = self.primary, "default"
+        if self.fast:
+            if self._p95(self.primary) > settings.GEMINI_LATENCY_SLO_MS / 1000:
+                model_name, reason = self.fast, "slo_fallback"
+            elif endpoint == "explain" and input_tokens <= settings.ROUTER_FAST_MAX_INPUT_TOKENS:
+                model_name, reason = self.fast, "small_input"
+
+        per_line, overhead = _OUTPUT_TOKENS_PER_LINE[endpoint]
+        max_output_tokens = min(
+            settings.ROUTER_MAX_OUTPUT_TOKENS,
+            max(_MIN_OUTPUT_TOKENS, overhead + per_line * (prompt_text.count("\n") + 1)),
+        )
+
+        # The split improve format is complete once the code block closes
+        stop_sequences: Tuple[str, ...] = ()
+        if endpoint == "improve" and not structured:
+            stop_sequences = ("</optimized_code>",)
+
+        decision = RouteDecision(
+            endpoint, model_name, max_output_tokens, stop_sequences, reason, input_tokens
+        )
+        with self._lock:
+            self.decisions[(endpoint, model_name, reason)] += 1
+        return decision
+
+    def record(self, decision: RouteDecision, seconds: float, output_tokens: Optional[int]) -> None:
+        """
+        Feeds the latency window and keeps the decision with its outcome.
+        """
+        now = time.monotonic()
+        entry = {
+            **decision._asdict(),
+            "stop_sequences": list(decision.stop_sequences),
+            "latency_ms": round(seconds * 1000, 1),
+            "output_tokens": output_tokens,
+        }
+        with self._lock:
+            self._latencies.setdefault(decision.model_name, deque()).append((now, seconds))
+            self.recent.append(entry)
+
+        log_info(
+            "Routed %s to %s (%s): ~%d input tokens, max_output_tokens=%d, %s ms, %s output tokens",
+            decision.endpoint, decision.model_name, decision.reason, decision.input_tokens,
+            decision.max_output_tokens, entry["latency_ms"], output_tokens,
+            sampled=True,
+        )
+
+    def _p95(self, model_name: str) -> float:
+        cutoff = time.monotonic() - settings.ROUTER_LATENCY_WINDOW_SECONDS
+        with self._lock:
+            samples = self._latencies.get(model_name)
+            if not samples:
+                return 0.0
+            while samples and samples[0][0] < cutoff:
+                samples.popleft()
+            if len(samples) < settings.ROUTER_MIN_SAMPLES:
+                return 0.0
+            latencies: List[float] = sorted(s for _, s in samples)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+
+    def stats(self) -> Dict:
+        return {
+            "p95_ms": {
+                model: round(self._p95(model) * 1000, 1)
+                for model in filter(None, (self.primary, self.fast))
+            },
+            "decisions": {
+                f"{endpoint}:{model}:{reason}": count
+                for (endpoint, model, reason), count in self.decisions.items()
+            },
+        }
@@ -0,0 +1,277 @@
+# services/resilience.py
+
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+from utils.logger import log_info, log_error
+from utils.metrics import record_error
+
+T = TypeVar("T")
+
+# HTTP status codes (google.api_core exceptions carry them as `.code`)
+# worth trying again
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class UpstreamUnavailable(Exception):
+    """
+    Gemini is unhealthy: the circuit is open or retries ran out.
+    Served as 503 with a Retry-After header (see main.py).
+    """
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    return getattr(exc, "code", None) in RETRYABLE_STATUS
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive upstream failures and fails
+    fast for `open_seconds`. Then a single probe call is let through
+    (half-open): success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int, open_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+        self.opened = 0
+        self.rejected = 0
+
+    def check(self) -> None:
+        """
+        Raises UpstreamUnavailable while calls would be rejected, without
+        taking the half-open probe slot.
+        """
+        with self._lock:
+            if self.state == "closed":
+                return
+            remaining = self._opened_at + self.open_seconds - time.monotonic()
+            if remaining <= 0 and not self._probing:
+                return
+        raise UpstreamUnavailable("Gemini is temporarily unavailable", max(1.0, remaining))
+
+    def before_call(self) -> None:
+        """
+        Raises UpstreamUnavailable while the circuit is open.
+        """
+        with self._lock:
+            if self.state == "closed":
+                return
+            remaining = self._opened_at + self.open_seconds - time.monotonic()
+            if remaining <= 0 and not self._probing:
+                self.state = "half_open"
+                self._probing = True
+                return
+            self.rejected += 1
+        record_error("circuit_open")
+        raise UpstreamUnavailable("Gemini is temporarily unavailable", max(1.0, remaining))
+
+    def on_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            self.state = "closed"
+
+    def on_abandoned(self) -> None:
+        """
+        A call was cancelled before it finished; a probe slot is freed.
+        """
+        with self._lock:
+            if self.state == "half_open":
+                self.state = "open"
+                self._probing = False
+
+    def on_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.opened += 1
+                    log_error("Circuit opened after %d consecutive Gemini failures", self._failures)
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self._failures,
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
+
+
+class ResilientCaller:
+    """
+    Wraps one upstream call with a per-attempt timeout, bounded retries
+    with full-jitter exponential backoff for retryable errors, optional
+    hedging and a circuit breaker.
+
+    Hedging: if an attempt has not finished after the recent p95 latency
+    (at least `hedge_min_delay`), a second identical request is fired and
+    whichever succeeds first wins; the other is cancelled.
+    """
+
+    def __init__(
+        self,
+        breaker: CircuitBreaker,
+        timeout: float,
+        max_retries: int,
+        base_delay: float,
+        max_delay: float,
+        hedge: bool = False,
+        hedge_min_delay: float = 0.5,
+        latency_window: int = 200,
+    ):
+        self.breaker = breaker
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self._latencies: Deque[float] = deque(maxlen=latency_window)
+
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    async def call(
+        self,
+        fn: Callable[[], Awaitable[T]],
+        slots: Optional[asyncio.Semaphore] = None,
+        hold_slot: bool = False,
+    ) -> T:
+        """
+        Runs `fn` (a factory, so every attempt gets a fresh awaitable).
+
+        With `slots`, every attempt first waits for a local concurrency
+        slot. The wait is not part of the attempt's timeout, so a busy
+        worker is never mistaken for a failing upstream, and the slot is
+        given back before a backoff sleep. `hold_slot` keeps the slot of
+        the successful attempt for the caller to release (e.g. after
+        consuming a stream); such calls are not hedged.
+        """
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            try:
+                result = await self._attempt(fn, slots, hold_slot)
+            except asyncio.CancelledError:
+                self.breaker.on_abandoned()
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    # The upstream answered; the request itself was bad
+                    self.breaker.on_success()
+                    raise
+                self.breaker.on_failure()
+                if attempt >= self.max_retries:
+                    log_error("Gemini call failed after %d attempts: %s", attempt + 1, e)
+                    record_error("upstream_unavailable")
+                    raise UpstreamUnavailable(
+                        "Gemini is temporarily unavailable", self.base_delay * 2 ** attempt
+                    ) from e
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                attempt += 1
+                self.retries += 1
+                log_info("Retrying Gemini call in %.2fs (attempt %d): %s", delay, attempt + 1, e)
+                await asyncio.sleep(delay)
+                continue
+
+            self.breaker.on_success()
+            return result
+
+    async def _attempt(
+        self, fn: Callable[[], Awaitable[T]], slots: Optional[asyncio.Semaphore], hold_slot: bool
+    ) -> T:
+        hedge_delay = None if hold_slot else self._hedge_delay()
+        if hedge_delay is not None:
+            return await self._hedged(fn, hedge_delay, slots)
+        if slots is None:
+            return await self._timed(fn)
+
+        await slots.acquire()
+        try:
+            result = await self._timed(fn)
+        except BaseException:
+            slots.release()
+            raise
+        if not hold_slot:
+            slots.release()
+        return result
+
+    async def _timed(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        One upstream request under the timeout; only its own latency feeds
+        the hedge delay.
+        """
+        start = time.perf_counter()
+        result = await asyncio.wait_for(fn(), self.timeout)
+        self._latencies.append(time.perf_counter() - start)
+        return result
+
+    async def _slotted(self, fn: Callable[[], Awaitable[T]], slots: Optional[asyncio.Semaphore]) -> T:
+        if slots is None:
+            return await self._timed(fn)
+        async with slots:
+            return await self._timed(fn)
+
+    def _hedge_delay(self) -> Optional[float]:
+        if not self.hedge or len(self._latencies) < 20:
+            return None
+        ordered = sorted(self._latencies)
+        return max(self.hedge_min_delay, ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))])
+
+    async def _hedged(
+        self, fn: Callable[[], Awaitable[T]], delay: float, slots: Optional[asyncio.Semaphore]
+    ) -> T:
+        first = asyncio.ensure_future(self._slotted(fn, slots))
+        tasks = [first]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                self.hedges += 1
+                tasks.append(asyncio.ensure_future(self._slotted(fn, slots)))
+
+            error: Optional[BaseException] = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict:
+        return {
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "circuit": self.breaker.stats(),
+        }
@@ -0,0 +1,129 @@
+# services/stream_parser.py
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+# Top-level string fields reported as soon as their value is complete
+TOP_LEVEL_FIELDS = ("language", "high_level_explanation")
+LINE_FIELD = "line_by_line_explanation"
+
+
+class _Frame:
+    __slots__ = ("is_object", "key", "expect_key")
+
+    def __init__(self, is_object: bool):
+        self.is_object = is_object
+        self.key: Optional[str] = None
+        self.expect_key = is_object
+
+
+class ExplanationStreamParser:
+    """
+    Incremental parser for the explain JSON object as it arrives token by token.
+
+    feed() scans each chunk once and returns the events completed by it:
+      ("language", str)
+      ("high_level_explanation", str)
+      ("line", (line_number, explanation))
+    Text before the first "{" (prose, markdown fences) is skipped.
+    """
+
+    def __init__(self):
+        self._stack: List[_Frame] = []
+        self._started = False
+        self.complete = False
+
+        self._in_string = False
+        self._escape = False
+        self._string_chars: List[str] = []
+
+        self.language: Optional[str] = None
+        self.high_level_explanation: Optional[str] = None
+        self.line_by_line_explanation: Dict[str, str] = {}
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        events: List[Tuple[str, Any]] = []
+        if self.complete:
+            return events
+
+        for ch in text:
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                    self._string_chars.append(ch)
+                elif ch == "\\":
+                    self._escape = True
+                    self._string_chars.append(ch)
+                elif ch == '"':
+                    self._in_string = False
+                    self._on_string(self._decode_string(), events)
+                else:
+                    self._string_chars.append(ch)
+                continue
+
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._stack.append(_Frame(is_object=True))
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_chars = []
+            elif ch == "{" or ch == "[":
+                self._stack.append(_Frame(is_object=ch == "{"))
+            elif ch == "}" or ch == "]":
+                self._stack.pop()
+                self._after_value()
+                if not self._stack:
+                    self.complete = True
+                    break
+            elif ch == ",":
+                top = self._stack[-1]
+                if top.is_object:
+                    top.expect_key = True
+                    top.key = None
+
+        return events
+
+    def result(self) -> Optional[Dict[str, Any]]:
+        """
+        The parsed explanation, or None if the JSON object never closed.
+        """
+        if not self.complete:
+            return None
+        return {
+            "language": self.language,
+            "high_level_explanation": self.high_level_explanation or "",
+            "line_by_line_explanation": self.line_by_line_explanation,
+        }
+
+    # ---------- Internals ----------
+
+    def _decode_string(self) -> str:
+        raw = "".join(self._string_chars)
+        try:
+            return json.loads(f'"{raw}"')
+        except json.JSONDecodeError:
+            return raw
+
+    def _after_value(self) -> None:
+        if self._stack:
+            top = self._stack[-1]
+            if top.is_object:
+                top.expect_key = False
+
+    def _on_string(self, value: str, events: List[Tuple[str, Any]]) -> None:
+        top = self._stack[-1]
+        if top.is_object and top.expect_key:
+            top.key = value
+            top.expect_key = False
+            return
+
+        depth = len(self._stack)
+        if depth == 1 and top.key in TOP_LEVEL_FIELDS:
+            setattr(self, top.key, value)
+            events.append((top.key, value))
+        elif depth == 2 and top.is_object and self._stack[0].key == LINE_FIELD:
+            self.line_by_line_explanation[top.key] = value
+            events.append(("line", (top.key, value)))
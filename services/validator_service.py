@@ -1,36 +1,120 @@
 # services/validator_service.py
 
 import re
+from typing import Dict, NamedTuple, Optional
+
+from fastapi import HTTPException, status
+
+from config import settings
 from utils.logger import log_error
+from utils.metrics import record_error, stage
+
+# Rule name -> pattern; overridable with the VALIDATOR_RULES setting.
+# Rules are matched against the lower-cased code, so write them in lower case.
+DEFAULT_RULES: Dict[str, str] = {
+    "rm_rf": r"rm\s+-rf",
+    "shutdown": r"shutdown\s+-h",
+    "del_force": r"del\s+/f",
+    "drop_database": r"drop\s+database",
+    "fork_bomb": r":\s*\(\s*\)\s*\{\s*:\s*\|\s*:\s*&\s*\}\s*;\s*:",
+}
+
+
+class _RuleSet:
+    """
+    All rules joined into one case-sensitive alternation. Without groups or
+    IGNORECASE the regex engine can skip ahead to positions where some rule's
+    first character occurs, so one pass over the lower-cased text is far
+    cheaper than a case-insensitive search per rule.
+    """
+
+    def __init__(self, rules: Dict[str, str]):
+        self._combined = re.compile("|".join(f"(?:{p})" for p in rules.values()))
+        self._rules = [(name, re.compile(p)) for name, p in rules.items()]
+
+    def first_match(self, code: str) -> Optional[str]:
+        text = code.lower()
+        match = self._combined.search(text)
+        if not match:
+            return None
+        # Name the rule that fired by re-trying each one at the match position
+        for name, rule in self._rules:
+            if rule.match(text, match.start()):
+                return name
+        return "unknown_rule"
+
+
+_RULES = _RuleSet(settings.VALIDATOR_RULES or DEFAULT_RULES)
+
+
+class ValidationResult(NamedTuple):
+    valid: bool
+    status_code: int = status.HTTP_200_OK
+    reason: str = ""
+    rule: Optional[str] = None
 
 
 class ValidatorService:
 
     @staticmethod
-    def is_valid_code(code: str) -> bool:
+    def validate(code: str) -> ValidationResult:
         """
-        Checks if code is non-empty and not harmful.
+        Size admission first (cheapest checks first), then one pass of the
+        compiled safety rules. Reports which rule fired.
         """
         try:
             if not code or code.strip() == "":
-                return False
+                return ValidationResult(False, status.HTTP_400_BAD_REQUEST, "Invalid or empty code")
+
+            # len() is a lower bound on the UTF-8 size, so encode only when needed
+            max_bytes = settings.MAX_CODE_BYTES
+            if len(code) > max_bytes or (
+                len(code) * 4 > max_bytes and len(code.encode("utf-8")) > max_bytes
+            ):
+                return ValidationResult(
+                    False,
+                    status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    f"Code exceeds {max_bytes} bytes",
+                )
 
-            # Check for harmful patterns (basic)
-            dangerous_patterns = [
-                r"rm\s+-rf", 
-                r"shutdown\s+-h",
-                r"del\s+/f",
-                r"DROP\s+DATABASE",
-                r":(){:|:&};:"  # fork bomb
-            ]
+            if code.count("\n") + 1 > settings.MAX_CODE_LINES:
+                return ValidationResult(
+                    False,
+                    status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    f"Code exceeds {settings.MAX_CODE_LINES} lines",
+                )
 
-            for pattern in dangerous_patterns:
-                if re.search(pattern, code, re.IGNORECASE):
-                    log_error(f"Dangerous code detected: {pattern}")
-                    return False
+            rule = _RULES.first_match(code)
+            if rule:
+                log_error("Dangerous code detected: %s", rule)
+                return ValidationResult(
+                    False,
+                    status.HTTP_400_BAD_REQUEST,
+                    f"Code rejected by safety rule: {rule}",
+                    rule,
+                )
 
-            return True
+            return ValidationResult(True)
 
         except Exception as e:
-            log_error(f"ValidatorService Exception: {str(e)}")
-            return False
+            log_error("ValidatorService Exception: %s", e)
+            return ValidationResult(False, status.HTTP_400_BAD_REQUEST, "Invalid or empty code")
+
+    @staticmethod
+    def is_valid_code(code: str) -> bool:
+        """
+        Checks if code is non-empty, within size limits and not harmful.
+        """
+        return ValidatorService.validate(code).valid
+
+    @staticmethod
+    def check(code: str) -> None:
+        """
+        Raises HTTPException (400 or 413) when the code is not acceptable.
+        """
+        with stage("validate"):
+            result = ValidatorService.validate(code)
+        if not result.valid:
+            too_large = result.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            record_error("code_too_large" if too_large else "invalid_code")
+            raise HTTPException(status_code=result.status_code, detail=result.reason)
@@ -0,0 +1,8 @@
+import os
+import sys
+from pathlib import Path
+
+# Settings() requires an API key at import time; tests never reach Gemini
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,65 @@
+import pytest
+
+pytest.importorskip("jwt")
+pytest.importorskip("passlib")
+pytest.importorskip("pydantic_settings")
+
+from fastapi import HTTPException  # noqa: E402
+
+from auth import jwt_handler, user_store  # noqa: E402
+from auth.token_cache import VerifiedTokenCache  # noqa: E402
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(user_store, "DB_PATH", tmp_path / "users.db")
+    monkeypatch.setattr(user_store, "LEGACY_JSON_PATH", tmp_path / "users.json")
+
+
+def _verify_on(cache: VerifiedTokenCache, token: str, monkeypatch):
+    monkeypatch.setattr(jwt_handler, "token_cache", cache)
+    return jwt_handler.verify_access_token(token)
+
+
+def test_logout_on_one_worker_revokes_the_token_on_the_others(store, monkeypatch):
+    token = jwt_handler.create_access_token("alice")
+    worker_a, worker_b = VerifiedTokenCache(max_entries=10), VerifiedTokenCache(max_entries=10)
+
+    # Both workers have verified and cached the token
+    assert _verify_on(worker_a, token, monkeypatch)["sub"] == "alice"
+    payload = _verify_on(worker_b, token, monkeypatch)
+    assert worker_a.get(jwt_handler.token_digest(token)) is not None
+
+    jwt_handler.revoke_access_token(token, payload["exp"])  # logout handled by worker b
+
+    with pytest.raises(HTTPException) as rejected:
+        _verify_on(worker_a, token, monkeypatch)
+    assert rejected.value.status_code == 401
+    assert worker_a.revocation_id == 1
+
+    # A restarted worker starts with an empty cache
+    with pytest.raises(HTTPException):
+        _verify_on(VerifiedTokenCache(max_entries=10), token, monkeypatch)
+
+
+def test_other_tokens_stay_cached_after_a_revocation(store, monkeypatch):
+    kept, revoked = jwt_handler.create_access_token("alice"), jwt_handler.create_access_token("bob")
+    worker = VerifiedTokenCache(max_entries=10)
+    _verify_on(worker, kept, monkeypatch)
+    payload = _verify_on(worker, revoked, monkeypatch)
+
+    user_store.revoke_token(jwt_handler.token_digest(revoked), payload["exp"])
+
+    assert _verify_on(worker, kept, monkeypatch)["sub"] == "alice"
+    assert worker.stats()["hits"] == 1
+    with pytest.raises(HTTPException):
+        _verify_on(worker, revoked, monkeypatch)
+
+
+def test_expired_revocations_are_dropped(store):
+    user_store.revoke_token("old", expires_at=1)
+    user_store.revoke_token("new", expires_at=2 ** 40)
+
+    assert not user_store.is_token_revoked("old")
+    assert user_store.is_token_revoked("new")
+    assert user_store.revocations_since(0) == (2, {"new": 2 ** 40})
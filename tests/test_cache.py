@@ -0,0 +1,89 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("pydantic_settings")
+
+from services.cache_service import ResponseCache, is_cache_bypassed  # noqa: E402
+
+
+def _cache(**kwargs) -> ResponseCache:
+    options = dict(max_entries=3, max_bytes=1024, ttl_seconds=60)
+    options.update(kwargs)
+    return ResponseCache(**options)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = _cache()
+
+    async def run():
+        for key in ("a", "b", "c"):
+            await cache.set(key, key)
+        await cache.get("a")  # "b" is now the least recently used
+        await cache.set("d", "d")
+        return [await cache.get(key) for key in ("a", "b", "c", "d")]
+
+    assert asyncio.run(run()) == ["a", None, "c", "d"]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_expired_entries_are_misses(monkeypatch):
+    cache = _cache()
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now)
+    asyncio.run(cache.set("a", "value"))
+
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert asyncio.run(cache.get("a")) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_byte_budget_evicts_oldest_and_skips_oversized_values():
+    cache = _cache(max_entries=100, max_bytes=10)
+
+    async def run():
+        await cache.set("a", "12345")
+        await cache.set("b", "12345")
+        await cache.set("c", "12345")
+        await cache.set("huge", "x" * 11)
+        return [await cache.get(key) for key in ("a", "b", "c", "huge")]
+
+    assert asyncio.run(run()) == [None, "12345", "12345", None]
+    assert cache.stats()["bytes"] == 10
+
+
+def test_disk_tier_survives_restart_and_stays_bounded(tmp_path):
+    cache = _cache(cache_dir=str(tmp_path), disk_max_entries=2)
+
+    async def fill():
+        for key in ("a", "b", "c"):
+            await cache.set(key, key * 10)
+
+    asyncio.run(fill())
+    assert sorted(path.stem for path in tmp_path.glob("*.json")) == ["b", "c"]
+    assert cache.stats()["disk_evictions"] == 1
+
+    restarted = _cache(cache_dir=str(tmp_path), disk_max_entries=2)
+    assert asyncio.run(restarted.get("c")) == "c" * 10
+    assert asyncio.run(restarted.get("a")) is None
+    assert restarted.stats()["disk_hits"] == 1
+
+
+def test_disk_tier_byte_budget(tmp_path):
+    cache = _cache(cache_dir=str(tmp_path), disk_max_bytes=100)
+
+    async def fill():
+        for key in ("a", "b", "c"):
+            await cache.set(key, key * 40)
+
+    asyncio.run(fill())
+    assert cache.stats()["disk_bytes"] <= 100
+    assert not (tmp_path / "a.json").exists()
+
+
+def test_no_cache_directive_bypasses_lookup():
+    assert is_cache_bypassed("no-cache")
+    assert is_cache_bypassed("max-age=0, No-Cache")
+    assert not is_cache_bypassed("max-age=60")
+    assert not is_cache_bypassed(None)
@@ -0,0 +1,77 @@
+from services.chunking_service import ChunkingService
+
+PYTHON = """import os
+
+
+# Reads the config
+@cache
+def load():
+    return os.environ
+
+
+class Store:
+    def get(self):
+        return 1
+
+    def put(self):
+        return 2
+"""
+
+JAVASCRIPT = """function a() {
+  if (x) { return "}"; }
+}
+
+function b() {
+  return 2; // }
+}
+const c = 3;
+"""
+
+
+def _spans(chunks):
+    return [(first, first + chunk.count("\n")) for first, chunk in chunks]
+
+
+def test_python_chunks_keep_whole_units_with_their_comments_and_decorators():
+    chunks = ChunkingService.split(PYTHON, "python", max_lines=8)
+
+    assert _spans(chunks) == [(1, 3), (4, 9), (10, 16)]
+    assert chunks[1][1].startswith("# Reads the config\n@cache\ndef load():")
+    assert chunks[2][1].startswith("class Store:")
+
+
+def test_oversized_units_are_cut_at_line_boundaries():
+    chunks = ChunkingService.split(PYTHON, "python", max_lines=3)
+
+    assert _spans(chunks) == [(1, 3), (4, 6), (7, 9), (10, 12), (13, 15)]
+    assert "".join(chunk + "\n" for _, chunk in chunks).strip() == PYTHON.strip()
+
+
+def test_brace_heuristic_ignores_braces_in_strings_and_comments():
+    chunks = ChunkingService.split(JAVASCRIPT, "javascript", max_lines=4)
+
+    assert _spans(chunks) == [(1, 3), (4, 7), (8, 9)]
+    assert chunks[1][1].strip().startswith("function b()")
+
+
+def test_invalid_python_falls_back_to_the_heuristic():
+    code = "def broken(:\n    pass\nx = 1\n"
+
+    assert _spans(ChunkingService.split(code, "python", max_lines=2)) == [(1, 2), (3, 4)]
+
+
+def test_merged_line_numbers_refer_to_the_file():
+    chunks = ChunkingService.split(PYTHON, "python", max_lines=8)
+    assert [first for first, _ in chunks] == [1, 4, 10]
+    explained = [{"1": "first", "2": "second", "summary": "kept"} for _ in chunks]
+
+    lines = {}
+    for (first, _), result in zip(chunks, explained):
+        lines.update(ChunkingService.rebase(result, first))
+
+    assert lines == {
+        "1": "first", "2": "second",
+        "4": "first", "5": "second",
+        "10": "first", "11": "second",
+        "summary": "kept",
+    }
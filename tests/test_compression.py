@@ -0,0 +1,84 @@
+import asyncio
+import gzip
+import threading
+
+import pytest
+
+pytest.importorskip("starlette")
+
+from utils import compression  # noqa: E402
+from utils.compression import CompressionMiddleware, negotiate_encoding  # noqa: E402
+
+
+def _app(body: bytes, content_type: bytes = b"application/json", more_body: bool = False):
+    async def app(scope, receive, send):
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body, "more_body": more_body})
+        if more_body:
+            await send({"type": "http.response.body", "body": b""})
+    return app
+
+
+def _call(app, accept_encoding: str, middleware=CompressionMiddleware, **options):
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    asyncio.run(middleware(app, minimum_size=100, **options)(scope, None, send))
+    headers = dict(messages[0]["headers"])
+    return headers, b"".join(message.get("body", b"") for message in messages[1:])
+
+
+def test_negotiation_honours_weights(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+
+    assert negotiate_encoding("gzip, deflate, br") == "gzip"
+    assert negotiate_encoding("gzip;q=0, identity") is None
+    assert negotiate_encoding("*") == "gzip"
+    assert negotiate_encoding("") is None
+
+
+def test_large_bodies_are_compressed(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    body = b'{"line": "explanation"}' * 100
+
+    headers, sent = _call(_app(body), "gzip")
+
+    assert headers[b"content-encoding"] == b"gzip"
+    assert headers[b"content-length"] == str(len(sent)).encode()
+    assert headers[b"vary"] == b"Accept-Encoding"
+    assert gzip.decompress(sent) == body
+
+
+def test_small_and_streamed_bodies_pass_through():
+    body = b"x" * 1000
+
+    headers, sent = _call(_app(b"{}"), "gzip")
+    assert b"content-encoding" not in headers and sent == b"{}"
+
+    headers, sent = _call(_app(body, b"text/event-stream", more_body=True), "gzip")
+    assert b"content-encoding" not in headers and sent == body
+
+
+def test_large_bodies_are_compressed_off_the_event_loop(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    threads = []
+
+    class Recording(CompressionMiddleware):
+        def compress(self, body, encoding):
+            threads.append(threading.current_thread())
+            return super().compress(body, encoding)
+
+    for size in (500, 5000):
+        headers, sent = _call(_app(b"x" * size), "gzip", Recording, thread_size=1000)
+        assert gzip.decompress(sent) == b"x" * size
+
+    small, large = threads
+    assert small is threading.main_thread()
+    assert large is not threading.main_thread()
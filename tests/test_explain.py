@@ -0,0 +1,128 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("google.generativeai")
+pytest.importorskip("pydantic_settings")
+
+from config import settings  # noqa: E402
+from google.generativeai import protos  # noqa: E402
+from services.gemini_service import GeminiService  # noqa: E402
+
+
+LLM_LATENCY = 0.2
+
+
+class _FakeCandidate:
+    def __init__(self, finish_reason):
+        self.finish_reason = finish_reason
+
+
+class _FakeResponse:
+    def __init__(self, text: str, finish_reason=None):
+        self.text = text
+        self.candidates = [_FakeCandidate(finish_reason)]
+
+
+class _SlowModel:
+    """
+    Stands in for GenerativeModel: every generation takes LLM_LATENCY seconds.
+    """
+
+    def __init__(self):
+        self.in_flight = 0
+        self.peak = 0
+
+    async def generate_content_async(self, prompt, **kwargs):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(LLM_LATENCY)
+        finally:
+            self.in_flight -= 1
+        return _FakeResponse('{"language": "python"}')
+
+
+def _service(max_concurrency: int) -> GeminiService:
+    service = GeminiService()
+    service.model = _SlowModel()
+    service.models = {name: service.model for name in service.models}
+    service.router.fast = None
+    service._slots = asyncio.Semaphore(max_concurrency)
+    return service
+
+
+def test_concurrent_explains_take_one_llm_latency():
+    async def run():
+        service = _service(max_concurrency=10)
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(service.explain_code(code=f"x = {i}", lang="python") for i in range(10))
+        )
+        return time.perf_counter() - start
+
+    elapsed = asyncio.run(run())
+    assert elapsed < LLM_LATENCY * 2
+
+
+def test_event_loop_stays_responsive_during_generation():
+    async def run():
+        service = _service(max_concurrency=4)
+        task = asyncio.create_task(service.explain_code(code="x = 1", lang="python"))
+        start = time.perf_counter()
+        await asyncio.sleep(0)
+        lag = time.perf_counter() - start
+        await task
+        return lag
+
+    assert asyncio.run(run()) < LLM_LATENCY / 4
+
+
+def test_concurrency_is_capped():
+    async def run():
+        service = _service(max_concurrency=3)
+        await asyncio.gather(
+            *(service.suggest_improvements(code=f"y = {i}", lang="python") for i in range(9))
+        )
+        return service.model.peak
+
+    assert asyncio.run(run()) == 3
+
+
+class _TruncatingModel:
+    """
+    Answers with the given finish reasons in turn, recording each output limit.
+    """
+
+    def __init__(self, *finish_reasons):
+        self.finish_reasons = list(finish_reasons)
+        self.limits = []
+
+    async def generate_content_async(self, prompt, generation_config=None, **kwargs):
+        self.limits.append(generation_config.max_output_tokens)
+        return _FakeResponse("<optimized_code>x = 1", self.finish_reasons.pop(0))
+
+
+def _improve_with(model):
+    service = _service(max_concurrency=1)
+    service.model = model
+    service.models = {name: model for name in service.models}
+    return asyncio.run(service.suggest_improvements(code="x = 1", lang="python"))
+
+
+def test_truncated_output_is_retried_at_the_output_ceiling():
+    reason = protos.Candidate.FinishReason
+    model = _TruncatingModel(reason.MAX_TOKENS, reason.STOP)
+
+    assert _improve_with(model) == "<optimized_code>x = 1</optimized_code>"
+    assert model.limits[0] < model.limits[1] == settings.ROUTER_MAX_OUTPUT_TOKENS
+
+
+def test_output_truncated_at_the_ceiling_is_an_error():
+    reason = protos.Candidate.FinishReason
+    model = _TruncatingModel(reason.MAX_TOKENS, reason.MAX_TOKENS)
+
+    with pytest.raises(RuntimeError):
+        _improve_with(model)
+    assert len(model.limits) == 2
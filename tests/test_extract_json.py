@@ -0,0 +1,124 @@
+import json
+import random
+import time
+
+import pytest
+
+from services.extract_json import (
+    extract_json,
+    extract_json_array,
+    parse_split_response,
+    parse_stats,
+    validate_direct,
+)
+
+# Characters that have broken regex-based extraction before
+_TRICKY = ['{', '}', '[', ']', '"', '\\', '\n', '```', '<optimized_code>', ' ', 'x', 'é']
+
+
+def _random_string(rng: random.Random) -> str:
+    return "".join(rng.choice(_TRICKY) for _ in range(rng.randint(0, 12)))
+
+
+def _random_value(rng: random.Random, depth: int):
+    kind = rng.randint(0, 5 if depth < 4 else 2)
+    if kind == 0:
+        return _random_string(rng)
+    if kind == 1:
+        return rng.randint(-1000, 1000)
+    if kind == 2:
+        return rng.choice([True, False, None])
+    if kind in (3, 4):
+        return {_random_string(rng): _random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))}
+    return [_random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+
+
+def _wrap(rng: random.Random, payload: str) -> str:
+    prefix = rng.choice(["", "Here is the JSON:\n", "```json\n", "Sure! ] stray closer\n"])
+    suffix = rng.choice(["", "\n```", "\nHope this helps }", "\n<optimized_code>\nint main() { }\n</optimized_code>"])
+    return prefix + payload + suffix
+
+
+def test_fuzz_nested_objects_round_trip():
+    rng = random.Random(1234)
+    for _ in range(500):
+        obj = {_random_string(rng): _random_value(rng, 0) for _ in range(rng.randint(1, 5))}
+        text = _wrap(rng, json.dumps(obj, ensure_ascii=rng.random() < 0.5))
+        assert extract_json(text) == obj
+
+
+def test_fuzz_arrays_round_trip():
+    rng = random.Random(99)
+    for _ in range(200):
+        items = [{"language": _random_string(rng), "n": _random_value(rng, 2)} for _ in range(rng.randint(1, 5))]
+        assert extract_json_array(_wrap(rng, json.dumps(items))) == items
+
+
+def test_nested_object_is_not_cut_at_first_closing_brace():
+    text = '{"language": "python", "improvements": {"loops": "use enumerate"}}'
+    assert extract_json(text)["improvements"] == {"loops": "use enumerate"}
+
+
+def test_split_response_ignores_braces_in_optimized_code():
+    text = (
+        '```json\n{"language": "c", "improvements": "Use const."}\n```\n'
+        '<optimized_code>\nint main() { printf("}{\\""); return 0; }\n</optimized_code>'
+    )
+    parsed = parse_split_response(text)
+    assert parsed["language"] == "c"
+    assert parsed["improvements"] == "Use const."
+    assert parsed["optimized_code"] == 'int main() { printf("}{\\""); return 0; }'
+
+
+def test_invalid_output_returns_none():
+    assert extract_json("no json here") is None
+    assert extract_json('{"unterminated": "value}') is None
+
+
+def _best_time(fn, text: str) -> float:
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def test_100kb_output_parses_quickly_and_linearly():
+    lines = {str(i): f"Line {i} does {{something}} with \"quotes\" and [brackets]." for i in range(1500)}
+    payload = json.dumps({"language": "python", "high_level_explanation": "x", "line_by_line_explanation": lines})
+    assert len(payload) > 100_000
+
+    text = "Preamble\n```json\n" + payload + "\n```"
+    assert extract_json(text)["line_by_line_explanation"] == lines
+
+    small = _best_time(extract_json, text)
+    large = _best_time(extract_json, "Preamble\n" + payload * 4)
+    assert small < 0.1
+    assert large < small * 8  # ~4x input, allowing for noise
+
+
+def test_no_backtracking_on_unclosed_input():
+    text = "{" + "a" * 100_000
+    start = time.perf_counter()
+    assert extract_json(text) is None
+    assert time.perf_counter() - start < 0.1
+
+
+
+def test_split_response_reads_code_from_structured_json():
+    text = '{"language": "c", "improvements": "Use const.", "optimized_code": "int x = 1;\\n"}'
+    assert parse_split_response(text)["optimized_code"] == "int x = 1;"
+
+
+def test_validate_direct_counts_fallbacks():
+    pydantic = pytest.importorskip("pydantic")
+
+    class Item(pydantic.BaseModel):
+        language: str
+
+    before = dict(parse_stats)
+    assert validate_direct('{"language": "go"}', Item, "test").language == "go"
+    assert validate_direct('Sure! {"language": "go"}', Item, "test") is None
+    assert parse_stats["test_direct"] == before.get("test_direct", 0) + 1
+    assert parse_stats["test_fallback"] == before.get("test_fallback", 0) + 1
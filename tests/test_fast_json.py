@@ -0,0 +1,92 @@
+import asyncio
+import json
+from contextlib import contextmanager
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from fastapi import APIRouter, FastAPI, Response  # noqa: E402
+
+from models.responses import CodeExplanationResponse  # noqa: E402
+from utils import fast_json, timed_route  # noqa: E402
+from utils.fast_json import model_response  # noqa: E402
+from utils.timed_route import TimedRoute  # noqa: E402
+
+RESULT = CodeExplanationResponse(
+    language="python",
+    high_level_explanation="Prints “hi”.",
+    line_by_line_explanation={"1": "Calls print."},
+)
+
+
+def test_model_response_matches_the_model_and_keeps_headers():
+    result = RESULT
+    sub_response = Response()
+    sub_response.headers["X-Explanation-Id"] = "abc"
+
+    response = model_response(result, sub_response)
+
+    assert json.loads(response.body) == result.model_dump()
+    assert response.headers["x-explanation-id"] == "abc"
+    assert response.headers["content-type"] == "application/json"
+    assert response.headers["content-length"] == str(len(response.body))
+
+
+def _get(app, path: str) -> int:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"test")],
+        "client": ("127.0.0.1", 0),
+        "server": ("test", 80),
+    }
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    asyncio.run(app(scope, receive, send))
+    return status
+
+
+def test_serialize_stage_is_recorded_once_per_response(monkeypatch):
+    recorded = []
+
+    @contextmanager
+    def stage(name):
+        yield
+        recorded.append(name)
+
+    monkeypatch.setattr(timed_route, "record_stage", lambda name, start, end: recorded.append(name))
+    monkeypatch.setattr(fast_json, "stage", stage)
+
+    router = APIRouter(route_class=TimedRoute)
+
+    @router.get("/default", response_model=CodeExplanationResponse)
+    async def default():
+        return RESULT
+
+    @router.get("/fast", response_model=CodeExplanationResponse)
+    async def fast():
+        return model_response(RESULT)
+
+    app = FastAPI()
+    app.include_router(router)
+
+    for path in ("/default", "/fast"):
+        recorded.clear()
+        assert _get(app, path) == 200
+        assert recorded == ["serialize"], path
@@ -0,0 +1,69 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("pydantic_settings")
+
+from routes import explain_router  # noqa: E402
+from services.cache_service import ResponseCache  # noqa: E402
+
+OLD = "\n".join(f"x{i} = {i}" for i in range(1, 41))
+NEW = OLD.replace("x20 = 20", "x20 = 200")
+
+
+class _Backend:
+    def __init__(self):
+        self.calls = 0
+
+    async def explain_code(self, code: str, lang: str) -> str:
+        self.calls += 1
+        lines = code.split("\n")
+        return json.dumps({
+            "language": lang,
+            "high_level_explanation": f"New summary of {len(lines)} lines.",
+            "line_by_line_explanation": {str(i): f"new: {line}" for i, line in enumerate(lines, 1)},
+        })
+
+
+@pytest.fixture
+def store(monkeypatch):
+    monkeypatch.setattr(explain_router, "response_cache", ResponseCache(100, 1 << 20, 60))
+    monkeypatch.setattr(explain_router, "explanation_store", ResponseCache(100, 1 << 20, 60))
+    monkeypatch.setattr(explain_router.settings, "EXPLAIN_INCREMENTAL_CONTEXT_LINES", 1)
+    monkeypatch.setattr(explain_router.settings, "EXPLAIN_INCREMENTAL_MAX_SUMMARY_DRIFT", 0.25)
+    return explain_router.explanation_store
+
+
+def _incremental(store, summary_drift: float):
+    asyncio.run(store.set("previous", json.dumps({
+        "code": OLD,
+        "language": "python",
+        "result": {
+            "language": "python",
+            "high_level_explanation": "Old summary.",
+            "line_by_line_explanation": {str(i): f"old {i}" for i in range(1, 41)},
+        },
+        "summary_drift": summary_drift,
+    })))
+    backend = _Backend()
+    result = asyncio.run(explain_router._explain_incremental(backend, NEW, "python", "previous", False))
+    return result, backend.calls
+
+
+def test_small_edits_reuse_the_summary_and_track_its_drift(store):
+    (result, drift), calls = _incremental(store, summary_drift=0.0)
+
+    assert calls == 1
+    assert result.high_level_explanation == "Old summary."
+    assert result.line_by_line_explanation["20"] == "new: x20 = 200"
+    assert result.line_by_line_explanation["1"] == "old 1"
+    assert drift == 3 / 40
+
+
+def test_summary_is_refreshed_once_edits_add_up(store):
+    result, calls = _incremental(store, summary_drift=0.2)
+
+    # None: the caller explains the whole file, summary included
+    assert result is None and calls == 0
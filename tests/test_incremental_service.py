@@ -0,0 +1,46 @@
+from services.incremental_service import IncrementalService
+
+OLD = "\n".join(f"x{i} = {i}" for i in range(1, 21))
+
+# Default of settings.EXPLAIN_INCREMENTAL_MAX_CHANGED_RATIO
+MAX_CHANGED_RATIO = 0.5
+
+
+def test_edits_become_hunks_with_context():
+    new = OLD.replace("x10 = 10", "x10 = 100").replace("x15 = 15", "x15 = 15\nextra = 0")
+
+    plan = IncrementalService.plan(OLD, new, context=1)
+
+    assert plan.hunks == [(9, 11), (15, 17)]
+    assert plan.changed_ratio == 6 / 21
+
+
+def test_unchanged_lines_keep_their_explanations_at_new_numbers():
+    new = OLD.replace("x3 = 3\n", "")
+    old_lines = {str(i): f"explains x{i}" for i in range(1, 21)}
+
+    plan = IncrementalService.plan(OLD, new, context=0)
+    shifted = IncrementalService.shift_lines(old_lines, plan.reused)
+
+    # The lines on both sides of a deletion are explained again
+    assert plan.hunks == [(2, 3)]
+    assert shifted["1"] == "explains x1"
+    assert "2" not in shifted and "3" not in shifted
+    assert shifted["4"] == "explains x5"
+    assert shifted["19"] == "explains x20"
+    assert len(shifted) == 17
+
+
+def test_mostly_rewritten_code_is_above_the_incremental_threshold():
+    small_edit = OLD.replace("x7 = 7", "x7 = 70")
+    rewrite = "x1 = 1\n" + "\n".join(f"y{i} = {i}" for i in range(2, 21))
+
+    assert IncrementalService.plan(OLD, small_edit, context=3).changed_ratio <= MAX_CHANGED_RATIO
+    rewritten = IncrementalService.plan(OLD, rewrite, context=0)
+    assert rewritten.hunks == [(2, 20)]
+    assert rewritten.changed_ratio > MAX_CHANGED_RATIO
+
+
+def test_explanation_id_is_a_content_hash():
+    assert IncrementalService.explanation_id(OLD) == IncrementalService.explanation_id(OLD)
+    assert IncrementalService.explanation_id(OLD) != IncrementalService.explanation_id(OLD + "\n")
@@ -0,0 +1,21 @@
+from services.language_service import LanguageService, _LineStarts
+
+
+def test_line_starts_follow_increasing_positions():
+    code = "x = 1\n    if y:\nz if w"
+    starts_line = _LineStarts(code)
+
+    assert starts_line(code.index("x"))
+    assert starts_line(code.index("if"))
+    assert not starts_line(code.rindex("if"))
+
+
+def test_line_start_keywords_only_count_first_on_their_line():
+    # `def`/`if` lines score Python only when the keyword starts the line
+    assert LanguageService.detect_language("    def run(self):\n        if ok:\n") == "python"
+    assert LanguageService.detect_language("x = 'def run(self):' + 'if ok:'") == "unknown"
+
+
+def test_minified_input_is_scanned():
+    minified = "for(i=0;i<n;i++){if(x){y()}else{z()}}" * 2000 + "console.log(i);"
+    assert LanguageService.detect_language(minified) == "javascript"
@@ -0,0 +1,49 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("pydantic_settings")
+
+from config import settings
+from services.local_llm_backend import LocalLLMBackend
+from services.resilience import UpstreamUnavailable
+
+
+@pytest.fixture
+def fast_stub(monkeypatch):
+    monkeypatch.setattr(settings, "LOCAL_LLM_LATENCY_MS", 1)
+    monkeypatch.setattr(settings, "LOCAL_LLM_TOKENS_PER_SECOND", 0)
+    monkeypatch.setattr(settings, "LOCAL_LLM_ERROR_RATE", 0.0)
+    monkeypatch.setattr(settings, "GEMINI_RETRY_BASE_DELAY_MS", 1)
+
+
+def test_explanations_are_deterministic_and_numbered(fast_stub):
+    backend = LocalLLMBackend()
+    code = "# comment\nx = 1\n\ny = x + 1\n"
+
+    first = asyncio.run(backend.explain_code(code, "python"))
+    assert asyncio.run(backend.explain_code(code, "python")) == first
+
+    # Numbered like a minimized prompt: comment and blank lines dropped
+    parsed = json.loads(first)
+    assert list(parsed["line_by_line_explanation"]) == ["1", "2"]
+
+
+def test_stream_concatenates_to_the_explanation(fast_stub):
+    backend = LocalLLMBackend()
+
+    async def collect():
+        return "".join([chunk async for chunk in backend.stream_explain_code("x = 1\n" * 200, "python")])
+
+    assert json.loads(asyncio.run(collect()))["language"] == "python"
+
+
+def test_injected_errors_go_through_retries(fast_stub, monkeypatch):
+    monkeypatch.setattr(settings, "LOCAL_LLM_ERROR_RATE", 1.0)
+    backend = LocalLLMBackend()
+
+    with pytest.raises(UpstreamUnavailable):
+        asyncio.run(backend.suggest_improvements("x = 1", "python"))
+    assert backend.injected_errors == settings.GEMINI_MAX_RETRIES + 1
@@ -0,0 +1,71 @@
+import io
+import json
+
+import pytest
+
+from utils import logger, metrics
+
+
+@pytest.fixture
+def output():
+    stream = io.StringIO()
+    previous = logger.console_handler.setStream(stream)
+    yield stream
+    logger.flush_logs()
+    logger.console_handler.setStream(previous)
+    logger.configure_logging()
+
+
+def _lines(stream: io.StringIO):
+    logger.flush_logs()
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_json_lines_carry_request_context(output):
+    logger.start_request_context("req-1")
+    logger.bind(user="alice")
+    timings = metrics.start_request()
+    timings["validate"] = 0.002
+
+    logger.log_info("Explained %d lines", 12, endpoint="explain")
+
+    (entry,) = _lines(output)
+    assert entry["msg"] == "Explained 12 lines"
+    assert entry["request_id"] == "req-1"
+    assert entry["user"] == "alice"
+    assert entry["stages_ms"] == {"validate": 2.0}
+    assert entry["endpoint"] == "explain"
+
+
+def test_disabled_levels_are_never_formatted(output):
+    class Expensive:
+        formatted = 0
+
+        def __str__(self):
+            Expensive.formatted += 1
+            return "expensive"
+
+    logger.configure_logging(level="ERROR")
+    logger.log_info("value: %s", Expensive())
+    logger.log_error("kept")
+
+    assert [entry["msg"] for entry in _lines(output)] == ["kept"]
+    assert Expensive.formatted == 0
+
+
+def test_sampled_events_follow_the_rate(output):
+    logger.configure_logging(sample_rate=0.0)
+    logger.log_info("high volume", sampled=True)
+    logger.log_info("always kept")
+
+    assert [entry["msg"] for entry in _lines(output)] == ["always kept"]
+
+
+def test_request_ids_from_clients_are_reduced_to_safe_characters():
+    assert logger.request_id_from_header("abc-123_X") == "abc-123_X"
+    assert logger.request_id_from_header("../../etc/passwd\r\nX-Evil: 1") == "etcpasswdX-Evil1"
+    assert len(logger.request_id_from_header("a" * 500)) == logger.MAX_REQUEST_ID_LENGTH
+
+    generated = logger.request_id_from_header("/../")
+    assert len(generated) == 32 and generated.isalnum()
+    assert logger.request_id_from_header(None) != logger.request_id_from_header(None)
@@ -0,0 +1,53 @@
+import asyncio
+
+from utils import metrics
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = metrics.Histogram("test_seconds", "Test.", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value, "parse")
+
+    lines = histogram.render()
+    assert 'code_explainer_test_seconds_bucket{stage="parse",le="0.1"} 1' in lines
+    assert 'code_explainer_test_seconds_bucket{stage="parse",le="1.0"} 3' in lines
+    assert 'code_explainer_test_seconds_bucket{stage="parse",le="+Inf"} 4' in lines
+    assert 'code_explainer_test_seconds_count{stage="parse"} 4' in lines
+    assert "# TYPE code_explainer_test_seconds histogram" in lines
+
+
+def test_label_values_are_escaped():
+    counter = metrics.Counter("test_total", "Test.", ("cause",))
+    counter.inc('say "hi"\n')
+
+    assert counter.render()[-1] == 'code_explainer_test_total{cause="say \\"hi\\"\\n"} 1'
+
+
+def test_stages_add_up_per_request_across_tasks():
+    async def request():
+        timings = metrics.start_request()
+
+        async def chunk():
+            with metrics.stage("test_llm"):
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(chunk(), chunk())
+        return timings
+
+    timings = asyncio.run(request())
+    assert timings["test_llm"] >= 0.02
+    assert metrics.STAGE_DURATION.count("test_llm") == 2
+
+    header = metrics.server_timing(timings, 0.05)
+    assert header.startswith("test_llm;dur=")
+    assert header.endswith("total;dur=50.00")
+
+
+def test_timed_keeps_the_signature():
+    @metrics.timed("test_dependency")
+    def dependency(token: str) -> str:
+        return token
+
+    assert dependency("abc") == "abc"
+    assert dependency.__wrapped__.__name__ == "dependency"
+    assert metrics.STAGE_DURATION.count("test_dependency") == 1
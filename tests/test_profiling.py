@@ -0,0 +1,103 @@
+import asyncio
+import json
+import time
+
+from utils import metrics, profiling
+from utils.logger import start_request_context
+from utils.profiling import ProfileRequests, RequestProfiler
+
+
+def _busy(seconds: float) -> None:
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_unsampled_requests_are_not_profiled():
+    profiler = RequestProfiler(sample_rate=0.0)
+
+    assert profiler.begin("req", "GET", "/") is None
+    assert profiler.profiled == 0
+
+
+def test_stages_form_a_span_tree_across_tasks():
+    profiler = RequestProfiler(sample_rate=1.0, slow_ms=0, interval_ms=1)
+
+    async def request():
+        profile = profiler.begin("req-1", "POST", "/api/explain")
+
+        async def chunk():
+            with metrics.stage("test_llm"):
+                await asyncio.sleep(0.01)
+
+        with metrics.stage("test_chunks"):
+            await asyncio.gather(chunk(), chunk())
+        with metrics.stage("test_parse"):
+            _busy(0.02)
+        return profiler.finish(profile, 200)
+
+    capture = asyncio.run(request())
+    spans = capture["spans"]
+    assert [span["name"] for span in spans["children"]] == ["test_chunks", "test_parse"]
+    assert [span["name"] for span in spans["children"][0]["children"]] == ["test_llm", "test_llm"]
+    assert capture["status"] == 200
+    assert any("_busy" in stack for stack in capture["samples"])
+
+
+def test_fast_requests_are_not_captured():
+    profiler = RequestProfiler(sample_rate=1.0, slow_ms=60000)
+
+    profile = profiler.begin("req", "GET", "/")
+    assert profiler.finish(profile, 200) is None
+    assert profiler.status()["profiled"] == 1
+
+
+def test_capture_directory_keeps_the_newest_files(tmp_path):
+    profiler = RequestProfiler(directory=str(tmp_path), max_files=2)
+    for index in range(3):
+        profiler.write({"request_id": f"req-{index}", "started_at": time.time() + index})
+        time.sleep(0.01)
+
+    assert sorted(path.name.split("-", 1)[1] for path in tmp_path.iterdir()) == [
+        "req-1.json", "req-2.json"
+    ]
+
+
+def test_hostile_request_ids_stay_inside_the_capture_directory(tmp_path):
+    directory = tmp_path / "profiles"
+    profiler = RequestProfiler(directory=str(directory))
+
+    for request_id in ("../../x", "a/b", "\x00", ""):
+        path = profiler.write({"request_id": request_id, "started_at": time.time()})
+        assert path.parent == directory and path.exists()
+    names = {p.name.split("-", 1)[1] for p in directory.iterdir()}
+    assert {"x.json", "ab.json"} <= names and len(names) == 4
+    assert [p.name for p in tmp_path.iterdir()] == ["profiles"]
+
+
+def test_middleware_writes_slow_requests_named_after_the_request_id(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "profiler", RequestProfiler(
+        sample_rate=1.0, slow_ms=0, interval_ms=1, directory=str(tmp_path)
+    ))
+    statuses = []
+
+    async def app(scope, receive, send):
+        with metrics.stage("test_handler"):
+            await asyncio.sleep(0.01)
+        await send({"type": "http.response.start", "status": 201, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    async def send(message):
+        statuses.append(message.get("status"))
+
+    async def request():
+        start_request_context("req-42")
+        await ProfileRequests(app)({"type": "http", "method": "POST", "path": "/api/explain"}, None, send)
+
+    asyncio.run(request())  # waits for the write in the default executor
+
+    [path] = tmp_path.iterdir()
+    capture = json.loads(path.read_text())
+    assert path.name.endswith("-req-42.json")
+    assert capture["status"] == 201 and statuses[0] == 201
+    assert [span["name"] for span in capture["spans"]["children"]] == ["test_handler"]
@@ -0,0 +1,23 @@
+import pytest
+
+pytest.importorskip("httpx")
+pytest.importorskip("pydantic_settings")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from main import app  # noqa: E402
+
+
+def test_hostile_request_id_is_not_echoed():
+    client = TestClient(app)
+
+    response = client.get("/", headers={"X-Request-ID": "../../tmp/x <script>"})
+
+    assert response.status_code == 200
+    assert response.headers["X-Request-ID"] == "tmpxscript"
+
+
+def test_missing_request_id_gets_a_generated_one():
+    client = TestClient(app)
+
+    assert len(client.get("/").headers["X-Request-ID"]) == 32
@@ -0,0 +1,145 @@
+import asyncio
+import time
+
+import pytest
+
+from services.resilience import CircuitBreaker, ResilientCaller, UpstreamUnavailable
+
+
+class _UpstreamError(Exception):
+    def __init__(self, code: int):
+        super().__init__(f"upstream returned {code}")
+        self.code = code
+
+
+class _FakeBackend:
+    """
+    Stands in for Gemini: each call sleeps for the next scripted latency
+    and then fails with the next scripted status code (None = success).
+    """
+
+    def __init__(self, faults=(), latencies=()):
+        self.faults = list(faults)
+        self.latencies = list(latencies)
+        self.calls = 0
+
+    async def generate(self) -> str:
+        self.calls += 1
+        if self.latencies:
+            await asyncio.sleep(self.latencies.pop(0))
+        fault = self.faults.pop(0) if self.faults else None
+        if fault is not None:
+            raise _UpstreamError(fault)
+        return "ok"
+
+
+def _caller(**kwargs) -> ResilientCaller:
+    options = dict(timeout=1.0, max_retries=2, base_delay=0.01, max_delay=0.05)
+    options.update(kwargs)
+    breaker = CircuitBreaker(options.pop("failure_threshold", 5), options.pop("open_seconds", 30))
+    return ResilientCaller(breaker, **options)
+
+
+def test_transient_errors_are_retried():
+    backend = _FakeBackend(faults=[503, 429])
+    caller = _caller()
+
+    assert asyncio.run(caller.call(backend.generate)) == "ok"
+    assert backend.calls == 3
+    assert caller.retries == 2
+
+
+def test_non_retryable_errors_are_not_retried():
+    backend = _FakeBackend(faults=[400])
+    caller = _caller()
+
+    with pytest.raises(_UpstreamError):
+        asyncio.run(caller.call(backend.generate))
+    assert backend.calls == 1
+    assert caller.breaker.state == "closed"
+
+
+def test_exhausted_retries_become_unavailable():
+    backend = _FakeBackend(faults=[503, 503, 503])
+    caller = _caller()
+
+    with pytest.raises(UpstreamUnavailable):
+        asyncio.run(caller.call(backend.generate))
+    assert backend.calls == 3
+
+
+def test_timeouts_count_as_retryable():
+    backend = _FakeBackend(latencies=[0.5, 0.0])
+    caller = _caller(timeout=0.1)
+
+    assert asyncio.run(caller.call(backend.generate)) == "ok"
+    assert backend.calls == 2
+
+
+def test_open_circuit_fails_fast_then_probes():
+    backend = _FakeBackend(faults=[503, 503, 503])
+    caller = _caller(max_retries=0, failure_threshold=3, open_seconds=0.2)
+
+    async def run():
+        for _ in range(3):
+            with pytest.raises(UpstreamUnavailable):
+                await caller.call(backend.generate)
+        assert caller.breaker.state == "open"
+
+        # Rejected without reaching the backend, with a Retry-After hint
+        with pytest.raises(UpstreamUnavailable) as info:
+            await caller.call(backend.generate)
+        assert info.value.retry_after >= 1
+        assert backend.calls == 3
+
+        # After open_seconds one probe goes through and closes the circuit
+        await asyncio.sleep(0.25)
+        assert await caller.call(backend.generate) == "ok"
+        assert caller.breaker.state == "closed"
+
+    asyncio.run(run())
+
+
+def test_hedged_request_beats_slow_primary():
+    caller = _caller(hedge=True, hedge_min_delay=0.05)
+    # Warm the latency window so a hedge delay can be computed
+    caller._latencies.extend([0.01] * 50)
+    backend = _FakeBackend(latencies=[0.5, 0.01])
+
+    start = time.perf_counter()
+    assert asyncio.run(caller.call(backend.generate)) == "ok"
+    elapsed = time.perf_counter() - start
+
+    assert backend.calls == 2
+    assert caller.hedge_wins == 1
+    assert elapsed < 0.3
+
+
+def test_waiting_for_a_slot_is_not_an_upstream_timeout():
+    # Five calls queue for one slot; each upstream call fits the timeout
+    backend = _FakeBackend(latencies=[0.1] * 5)
+    caller = _caller(timeout=0.15, max_retries=0, failure_threshold=2)
+
+    async def run():
+        slots = asyncio.Semaphore(1)
+        return await asyncio.gather(*(caller.call(backend.generate, slots) for _ in range(5)))
+
+    assert asyncio.run(run()) == ["ok"] * 5
+    assert backend.calls == 5
+    assert caller.breaker.state == "closed"
+
+
+def test_slots_are_given_back_unless_held():
+    caller = _caller(max_retries=0)
+
+    async def run():
+        slots = asyncio.Semaphore(1)
+        with pytest.raises(UpstreamUnavailable):
+            await caller.call(_FakeBackend(faults=[503]).generate, slots, hold_slot=True)
+        assert not slots.locked()
+
+        assert await caller.call(_FakeBackend().generate, slots, hold_slot=True) == "ok"
+        assert slots.locked()
+        slots.release()
+
+    asyncio.run(run())
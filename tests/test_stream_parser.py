@@ -0,0 +1,76 @@
+import json
+
+from ai.prompts import explain_line_map, remap_line_keys
+from services.stream_parser import ExplanationStreamParser
+
+EXPLANATION = {
+    "language": "python",
+    "high_level_explanation": 'Prints "hi" \\ then café ✓',
+    "line_by_line_explanation": {"1": "Defines f.", "2": 'Returns "x"\n.'},
+}
+
+
+def _feed(chunks):
+    parser = ExplanationStreamParser()
+    events = []
+    for chunk in chunks:
+        events.extend(parser.feed(chunk))
+    return parser, events
+
+
+def test_every_split_point_gives_the_same_events():
+    # json.dumps escapes the non-ASCII characters as \uXXXX, so some split
+    # points land inside a key, a string, a backslash escape or a \u sequence
+    text = "```json\n" + json.dumps(EXPLANATION) + "\n```"
+    expected = [
+        ("language", "python"),
+        ("high_level_explanation", EXPLANATION["high_level_explanation"]),
+        ("line", ("1", "Defines f.")),
+        ("line", ("2", 'Returns "x"\n.')),
+    ]
+
+    for split in range(len(text) + 1):
+        parser, events = _feed([text[:split], text[split:]])
+        assert events == expected, split
+        assert parser.result() == EXPLANATION
+
+    parser, events = _feed(list(text))
+    assert events == expected
+
+
+def test_nested_values_do_not_produce_events():
+    text = json.dumps({
+        "language": "go",
+        "notes": {"language": "rust", "deep": [{"high_level_explanation": "no"}]},
+        "line_by_line_explanation": {"3": "Loops.", "extra": {"4": "nested"}},
+        "high_level_explanation": "Sums a slice.",
+    })
+
+    parser, events = _feed([text])
+
+    assert events == [
+        ("language", "go"),
+        ("line", ("3", "Loops.")),
+        ("high_level_explanation", "Sums a slice."),
+    ]
+    assert parser.result()["line_by_line_explanation"] == {"3": "Loops."}
+
+
+def test_unclosed_object_has_no_result():
+    parser, events = _feed(['{"language": "python", "line_by_line_explanation": {"1": "Def'])
+
+    assert events == [("language", "python")]
+    assert parser.result() is None
+    assert parser.feed("ines f.\"}}") == [("line", ("1", "Defines f."))]
+    assert parser.result() is not None
+
+
+def test_line_keys_are_remapped_to_the_original_code():
+    code = "# header\n\ndef f():\n    # comment\n    return 1\n"
+    line_map = explain_line_map(code, "python")
+    assert line_map == [3, 5]
+
+    _, events = _feed(['{"line_by_line_explanation": {"1": "Def', 'ines f.", "2": "Returns 1."}}'])
+    lines = dict(data for event, data in events if event == "line")
+
+    assert remap_line_keys(lines, line_map) == {"3": "Defines f.", "5": "Returns 1."}
@@ -0,0 +1,80 @@
+import asyncio
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("passlib")
+pytest.importorskip("pydantic_settings")
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Each worker imports the store and migrates at the same moment
+_WORKER = """
+import sys, time
+from pathlib import Path
+time.sleep(max(0.0, float(sys.argv[1]) - time.time()))
+from auth import user_store
+user_store.migrate_from_json(Path("data/users.json"))
+"""
+
+
+def test_concurrent_startup_migrates_once(tmp_path):
+    (tmp_path / "data").mkdir()
+    users = [{"username": f"user{i}", "password_hash": "x", "created_at": None} for i in range(50)]
+    (tmp_path / "data" / "users.json").write_text(json.dumps({"users": users, "refresh_tokens": []}))
+    db_path = tmp_path / "data" / "users.db"
+
+    env = dict(os.environ, USER_DB_PATH=str(db_path), PYTHONPATH=str(ROOT))
+    start_at = str(time.time() + 1.0)
+    workers = [
+        subprocess.Popen([sys.executable, "-c", _WORKER, start_at], cwd=tmp_path, env=env,
+                         stderr=subprocess.PIPE, text=True)
+        for _ in range(4)
+    ]
+    for worker in workers:
+        _, stderr = worker.communicate(timeout=60)
+        assert worker.returncode == 0, stderr
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 50
+    assert conn.execute("SELECT COUNT(*) FROM meta WHERE key = 'migrated_from_json'").fetchone()[0] == 1
+
+
+def test_locked_database_does_not_block_the_event_loop(tmp_path, monkeypatch):
+    from auth import auth_router, user_store
+
+    monkeypatch.setattr(user_store, "DB_PATH", tmp_path / "users.db")
+    monkeypatch.setattr(user_store, "LEGACY_JSON_PATH", tmp_path / "users.json")
+    user_store.get_user("nobody")  # creates the schema
+
+    async def fast_hash(password):
+        return "hash"
+
+    monkeypatch.setattr(auth_router, "hash_password_async", fast_hash)
+
+    # Another worker holds the write lock for a while
+    locker = sqlite3.connect(tmp_path / "users.db", isolation_level=None)
+    locker.execute("BEGIN IMMEDIATE")
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.3, locker.execute, "COMMIT")
+        register = asyncio.create_task(
+            auth_router.register(auth_router.RegisterRequest(username="alice", password="secret"))
+        )
+        longest_gap = 0.0
+        while not register.done():
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            longest_gap = max(longest_gap, time.perf_counter() - start)
+        await register
+        return longest_gap
+
+    assert asyncio.run(run()) < 0.1
+    assert user_store.get_user("alice") is not None
@@ -0,0 +1,115 @@
+# utils/compression.py
+
+import asyncio
+import gzip
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from utils.metrics import stage
+
+try:  # optional: `pip install brotli` enables br
+    import brotli
+except ImportError:
+    brotli = None
+
+# Already compressed, or must reach the client as it is produced
+SKIPPED_CONTENT_TYPES = ("text/event-stream", "image/", "audio/", "video/", "application/zip")
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    "br" or "gzip" from an Accept-Encoding header (brotli preferred when
+    installed), or None when the client accepts neither.
+    """
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        if name.strip():
+            weights[name.strip()] = weight
+
+    for encoding in ("br", "gzip") if brotli is not None else ("gzip",):
+        if weights.get(encoding, weights.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+class CompressionMiddleware:
+    """
+    Compresses response bodies of at least `minimum_size` bytes with the
+    encoding the client prefers. Only single-message bodies are
+    compressed; streamed responses (SSE) pass through untouched so their
+    events are not held back by the compressor. Bodies of at least
+    `thread_size` bytes are compressed in a worker thread (gzip and brotli
+    release the GIL), so large explanations do not stall the event loop.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, thread_size: int = 16 * 1024,
+                 gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.thread_size = thread_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        # The start message is held until the first body message shows
+        # whether the response is worth compressing
+        pending: Optional[dict] = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal pending, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                pending = message
+                return
+
+            body, more_body = message.get("body", b""), message.get("more_body", False)
+            headers = MutableHeaders(scope=pending)
+            passthrough = True
+            if not self._compressible(headers, body, more_body):
+                await send(pending)
+                await send(message)
+                return
+
+            with stage("compress"):
+                if len(body) >= self.thread_size:
+                    compressed = await asyncio.to_thread(self.compress, body, encoding)
+                else:
+                    compressed = self.compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(pending)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
+
+    def _compressible(self, headers: MutableHeaders, body: bytes, more_body: bool) -> bool:
+        return (
+            not more_body
+            and len(body) >= self.minimum_size
+            and "content-encoding" not in headers
+            and not headers.get("content-type", "").startswith(SKIPPED_CONTENT_TYPES)
+        )
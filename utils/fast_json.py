@@ -0,0 +1,43 @@
+# utils/fast_json.py
+
+from functools import lru_cache
+from typing import Optional, Type
+
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter
+
+from utils.metrics import stage
+
+
+@lru_cache(maxsize=None)
+def _adapter(model_type: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(model_type)
+
+
+class ModelResponse(Response):
+    """
+    A response model encoded straight to JSON bytes by pydantic-core.
+
+    FastAPI sends a returned Response as is, which skips the response_model
+    pass: dumping the model to a dict, validating that dict back into the
+    model and serializing it again for json.dumps. The route's
+    response_model still documents the schema.
+    """
+
+    media_type = "application/json"
+
+    def __init__(self, model: BaseModel, status_code: int = 200, headers: Optional[dict] = None):
+        with stage("serialize"):
+            body = _adapter(type(model)).dump_json(model)
+        super().__init__(body, status_code=status_code, headers=headers)
+
+
+def model_response(model: BaseModel, sub_response: Optional[Response] = None) -> ModelResponse:
+    """
+    `sub_response` is the endpoint's injected Response. FastAPI only copies
+    its headers onto responses it builds itself, so they are copied here.
+    """
+    headers = None
+    if sub_response is not None:
+        headers = {key: value for key, value in sub_response.headers.items() if key != "content-length"}
+    return ModelResponse(model, headers=headers)
@@ -1,27 +1,179 @@
 # utils/logger.py
 
+import atexit
+import datetime
+import json
 import logging
+import queue
+import random
+import re
+import sys
+import uuid
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+from utils.metrics import current_timings
+
+# Records waiting for the writer thread; when it falls this far behind,
+# new records are dropped (and counted) rather than blocking the caller
+QUEUE_SIZE = 10000
+
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
 
 # Create the logger
 logger = logging.getLogger("code_explainer")
 logger.setLevel(logging.INFO)
+logger.propagate = False
+
+# Request id and user of the current request. The dict is created by the
+# HTTP middleware, so dependencies running in worker threads can fill it in.
+_request_context: ContextVar[Optional[Dict[str, Any]]] = ContextVar("log_context", default=None)
+
+# Characters kept from a caller's X-Request-ID; the id ends up in log
+# lines, response headers and profile file names
+_UNSAFE_REQUEST_ID = re.compile(r"[^A-Za-z0-9_-]")
+MAX_REQUEST_ID_LENGTH = 64
+
+# Fraction of `sampled` info events that are written
+_sample_rate = 1.0
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line: time, level, message, the request context,
+    stage durations so far and any structured fields.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc)
+            .isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "msg": record.getMessage(),
+        }
+        entry.update(getattr(record, "context", None) or {})
+        stages = getattr(record, "stages", None)
+        if stages:
+            entry["stages_ms"] = {name: round(seconds * 1000, 2) for name, seconds in stages.items()}
+        sample_rate = getattr(record, "sample_rate", None)
+        if sample_rate is not None:
+            entry["sample_rate"] = sample_rate
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _ContextQueueHandler(QueueHandler):
+    """
+    Runs on the calling thread, so it only captures the request context and
+    enqueues. Unlike QueueHandler.prepare the message is not formatted here:
+    `msg % args` happens on the writer thread.
+    """
+
+    def __init__(self, records: "queue.Queue[logging.LogRecord]"):
+        super().__init__(records)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        context = _request_context.get()
+        if context:
+            record.context = dict(context)
+        timings = current_timings()
+        if timings:
+            record.stages = dict(timings)
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(QUEUE_SIZE)
+_queue_handler = _ContextQueueHandler(_queue)
 
-# Create console handler
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.INFO)
+# Console output happens on the listener's thread only
+console_handler = logging.StreamHandler(sys.stderr)
+console_handler.setFormatter(JsonFormatter())
 
-# Format logs
-formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-console_handler.setFormatter(formatter)
+_listener = QueueListener(_queue, console_handler, respect_handler_level=True)
 
-# Add handler to logger
 if not logger.handlers:
-    logger.addHandler(console_handler)
+    logger.addHandler(_queue_handler)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def configure_logging(level: str = "INFO", fmt: str = "json", sample_rate: float = 1.0) -> None:
+    """
+    Level, output format ("json" or "text") and the fraction of sampled
+    info events to keep.
+    """
+    global _sample_rate
+    logger.setLevel(level.upper())
+    console_handler.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+    _sample_rate = sample_rate
+
+
+def request_id_from_header(value: Optional[str]) -> str:
+    """
+    The caller's X-Request-ID reduced to [A-Za-z0-9_-], or a new id when
+    nothing usable is left.
+    """
+    request_id = _UNSAFE_REQUEST_ID.sub("", value or "")[:MAX_REQUEST_ID_LENGTH]
+    return request_id or uuid.uuid4().hex
+
+
+def start_request_context(request_id: str) -> Dict[str, Any]:
+    context = {"request_id": request_id}
+    _request_context.set(context)
+    return context
+
+
+def current_request_id() -> Optional[str]:
+    context = _request_context.get()
+    return context.get("request_id") if context else None
+
+
+def bind(**values: Any) -> None:
+    """
+    Adds fields (e.g. user) to the current request's log context.
+    """
+    context = _request_context.get()
+    if context is not None:
+        context.update(values)
+
+
+def flush_logs() -> None:
+    """
+    Blocks until every queued record has been written.
+    """
+    _queue.join()
+
+
+def stats() -> Dict[str, int]:
+    return {"queued": _queue.qsize(), "dropped": _queue_handler.dropped}
+
 
+# Messages take %-style args so nothing is formatted for disabled levels or
+# dropped samples; keyword arguments become structured JSON fields.
 
-def log_info(message: str):
-    logger.info(message)
+def log_info(message: str, *args: Any, sampled: bool = False, **fields: Any):
+    """
+    `sampled=True` marks high-volume events, kept at the configured rate.
+    """
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    extra: Dict[str, Any] = {"fields": fields}
+    if sampled and _sample_rate < 1.0:
+        if random.random() >= _sample_rate:
+            return
+        extra["sample_rate"] = _sample_rate
+    logger.info(message, *args, extra=extra)
 
 
-def log_error(message: str):
-    logger.error(message)
+def log_error(message: str, *args: Any, exc_info: bool = False, **fields: Any):
+    logger.error(message, *args, exc_info=exc_info, extra={"fields": fields})
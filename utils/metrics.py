@@ -0,0 +1,248 @@
+# utils/metrics.py
+
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+from utils.profiling import current_profile
+
+F = TypeVar("F", bound=Callable)
+
+# Seconds; covers a cached answer (~1 ms) up to a slow Gemini call
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+PREFIX = "code_explainer_"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = PREFIX + name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return self._header() + [
+            f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+            for labels, value in values
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    @contextmanager
+    def track(self, *labels: str) -> Iterator[None]:
+        """
+        Counts the block as in flight while it runs.
+        """
+        self.inc(*labels)
+        try:
+            yield
+        finally:
+            self.dec(*labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket (non-cumulative, last is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = [(labels, list(counts), total[0]) for labels, (counts, total) in self._series.items()]
+        lines = self._header()
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+def render_stats(name: str, help_text: str, labelnames: Sequence[str],
+                 samples: Dict[Tuple[str, ...], float]) -> List[str]:
+    """
+    A gauge family built at scrape time from a component's stats() dict.
+    """
+    gauge = Gauge(name, help_text, labelnames)
+    for labels, value in samples.items():
+        gauge.set(value, *labels)
+    return gauge.render()
+
+
+# ---------- Application metrics ----------
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+HTTP_DURATION = Histogram(
+    "http_request_duration_seconds", "Time to the response headers, by route.", ("method", "route")
+)
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being handled.")
+STAGE_DURATION = Histogram("stage_duration_seconds", "Time spent per request stage.", ("stage",))
+LLM_IN_FLIGHT = Gauge("llm_calls_in_flight", "LLM calls awaiting an answer, by endpoint.", ("endpoint",))
+LLM_TOKENS = Counter("llm_tokens_total", "LLM tokens by endpoint and direction.", ("endpoint", "direction"))
+ERRORS = Counter("errors_total", "Failed requests and upstream calls by cause.", ("cause",))
+
+METRICS = (HTTP_REQUESTS, HTTP_DURATION, HTTP_IN_FLIGHT, STAGE_DURATION, LLM_IN_FLIGHT, LLM_TOKENS, ERRORS)
+
+
+def render() -> List[str]:
+    lines: List[str] = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return lines
+
+
+def record_error(cause: str) -> None:
+    ERRORS.inc(cause)
+
+
+def record_tokens(endpoint: str, input_tokens: Optional[int], output_tokens: Optional[int]) -> None:
+    if input_tokens:
+        LLM_TOKENS.inc(endpoint, "input", amount=input_tokens)
+    if output_tokens:
+        LLM_TOKENS.inc(endpoint, "output", amount=output_tokens)
+
+
+# ---------- Per-request stage timings (Server-Timing) ----------
+
+# The dict is created by the HTTP middleware; tasks and worker threads
+# spawned by the request get a copy of the context, so they add to it.
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+def start_request() -> Dict[str, float]:
+    timings: Dict[str, float] = {}
+    _request_timings.set(timings)
+    return timings
+
+
+def current_timings() -> Optional[Dict[str, float]]:
+    return _request_timings.get()
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Times the block into the stage histogram and the current request's
+    Server-Timing header. Repeated stages (chunks, batch items) add up.
+    In profiled requests the block is also a span of the request's tree.
+    """
+    profile = current_profile()
+    span = profile.open(name) if profile is not None else None
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_DURATION.observe(elapsed, name)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed
+        if span is not None:
+            profile.close(span)
+
+
+def record_stage(name: str, start: float, end: float) -> None:
+    """
+    A stage timed outside a `with stage()` block (perf_counter values).
+    """
+    elapsed = end - start
+    STAGE_DURATION.observe(elapsed, name)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + elapsed
+    profile = current_profile()
+    if profile is not None:
+        profile.add(name, start, end)
+
+
+def timed(name: str) -> Callable[[F], F]:
+    """
+    stage() as a decorator for plain functions, e.g. FastAPI dependencies
+    (the signature FastAPI inspects is kept).
+    """
+    def decorator(fn: F) -> F:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def server_timing(timings: Dict[str, float], total: float) -> str:
+    entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings.items()]
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
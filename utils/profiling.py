@@ -0,0 +1,298 @@
+# utils/profiling.py
+
+import asyncio
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# Request ids come from a client header, so file names drop anything
+# outside [A-Za-z0-9_-]
+_UNSAFE_FILE_CHARS = re.compile(r"[^A-Za-z0-9_-]")
+
+# Deepest stack kept per sample, counted from the innermost frame
+MAX_STACK_DEPTH = 64
+
+
+class Span:
+    __slots__ = ("name", "start", "end", "children")
+
+    def __init__(self, name: str, start: float):
+        self.name = name
+        self.start = start
+        self.end: Optional[float] = None
+        self.children: List["Span"] = []
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        end = self.end if self.end is not None else time.perf_counter()
+        return {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round((end - self.start) * 1000, 3),
+            "children": [child.to_dict(origin) for child in self.children],
+        }
+
+
+# Set only for profiled requests, so unprofiled ones pay a single lookup
+_active_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("active_profile", default=None)
+_parent_span: ContextVar[Optional[Span]] = ContextVar("parent_span", default=None)
+
+
+def current_profile() -> Optional["RequestProfile"]:
+    return _active_profile.get()
+
+
+class RequestProfile:
+    """
+    Span tree of one request. Spans opened by concurrent tasks of the
+    request (chunks, batch items) nest under the span that spawned them.
+    """
+
+    def __init__(self, request_id: str, method: str, path: str):
+        self.request_id = request_id
+        self.method = method
+        self.path = path
+        self.started_at = time.time()
+        self.root = Span("request", time.perf_counter())
+
+    def open(self, name: str) -> Tuple[Span, Optional[Span]]:
+        parent = _parent_span.get() or self.root
+        span = Span(name, time.perf_counter())
+        parent.children.append(span)
+        _parent_span.set(span)
+        return span, parent
+
+    def close(self, handle: Tuple[Span, Optional[Span]]) -> None:
+        span, parent = handle
+        span.end = time.perf_counter()
+        _parent_span.set(parent)
+
+    def add(self, name: str, start: float, end: float) -> None:
+        """
+        A span timed elsewhere, e.g. response serialization.
+        """
+        span = Span(name, start)
+        span.end = end
+        (_parent_span.get() or self.root).children.append(span)
+
+
+def _stack(frame) -> Tuple[str, ...]:
+    frames = []
+    while frame is not None and len(frames) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+        frame = frame.f_back
+    return tuple(reversed(frames))
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stack of every thread (sys._current_frames) from a
+    daemon thread while at least one profiled request is in flight.
+
+    Requests share the event loop thread, so a capture shows everything
+    the process did during the request's window, not that request alone.
+    """
+
+    def __init__(self, interval: float, max_samples: int = 50000):
+        self.interval = interval
+        self._samples: Deque[Tuple[float, str, Tuple[str, ...]]] = deque(maxlen=max_samples)
+        self._users = 0
+        self._stop: Optional[threading.Event] = None
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self._lock:
+            self._users += 1
+            if self._stop is None:
+                self._stop = threading.Event()
+                threading.Thread(
+                    target=self._run, args=(self._stop,), name="sampling-profiler", daemon=True
+                ).start()
+
+    def release(self) -> None:
+        with self._lock:
+            self._users -= 1
+            if self._users == 0 and self._stop is not None:
+                self._stop.set()
+                self._stop = None
+                self._samples.clear()
+
+    def _run(self, stop: threading.Event) -> None:
+        own = threading.get_ident()
+        while not stop.wait(self.interval):
+            now = time.perf_counter()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    self._samples.append((now, names.get(ident, str(ident)), _stack(frame)))
+
+    def collapsed(self, start: float, end: float) -> Dict[str, int]:
+        """
+        Samples taken between start and end in collapsed-stack form
+        ("thread;outer;...;inner" -> count), as read by flamegraph.pl and
+        speedscope.
+        """
+        counts: Counter = Counter()
+        for taken, thread, stack in list(self._samples):
+            if start <= taken <= end:
+                counts[";".join((thread,) + stack)] += 1
+        return dict(counts.most_common())
+
+
+class RequestProfiler:
+    """
+    Profiles `sample_rate` of the requests. Those slower than `slow_ms`
+    are written, with their span tree and the stack samples taken while
+    they ran, to `directory`, which keeps the newest `max_files` captures.
+    Both settings can be changed at runtime (see routes/admin_router.py).
+    """
+
+    def __init__(self, sample_rate: float = 0.0, slow_ms: int = 5000, interval_ms: int = 5,
+                 directory: str = "data/profiles", max_files: int = 50):
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.directory = Path(directory)
+        self.max_files = max_files
+        self.sampler = SamplingProfiler(interval_ms / 1000)
+
+        self.profiled = 0
+        self.captured = 0
+
+    def configure(self, sample_rate: Optional[float] = None, slow_ms: Optional[int] = None,
+                  interval_ms: Optional[int] = None, directory: Optional[str] = None,
+                  max_files: Optional[int] = None) -> None:
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        if slow_ms is not None:
+            self.slow_ms = slow_ms
+        if interval_ms is not None:
+            self.sampler.interval = interval_ms / 1000
+        if directory is not None:
+            self.directory = Path(directory)
+        if max_files is not None:
+            self.max_files = max_files
+
+    def begin(self, request_id: str, method: str, path: str) -> Optional[RequestProfile]:
+        """
+        Starts profiling the current request if it is sampled.
+        """
+        if not self.sample_rate or random.random() >= self.sample_rate:
+            return None
+        profile = RequestProfile(request_id, method, path)
+        _active_profile.set(profile)
+        _parent_span.set(profile.root)
+        self.sampler.acquire()
+        self.profiled += 1
+        return profile
+
+    def finish(self, profile: RequestProfile, status_code: int) -> Optional[Dict[str, Any]]:
+        """
+        Ends the profile; returns the capture to write when the request was slow.
+        """
+        profile.root.end = time.perf_counter()
+        try:
+            duration_ms = (profile.root.end - profile.root.start) * 1000
+            if duration_ms < self.slow_ms:
+                return None
+            self.captured += 1
+            return {
+                "request_id": profile.request_id,
+                "method": profile.method,
+                "path": profile.path,
+                "status": status_code,
+                "started_at": profile.started_at,
+                "duration_ms": round(duration_ms, 3),
+                "spans": profile.root.to_dict(profile.root.start),
+                "sample_interval_ms": self.sampler.interval * 1000,
+                "samples": self.sampler.collapsed(profile.root.start, profile.root.end),
+            }
+        finally:
+            self.sampler.release()
+
+    def write(self, capture: Dict[str, Any]) -> Path:
+        """
+        Blocking; call it from a worker thread.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime(capture["started_at"]))
+        name = _UNSAFE_FILE_CHARS.sub("", str(capture["request_id"]))[:64] or uuid.uuid4().hex
+        path = self.directory / f"{stamp}-{name}.json"
+        path.write_text(json.dumps(capture, indent=1))
+
+        captures = sorted(self.directory.glob("*.json"), key=lambda p: p.stat().st_mtime)
+        for old in captures[:-self.max_files] if self.max_files > 0 else []:
+            old.unlink(missing_ok=True)
+        return path
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "sample_rate": self.sample_rate,
+            "slow_ms": self.slow_ms,
+            "directory": str(self.directory),
+            "max_files": self.max_files,
+            "profiled": self.profiled,
+            "captured": self.captured,
+        }
+
+
+# Configured from settings in main.py
+profiler = RequestProfiler()
+
+
+class ProfileRequests:
+    """
+    ASGI middleware that builds a span tree for the sampled fraction of
+    requests; the others only pay a rate check. Slow ones are written to
+    the profile directory with the stack samples taken while they ran, off
+    the event loop. Plain ASGI, so streamed bodies count towards the
+    duration. Add it inside the request context middleware, so profiles
+    are named after the request id.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profiler.sample_rate:
+            return await self.app(scope, receive, send)
+        # Imported here: utils.logger imports utils.metrics, which imports this module
+        from utils.logger import current_request_id
+
+        profile = profiler.begin(current_request_id() or uuid.uuid4().hex, scope["method"], scope["path"])
+        if profile is None:
+            return await self.app(scope, receive, send)
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            capture = profiler.finish(profile, status_code)
+            if capture is not None:
+                asyncio.get_running_loop().run_in_executor(None, _write_capture, capture)
+
+
+def _write_capture(capture: Dict[str, Any]) -> None:
+    from utils.logger import log_error, log_info
+
+    try:
+        path = profiler.write(capture)
+    except OSError as e:
+        log_error("Failed to write profile: %s", e)
+    else:
+        log_info("Slow request %s took %.0f ms, profile written to %s",
+                 capture["path"], capture["duration_ms"], path)
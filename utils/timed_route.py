@@ -0,0 +1,55 @@
+# utils/timed_route.py
+
+import asyncio
+import functools
+import time
+from contextvars import ContextVar
+from typing import Callable, List, Optional
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+
+from utils.metrics import record_stage
+
+# When the endpoint of the current request returned something FastAPI
+# still has to validate and encode
+_endpoint_returned: ContextVar[Optional[List[float]]] = ContextVar("endpoint_returned", default=None)
+
+
+class TimedRoute(APIRoute):
+    """
+    Route class that records response validation and JSON encoding, which
+    FastAPI runs after the endpoint returns, as the "serialize" stage.
+    An endpoint that returns a Response is sent as is; a ModelResponse
+    records its own "serialize" stage, so it is not timed again here.
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        if asyncio.iscoroutinefunction(endpoint):
+            endpoint = self._mark_return(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+    @staticmethod
+    def _mark_return(endpoint: Callable) -> Callable:
+        # functools.wraps keeps the signature FastAPI reads dependencies from
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            result = await endpoint(*args, **kwargs)
+            marks = _endpoint_returned.get()
+            if marks is not None and not isinstance(result, Response):
+                marks.append(time.perf_counter())
+            return result
+        return wrapper
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def timed_handler(request: Request) -> Response:
+            marks: List[float] = []
+            _endpoint_returned.set(marks)
+            response = await handler(request)
+            if marks:
+                record_stage("serialize", marks[-1], time.perf_counter())
+            return response
+
+        return timed_handler